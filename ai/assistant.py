@@ -0,0 +1,164 @@
+import streamlit as st
+
+from ai.models import FakeStreamingModel, GeminiModel
+from ai.prompt import PromptBudget, build_prompt
+from ai.response_cache import ResponseCache
+from ai.streaming import StreamHandle
+from utils import metrics
+from utils.settings import get_setting
+
+# 要約に畳まずに保持する直近の会話件数（キャッシュキーの履歴ウィンドウも同じ）
+HISTORY_WINDOW = 10
+
+
+@st.cache_resource
+def get_response_cache() -> ResponseCache:
+    """全セッションで共有する応答キャッシュ"""
+    return ResponseCache(
+        maxsize=get_setting("ai_cache_size", 512, int),
+        ttl_seconds=get_setting("ai_cache_ttl", 3600, float),
+    )
+
+
+def _get_api_key() -> str:
+    # Gemini APIキーの取得（複数の場所から探す）
+    api_key = st.secrets.get("gemini", {}).get("api_key", "")
+    if not api_key:
+        api_key = st.secrets.get("GEMINI_API_KEY", "")
+    if not api_key:
+        api_key = st.secrets.get("google", {}).get("api_key", "")
+    return api_key
+
+
+@st.cache_resource
+def _get_gemini_model(api_key: str, model_name: str) -> GeminiModel:
+    """プロセス内で使い回す Gemini クライアント"""
+    return GeminiModel(api_key, model_name)
+
+
+def get_default_model():
+    """
+    設定に応じたモデルを返す。ai_model = "stub" ならローカルのフェイク（API キー不要）。
+    API キー未設定なら None。
+    """
+    model_name = get_setting("ai_model", "gemini-1.5-flash")
+    if model_name == "stub":
+        return FakeStreamingModel()
+    api_key = _get_api_key()
+    if not api_key:
+        return None
+    if model_name == "gemini":
+        model_name = "gemini-1.5-flash"
+    return _get_gemini_model(api_key, model_name)
+
+
+def get_prompt_budget() -> PromptBudget:
+    """プロンプト全体のトークン予算（ai_prompt_token_budget）"""
+    return PromptBudget(total=get_setting("ai_prompt_token_budget", 6000, int))
+
+
+def get_ai_response(user_message, knowledge_text, chat_history, model=None, cache=None, knowledge_version="", category="All", summary="", data_digest=""):
+    """
+    Gemini APIを使用してナレッジベースの回答を生成
+
+    knowledge_text: 文字列、または文字列を返す callable（キャッシュヒット時は呼ばれない）
+    model: generate_content(prompt).text を持つモデル。未指定なら get_default_model()
+    cache: ResponseCache。指定時は (質問, ナレッジ版, カテゴリ, 履歴ウィンドウ+要約) で応答を再利用する
+    summary: 直近ウィンドウより古い会話のローリング要約
+    data_digest: 表示中データの集計ダイジェスト（data.digest.build_data_digest）
+    """
+    try:
+        key = None
+        if cache is not None:
+            key = ResponseCache.make_key(user_message, knowledge_version, category, chat_history, HISTORY_WINDOW, summary, data_digest)
+            cached = cache.get(key)
+            if cached is not None:
+                return cached
+
+        if model is None:
+            model = get_default_model()
+        if model is None:
+            return "⚠️ Gemini APIキーが設定されていません。Streamlit CloudのSecretsで設定してください。"
+
+        if callable(knowledge_text):
+            knowledge_text = knowledge_text()
+        full_prompt = build_prompt(user_message, knowledge_text, chat_history, summary=summary, budget=get_prompt_budget(), data_digest=data_digest)
+
+        # API呼び出し
+        with metrics.timer("dashboard_ai_model_seconds", mode="blocking"):
+            response = model.generate_content(full_prompt)
+            text = response.text
+
+        # エラー応答はキャッシュしない（成功時のみ格納）
+        if cache is not None and text:
+            cache.put(key, text)
+        return text
+
+    except Exception as e:
+        return f"⚠️ エラーが発生しました: {str(e)}"
+
+
+def _finish(progress, text):
+    if progress is not None:
+        progress["text"] = text
+        progress["done"] = True
+
+
+def stream_ai_response(user_message, knowledge_text, chat_history, model=None, cache=None, knowledge_version="", category="All", summary="", data_digest="", progress=None):
+    """
+    get_ai_response のストリーミング版（ジェネレータ）。
+    モデル呼び出しはワーカースレッドで進め、届いた断片から順に yield する。
+    キャッシュヒット時は全文を1回で yield する。完了した応答だけをキャッシュに格納する。
+
+    progress: 途中経過を書き込む dict（"text" / "done"）。書き込みとキャッシュ格納はワーカー側で行うので、
+              スクリプトがリランで中断されてこのジェネレータが閉じられても最後まで反映される。
+              断片の待ち時間切れで先に返った場合も同じで、遅れて完了した応答は progress に入りキャッシュされる
+              （done が False のまま返ったら生成はまだ続いている）。
+    """
+    key = None
+    if cache is not None:
+        key = ResponseCache.make_key(user_message, knowledge_version, category, chat_history, HISTORY_WINDOW, summary, data_digest)
+        cached = cache.get(key)
+        if cached is not None:
+            _finish(progress, cached)
+            yield cached
+            return
+
+    if model is None:
+        model = get_default_model()
+    if model is None:
+        message = "⚠️ Gemini APIキーが設定されていません。Streamlit CloudのSecretsで設定してください。"
+        _finish(progress, message)
+        yield message
+        return
+
+    try:
+        if callable(knowledge_text):
+            knowledge_text = knowledge_text()
+        full_prompt = build_prompt(user_message, knowledge_text, chat_history, summary=summary, budget=get_prompt_budget(), data_digest=data_digest)
+    except Exception as e:
+        message = f"⚠️ エラーが発生しました: {str(e)}"
+        _finish(progress, message)
+        yield message
+        return
+
+    def on_chunk(handle):
+        if progress is not None:
+            progress["text"] = handle.text
+
+    def on_done(handle):
+        if handle.error is not None:
+            _finish(progress, f"{handle.text}\n\n⚠️ エラーが発生しました: {str(handle.error)}")
+            return
+        if cache is not None and handle.text:
+            cache.put(key, handle.text)
+        _finish(progress, handle.text)
+
+    handle = StreamHandle(model, full_prompt, on_chunk=on_chunk, on_done=on_done)
+    with metrics.timer("dashboard_ai_model_seconds", mode="stream"):
+        yield from handle
+
+    if handle.timed_out and not handle.done.is_set():
+        yield f"\n\n⚠️ AI応答が {handle.timeout:g} 秒以上届いていません（生成は続いています）"
+    elif handle.error is not None:
+        yield f"\n\n⚠️ エラーが発生しました: {str(handle.error)}"
@@ -0,0 +1,86 @@
+import time
+from abc import ABC, abstractmethod
+
+
+class _Response:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class ChatModel(ABC):
+    """
+    AIモデルの共通インターフェース（stream を実装しないサブクラスは生成時に TypeError）。
+    - generate_content(prompt).text: 一括生成（google.generativeai 互換）
+    - stream(prompt): 生成されたテキスト断片を順に yield
+    """
+
+    def generate_content(self, prompt: str):
+        return _Response("".join(self.stream(prompt)))
+
+    @abstractmethod
+    def stream(self, prompt: str):
+        """生成されたテキスト断片を順に yield する"""
+
+
+class GeminiModel(ChatModel):
+    """
+    google.generativeai の GenerativeModel を包む長寿命クライアント。
+    プロセス内で1つ作って使い回す（呼び出し毎の configure/生成をしない）。
+    """
+
+    def __init__(self, api_key: str, model_name: str = "gemini-1.5-flash"):
+        import google.generativeai as genai
+
+        genai.configure(api_key=api_key)
+        self.model_name = model_name
+        self._model = genai.GenerativeModel(model_name)
+
+    def generate_content(self, prompt: str):
+        return self._model.generate_content(prompt)
+
+    def stream(self, prompt: str):
+        for chunk in self._model.generate_content(prompt, stream=True):
+            text = getattr(chunk, "text", "")
+            if text:
+                yield text
+
+
+class StubModel(ChatModel):
+    """
+    テスト/ローカル用のスタブモデル（generate_content(prompt).text 互換）。
+    API を呼ばずに決まった応答を返し、呼び出し回数とプロンプトを記録する。
+    """
+
+    def __init__(self, reply: str | None = None):
+        self.reply = reply
+        self.calls = 0
+        self.prompts: list[str] = []
+
+    def _reply_for(self, prompt: str) -> str:
+        self.calls += 1
+        self.prompts.append(prompt)
+        return self.reply if self.reply is not None else f"[stub] {len(prompt)}文字のプロンプトを受け取りました"
+
+    def generate_content(self, prompt: str):
+        return _Response(self._reply_for(prompt))
+
+    def stream(self, prompt: str):
+        yield self._reply_for(prompt)
+
+
+class FakeStreamingModel(StubModel):
+    """
+    ストリーミング検証用のフェイク。応答を chunk_size 文字ずつ、delay 秒間隔で yield する。
+    """
+
+    def __init__(self, reply: str | None = None, chunk_size: int = 8, delay: float = 0.02):
+        super().__init__(reply)
+        self.chunk_size = chunk_size
+        self.delay = delay
+
+    def stream(self, prompt: str):
+        text = self._reply_for(prompt)
+        for i in range(0, len(text), self.chunk_size):
+            if self.delay:
+                time.sleep(self.delay)
+            yield text[i : i + self.chunk_size]
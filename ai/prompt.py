@@ -0,0 +1,160 @@
+import re
+from dataclasses import dataclass
+
+from utils.tokens import estimate_tokens
+
+SYSTEM_TEMPLATE = """あなたはAllattainの広告運用アシスタントです。
+以下のナレッジベースを参照して、広告運用に関する質問に回答してください。
+
+ナレッジは実際の運用経験から得られた知見です。回答の際は：
+1. ナレッジの内容を元に具体的かつ実践的なアドバイスを提供してください
+2. 該当するナレッジがある場合は、そのカテゴリ/サブカテゴリを明示してください
+3. ナレッジにない内容については、一般的な広告運用の知識で補完してください
+4. 数値や具体例を含めて回答すると分かりやすくなります
+
+【ナレッジベース】
+{knowledge_text}
+{data_section}
+回答は日本語で、簡潔かつ実用的に行ってください。"""
+
+PROMPT_TEMPLATE = "{system_prompt}\n\n【これまでの会話】\n{history_text}\n【新しい質問】\nユーザー: {user_message}\n\nアシスタント:"
+
+# 1発言あたり履歴に入れる上限（長い回答が履歴予算を食い潰さないように）
+MAX_TURN_TOKENS = 400
+# 要約に残す1発言あたりの文字数
+SUMMARY_LINE_CHARS = 60
+
+_SENTENCE_END = re.compile(r"(?<=[。！？!?])|\n")
+
+
+@dataclass(frozen=True)
+class PromptBudget:
+    """
+    プロンプト全体のトークン予算と、ナレッジ/履歴/質問への配分。
+    固定部分（システム指示・テンプレート）を差し引いた残りを配分し、
+    質問・履歴で使い切らなかった分はナレッジに回す。
+    """
+
+    total: int = 6000
+    knowledge_share: float = 0.55
+    history_share: float = 0.30
+    question_share: float = 0.15
+
+    def split(self, fixed_tokens: int) -> tuple[int, int, int]:
+        available = max(self.total - fixed_tokens, 0)
+        return (
+            int(available * self.knowledge_share),
+            int(available * self.history_share),
+            int(available * self.question_share),
+        )
+
+
+def truncate_to_tokens(text: str, max_tokens: int, by_line: bool = False) -> str:
+    """
+    max_tokens に収まるよう末尾を切り詰める。
+    by_line=True なら行単位で落とす（ナレッジ1件を途中で切らない）。
+    """
+    if max_tokens <= 0 or not text:
+        return ""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    if by_line:
+        kept, used = [], 0
+        for line in text.split("\n"):
+            cost = estimate_tokens(line) + 1
+            if used + cost > max_tokens:
+                break
+            kept.append(line)
+            used += cost
+        return "\n".join(kept)
+    # 二分探索で収まる最長の接頭辞を探す
+    lo, hi = 0, len(text)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if estimate_tokens(text[:mid]) + 1 <= max_tokens:
+            lo = mid
+        else:
+            hi = mid - 1
+    return text[:lo] + "…"
+
+
+def _summary_line(message: dict) -> str:
+    role = "ユーザー" if message.get("role") == "user" else "アシスタント"
+    content = " ".join(str(message.get("content", "")).split())
+    first = _SENTENCE_END.split(content, maxsplit=1)[0].strip() or content
+    if len(first) > SUMMARY_LINE_CHARS:
+        first = first[:SUMMARY_LINE_CHARS] + "…"
+    return f"- {role}: {first}"
+
+
+def summarize_turns(messages: list[dict], previous_summary: str = "", max_tokens: int = 300) -> str:
+    """
+    古い発言を各1行（先頭の1文）に圧縮して既存の要約に追記する。
+    max_tokens を超える場合は古い行から落とす（ローリング要約）。
+    """
+    lines = [l for l in (previous_summary or "").split("\n") if l]
+    lines += [_summary_line(m) for m in messages]
+    while lines and estimate_tokens("\n".join(lines)) > max_tokens:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+def fold_history(chat_history: list[dict], summary: str, keep_last: int = 10, summary_tokens: int = 300) -> tuple[str, list[dict]]:
+    """
+    履歴が keep_last 件を超えたら、超過分を要約に畳み込む。
+    戻り値: (新しい要約, 残す直近の履歴)
+    """
+    if len(chat_history) <= keep_last:
+        return summary, chat_history
+    overflow = chat_history[:-keep_last] if keep_last else chat_history
+    remaining = chat_history[-keep_last:] if keep_last else []
+    return summarize_turns(overflow, summary, max_tokens=summary_tokens), remaining
+
+
+def _format_turn(message: dict) -> str:
+    role = "ユーザー" if message["role"] == "user" else "アシスタント"
+    return f"{role}: {truncate_to_tokens(str(message['content']), MAX_TURN_TOKENS)}\n\n"
+
+
+def build_prompt(user_message, knowledge_text, chat_history, summary="", budget: PromptBudget | None = None, data_digest="") -> str:
+    """
+    システムプロンプト + ナレッジ + 会話（要約 + 直近） + 新しい質問を、トークン予算内で組み立てる。
+    - データ概況（data_digest）: 生成側でトークン上限済みのため固定部分として扱う
+    - 質問: 質問枠まで（超過分は切り詰め）
+    - 会話: 要約を先頭に、新しい発言から順に履歴枠に入るだけ
+    - ナレッジ: ナレッジ枠 + 質問/会話の余り（行単位で切り詰め）
+    """
+    budget = budget or PromptBudget()
+    data_section = f"\n{data_digest}\n" if data_digest else ""
+    fixed = estimate_tokens(SYSTEM_TEMPLATE.format(knowledge_text="", data_section=data_section)) + estimate_tokens(
+        PROMPT_TEMPLATE.format(system_prompt="", history_text="", user_message="")
+    )
+    knowledge_budget, history_budget, question_budget = budget.split(fixed)
+
+    question = truncate_to_tokens(user_message, question_budget)
+    question_left = question_budget - estimate_tokens(question)
+
+    # 会話: 要約 → 直近の発言（新しい順に詰めて、元の順に戻す）
+    history_parts = []
+    used = 0
+    if summary:
+        summary_text = f"（以前の会話の要約）\n{summary}\n\n"
+        summary_text = truncate_to_tokens(summary_text, history_budget // 3)
+        used += estimate_tokens(summary_text)
+    recent = []
+    for msg in reversed(chat_history):
+        turn = _format_turn(msg)
+        cost = estimate_tokens(turn)
+        if used + cost > history_budget:
+            break
+        recent.append(turn)
+        used += cost
+    if summary:
+        history_parts.append(summary_text)
+    history_parts.extend(reversed(recent))
+    history_text = "".join(history_parts)
+    history_left = history_budget - used
+
+    knowledge = truncate_to_tokens(knowledge_text or "", knowledge_budget + question_left + history_left, by_line=True)
+    system_prompt = SYSTEM_TEMPLATE.format(knowledge_text=knowledge, data_section=data_section)
+    return PROMPT_TEMPLATE.format(system_prompt=system_prompt, history_text=history_text, user_message=question)
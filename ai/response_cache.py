@@ -0,0 +1,96 @@
+import hashlib
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+
+def normalize_question(question: str) -> str:
+    """キャッシュキー用の質問正規化（全角/半角・大文字小文字・空白の揺れを吸収）"""
+    s = unicodedata.normalize("NFKC", question or "").lower()
+    return " ".join(s.split())
+
+
+def history_fingerprint(chat_history: list[dict], window: int) -> str:
+    """プロンプトに入る直近 window 件の履歴のハッシュ"""
+    h = hashlib.sha1()
+    for msg in (chat_history or [])[-window:] if window else []:
+        h.update(msg.get("role", "").encode("utf-8"))
+        h.update(b"\x00")
+        h.update(str(msg.get("content", "")).encode("utf-8"))
+        h.update(b"\x01")
+    return h.hexdigest()
+
+
+class ResponseCache:
+    """
+    AI応答の LRU + TTL キャッシュ（全セッション共有、スレッドセーフ）。
+    キー: (正規化した質問, ナレッジ内容ハッシュ, 選択カテゴリ, 履歴ウィンドウのハッシュ, 要約のハッシュ, データ概況のハッシュ)
+    """
+
+    def __init__(self, maxsize: int = 512, ttl_seconds: float = 3600, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def make_key(question: str, knowledge_version: str, category: str | None, chat_history: list[dict], history_window: int, summary: str = "", data_digest: str = "") -> tuple:
+        return (
+            normalize_question(question),
+            knowledge_version or "",
+            category or "All",
+            history_fingerprint(chat_history, history_window),
+            hashlib.sha1((summary or "").encode("utf-8")).hexdigest(),
+            hashlib.sha1((data_digest or "").encode("utf-8")).hexdigest(),
+        )
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, value = entry
+                if self._clock() - stored_at <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+                self.expirations += 1
+            self.misses += 1
+            return None
+
+    def put(self, key, value) -> None:
+        with self._lock:
+            self._entries[key] = (self._clock(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def entries(self) -> list:
+        """(キー, 値) の一覧（メモリレポート用のスナップショット。期限切れも含む）"""
+        with self._lock:
+            return [(key, value) for key, (_, value) in self._entries.items()]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": (self.hits / total) if total else 0.0,
+            }
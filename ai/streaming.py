@@ -0,0 +1,60 @@
+import queue
+import threading
+
+_DONE = object()
+
+
+class StreamHandle:
+    """
+    別スレッドで model.stream(prompt) を回し、断片をキューで受け渡すハンドル。
+    スクリプトスレッドはイテレートして届いた断片から順に描画するだけで、
+    API 呼び出し自体はワーカースレッドで進む。
+
+    断片の蓄積（chunks / text）と on_chunk / on_done の呼び出しはワーカー側で行う。
+    途中でリランされてイテレートが止まっても応答は最後まで集まり、on_done(handle) も呼ばれる。
+
+    error はワーカー（モデル呼び出し）の例外だけを持つ。イテレート側の待ち時間切れは timed_out に記録し、
+    ワーカーは止めない（遅れて完了した応答も on_done に正常終了として届く）。
+    """
+
+    def __init__(self, model, prompt: str, timeout: float = 120.0, on_chunk=None, on_done=None):
+        self._queue: queue.Queue = queue.Queue()
+        self.timeout = timeout
+        self.chunks: list[str] = []
+        self.error: Exception | None = None
+        self.timed_out = False
+        self.done = threading.Event()
+        self._on_chunk = on_chunk
+        self._on_done = on_done
+        self._thread = threading.Thread(target=self._run, args=(model, prompt), daemon=True)
+        self._thread.start()
+
+    def _run(self, model, prompt):
+        try:
+            for chunk in model.stream(prompt):
+                self.chunks.append(chunk)
+                if self._on_chunk is not None:
+                    self._on_chunk(self)
+                self._queue.put(chunk)
+        except Exception as e:  # ワーカー側の例外はイテレート側・on_done で扱う
+            self.error = e
+        finally:
+            self.done.set()
+            if self._on_done is not None:
+                self._on_done(self)
+            self._queue.put(_DONE)
+
+    def __iter__(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=self.timeout)
+            except queue.Empty:
+                self.timed_out = True
+                return
+            if item is _DONE:
+                return
+            yield item
+
+    @property
+    def text(self) -> str:
+        return "".join(self.chunks)
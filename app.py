@@ -1,22 +1,31 @@
 import streamlit as st
 import pandas as pd
 from datetime import datetime, timedelta
-import google.generativeai as genai
-import difflib
 
 # Import custom modules
+from ai.assistant import HISTORY_WINDOW, get_ai_response, get_response_cache, stream_ai_response
+from ai.prompt import fold_history
 from data.loader import (
-    load_data_from_sheets, 
-    load_knowledge_data,
-    get_knowledge_by_category,
-    get_knowledge_categories,
-    get_knowledge_subcategories,
-    format_knowledge_for_ai
+    load_data_version,
+    get_data_store,
+    get_master_rules,
+    get_processed_dataset,
+    load_knowledge_version,
+    get_knowledge_store,
+    retrieve_knowledge_for_ai
 )
-from data.processor import process_data, build_master_rules
+from data.processor import safe_divide
+from data.digest import get_cached_digest
+from data.filters import base_frame, filter_frame, filter_options, store_base_filters, store_filter_options, store_filters
+from data.unmapped import get_token_index
 from utils.styles import get_custom_css
+from utils.settings import get_setting
+from utils import metrics, perf
+from utils.streamlit_compat import fragment, rerun_fragment
 from components.metrics import display_kpi_metrics
 from components.charts import display_charts
+from components.perf_panel import display_perf_panel
+from components.figure_cache import get_figure_cache, get_pivot_cache
 
 # --- Page Config ---
 st.set_page_config(
@@ -154,200 +163,282 @@ password = "Allattain0301@"
     
     return False
 
-def get_ai_response(user_message, knowledge_text, chat_history):
+def render_ai_sidebar():
     """
-    Gemini APIを使用してナレッジベースの回答を生成
+    サイドバーにAIチャットボット機能を表示
+    チャット操作はフラグメント内で完結し、ダッシュボード本体はリランしない
     """
-    try:
-        # Gemini APIキーの取得（複数の場所から探す）
-        api_key = st.secrets.get("gemini", {}).get("api_key", "")
-        if not api_key:
-            api_key = st.secrets.get("GEMINI_API_KEY", "")
-        if not api_key:
-            api_key = st.secrets.get("google", {}).get("api_key", "")
-        
-        if not api_key:
-            return "⚠️ Gemini APIキーが設定されていません。Streamlit CloudのSecretsで設定してください。"
-        
-        # Gemini クライアントの初期化
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        
-        # プロンプトの構築
-        system_prompt = f"""あなたはAllattainの広告運用アシスタントです。
-以下のナレッジベースを参照して、広告運用に関する質問に回答してください。
+    with st.sidebar:
+        _render_ai_assistant()
 
-ナレッジは実際の運用経験から得られた知見です。回答の際は：
-1. ナレッジの内容を元に具体的かつ実践的なアドバイスを提供してください
-2. 該当するナレッジがある場合は、そのカテゴリ/サブカテゴリを明示してください
-3. ナレッジにない内容については、一般的な広告運用の知識で補完してください
-4. 数値や具体例を含めて回答すると分かりやすくなります
 
-【ナレッジベース】
-{knowledge_text}
+def _build_knowledge_text(question, selected_category):
+    """送信時にだけ呼ぶ: 質問に関連するナレッジを選択カテゴリ内から検索してAI用にフォーマット"""
+    return retrieve_knowledge_for_ai(question, category=selected_category)
 
-回答は日本語で、簡潔かつ実用的に行ってください。"""
 
-        # チャット履歴をテキスト形式で構築
-        history_text = ""
-        for msg in chat_history[-10:]:
-            role = "ユーザー" if msg["role"] == "user" else "アシスタント"
-            history_text += f"{role}: {msg['content']}\n\n"
-        
-        # 完全なプロンプトを構築
-        full_prompt = f"{system_prompt}\n\n【これまでの会話】\n{history_text}\n【新しい質問】\nユーザー: {user_message}\n\nアシスタント:"
-        
-        # API呼び出し
-        response = model.generate_content(full_prompt)
-        
-        return response.text
-    
-    except Exception as e:
-        return f"⚠️ エラーが発生しました: {str(e)}"
+def _write_stream(chunks):
+    """st.write_stream 相当（未対応バージョンでは placeholder を逐次更新）。全文を返す"""
+    if hasattr(st, "write_stream"):
+        return st.write_stream(chunks)
+    placeholder = st.empty()
+    text = ""
+    for chunk in chunks:
+        text += chunk
+        placeholder.markdown(text + "▌")
+    placeholder.markdown(text)
+    return text
 
 
-def render_ai_sidebar():
+def _current_data_digest():
+    """送信時にだけ呼ぶ: main() が登録した表示中データの集計ダイジェスト（フィルタ状態ごとにキャッシュ）"""
+    if not st.session_state.get("ai_use_data_digest", True):
+        return ""
+    filters = st.session_state.get("ai_digest_filters")
+    if not filters:
+        return ""
+    filter_key = (load_data_version(), *filters, str(datetime.now().date()))
+    return get_cached_digest(
+        filter_key, lambda: _digest_frame(*filters), max_tokens=get_setting("ai_digest_token_budget", 600, int)
+    )
+
+
+def _digest_frame(selected_tab, selected_campaign, selected_article, selected_creative):
+    """ダイジェスト生成時（キャッシュミス時）だけ、共有データから直近7日のベースを作り直す"""
+    start = datetime.now().date() - timedelta(days=6)
+    store = get_data_store()
+    if store is not None:
+        base_filters = store_base_filters(selected_tab, selected_campaign, selected_article, selected_creative)
+        return store.aggregate(["Date", "Media", "Campaign_Name"], BASE_METRICS, start=start, **base_filters)
+    df = get_processed_dataset().frame
+    df_base = base_frame(df, selected_tab, selected_campaign, selected_article, selected_creative)
+    return df_base[df_base["Date"].dt.date >= start]
+
+
+def _append_answer(ai_response):
+    """AI応答を履歴に追加し、直近 HISTORY_WINDOW 件より古い発言は要約に畳み込む"""
+    st.session_state.ai_chat_history.append({
+        "role": "assistant",
+        "content": ai_response
+    })
+    st.session_state.ai_chat_summary, st.session_state.ai_chat_history = fold_history(
+        st.session_state.ai_chat_history,
+        st.session_state.get("ai_chat_summary", ""),
+        keep_last=HISTORY_WINDOW,
+    )
+
+
+def _ask_ai(question):
+    """質問を履歴に追加し、AI応答を生成して履歴に追加する"""
+    # 前の回答がまだ生成中（リランで中断された）なら、そこまでの内容で確定させて履歴の順序を保つ
+    previous = st.session_state.pop("ai_pending", None)
+    if previous is not None:
+        _append_answer(previous["text"] if previous["done"] else previous["text"] + "\n\n（回答の途中で次の質問が送信されました）")
+
+    st.session_state.ai_chat_history.append({
+        "role": "user",
+        "content": question
+    })
+
+    # AI応答を生成（同一の質問/ナレッジ/カテゴリ/直近履歴なら共有キャッシュから返す）
+    selected_category = st.session_state.get("ai_category_filter", "All")
+    response_args = (
+        question,
+        lambda: _build_knowledge_text(question, selected_category),
+        st.session_state.ai_chat_history,
+    )
+    response_kwargs = dict(
+        cache=get_response_cache(),
+        knowledge_version=load_knowledge_version(),
+        category=selected_category,
+        summary=st.session_state.get("ai_chat_summary", ""),
+        data_digest=_current_data_digest(),
+    )
+    if get_setting("ai_streaming", True, bool):
+        # 届いた断片から順に表示（モデル呼び出しはワーカースレッド）。
+        # 途中で別の操作によりリランされると表示は止まるが、ワーカーが pending に最後まで書き込み、
+        # 次の描画でチャット欄（_render_chat_polling）が途中経過を表示し、完了したら履歴へ移す
+        pending = {"text": "", "done": False}
+        st.session_state["ai_pending"] = pending
+        st.markdown("**🤖 AI:**")
+        with metrics.timer("dashboard_ai_response_seconds", mode="stream"):
+            _write_stream(stream_ai_response(*response_args, progress=pending, **response_kwargs))
+        if not pending["done"]:
+            # 断片の待ち時間切れで先に返った（生成は続いている）: 完了後にチャット欄のポーリングが履歴へ移す
+            return
+        st.session_state.pop("ai_pending", None)
+        ai_response = pending["text"]
+    else:
+        with st.spinner("回答を生成中..."), metrics.timer("dashboard_ai_response_seconds", mode="blocking"):
+            ai_response = get_ai_response(*response_args, **response_kwargs)
+
+    _append_answer(ai_response)
+
+
+def _render_chat():
     """
-    サイドバーにAIチャットボット機能を表示
+    チャット履歴と生成中の回答。
+    リランで中断されたストリーミング回答が完了していれば、ここで履歴に移してから描画する
     """
-    with st.sidebar:
-        st.markdown("### 🤖 AI アシスタント")
-        st.caption("広告運用のナレッジを元にアドバイスします")
-        
-        # ナレッジデータの読み込み
-        knowledge_df = load_knowledge_data()
-        
-        # ナレッジの統計表示
-        if not knowledge_df.empty:
-            st.info(f"📚 {len(knowledge_df)}件のナレッジを参照中")
-        else:
-            st.warning("ナレッジデータが読み込めませんでした")
-            return
-        
-        st.markdown("---")
-        
-        # カテゴリフィルター（オプション）
-        categories = ["All"] + get_knowledge_categories()
-        selected_category = st.selectbox(
-            "カテゴリで絞り込み（オプション）",
-            options=categories,
-            key="ai_category_filter"
-        )
-        
-        # 絞り込んだナレッジを取得
-        if selected_category != "All":
-            filtered_knowledge = get_knowledge_by_category(category=selected_category)
-            st.caption(f"選択カテゴリ: {len(filtered_knowledge)}件")
+    pending = st.session_state.get("ai_pending")
+    if pending is not None and pending["done"]:
+        del st.session_state["ai_pending"]
+        _append_answer(pending["text"])
+
+    if st.session_state.get("ai_chat_summary"):
+        with st.expander("🗂 以前の会話（要約）", expanded=False):
+            st.markdown(st.session_state.ai_chat_summary)
+    for message in st.session_state.ai_chat_history:
+        if message["role"] == "user":
+            st.markdown(f"**🧑 あなた:** {message['content']}")
         else:
-            filtered_knowledge = knowledge_df
-        
-        # ナレッジをAI用にフォーマット
-        knowledge_text = format_knowledge_for_ai(filtered_knowledge, max_items=100)
-        
+            st.markdown(f"**🤖 AI:** {message['content']}")
         st.markdown("---")
-        
-        # チャット履歴の初期化
-        if "ai_chat_history" not in st.session_state:
-            st.session_state.ai_chat_history = []
-        
-        # チャット履歴の表示
-        st.markdown("#### 💬 チャット")
-        
-        chat_container = st.container()
-        with chat_container:
-            for message in st.session_state.ai_chat_history:
-                if message["role"] == "user":
-                    st.markdown(f"**🧑 あなた:** {message['content']}")
-                else:
-                    st.markdown(f"**🤖 AI:** {message['content']}")
-                st.markdown("---")
-        
-        # 入力フォーム
-        with st.form(key="ai_chat_form", clear_on_submit=True):
-            user_input = st.text_area(
-                "質問を入力",
-                placeholder="例: CTRを改善するにはどうすればいいですか？",
-                height=100,
-                key="ai_user_input"
+
+    pending = st.session_state.get("ai_pending")
+    if pending is not None:
+        st.markdown(f"**🤖 AI（生成中）:** {pending['text']}▌")
+
+
+# 生成中の回答があるときだけ使う版: 1秒ごとにチャット欄だけを再実行してワーカーの書き込みを拾い、
+# 完了したらその場で履歴に移す（ページ全体・AIアシスタント本体はリランしない）
+_render_chat_polling = fragment(run_every=1)(_render_chat)
+
+
+@fragment
+def _render_ai_assistant():
+    """
+    AIアシスタント本体（フラグメント）
+    送信/クリア/クイック提案ではこのフラグメントだけを再実行する
+    """
+    metrics.fragment_rerun("ai_assistant")
+    st.markdown("### 🤖 AI アシスタント")
+    st.caption("広告運用のナレッジを元にアドバイスします")
+    
+    # ナレッジデータの読み込み
+    knowledge_store = get_knowledge_store()
+    
+    # ナレッジの統計表示
+    if len(knowledge_store) > 0:
+        st.info(f"📚 {len(knowledge_store)}件のナレッジを参照中")
+        report = knowledge_store.dedupe_report
+        if report.get("clusters_merged"):
+            st.caption(
+                f"近似重複を集約: {report['original']}件 → {report['deduped']}件"
+                f"（圧縮率 {report['compression_ratio'] * 100:.0f}%）"
             )
-            
-            col1, col2 = st.columns(2)
-            with col1:
-                submit_button = st.form_submit_button("📤 送信", use_container_width=True)
-            with col2:
-                clear_button = st.form_submit_button("🗑️ クリア", use_container_width=True)
-        
-        if submit_button and user_input.strip():
-            # ユーザーメッセージを履歴に追加
-            st.session_state.ai_chat_history.append({
-                "role": "user",
-                "content": user_input.strip()
-            })
-            
-            # AI応答を生成
-            with st.spinner("回答を生成中..."):
-                ai_response = get_ai_response(
-                    user_input.strip(),
-                    knowledge_text,
-                    st.session_state.ai_chat_history
-                )
-            
-            # AI応答を履歴に追加
-            st.session_state.ai_chat_history.append({
-                "role": "assistant",
-                "content": ai_response
-            })
-            
-            st.rerun()
-        
-        if clear_button:
-            st.session_state.ai_chat_history = []
-            st.rerun()
+    else:
+        st.warning("ナレッジデータが読み込めませんでした")
+        return
+    
+    st.markdown("---")
+    
+    # カテゴリフィルター（オプション）
+    categories = ["All"] + knowledge_store.categories
+    selected_category = st.selectbox(
+        "カテゴリで絞り込み（オプション）",
+        options=categories,
+        key="ai_category_filter"
+    )
+    
+    st.checkbox("📊 表示中のデータ（当日/昨日/7日の案件別数値）を参照する", value=True, key="ai_use_data_digest")
+    
+    # 絞り込み件数の表示（ナレッジ本文のフォーマットは送信時に行う）
+    if selected_category != "All":
+        st.caption(f"選択カテゴリ: {knowledge_store.count(selected_category)}件")
+    
+    st.markdown("---")
+    
+    # チャット履歴の初期化
+    if "ai_chat_history" not in st.session_state:
+        st.session_state.ai_chat_history = []
+    
+    # チャット履歴の表示
+    st.markdown("#### 💬 チャット")
+    
+    chat_container = st.container()
+    with chat_container:
+        if "ai_pending" in st.session_state:
+            _render_chat_polling()
+        else:
+            _render_chat()
+    
+    # 入力フォーム
+    with st.form(key="ai_chat_form", clear_on_submit=True):
+        user_input = st.text_area(
+            "質問を入力",
+            placeholder="例: CTRを改善するにはどうすればいいですか？",
+            height=100,
+            key="ai_user_input"
+        )
         
-        # クイックアクション（AI提案）
-        st.markdown("---")
-        st.markdown("#### ⚡ クイック提案")
-        
-        quick_actions = [
-            ("📈 CPA改善のヒント", "CPAを改善するためのアドバイスを教えてください。"),
-            ("🎨 クリエイティブ改善", "クリエイティブの改善ポイントを教えてください。"),
-            ("📊 配信最適化", "Meta広告の配信を最適化するコツを教えてください。"),
-            ("🎯 ターゲティング戦略", "効果的なターゲティング戦略について教えてください。"),
-        ]
-        
-        for label, prompt in quick_actions:
-            if st.button(label, key=f"quick_{label}", use_container_width=True):
-                # クイックアクションを実行
-                st.session_state.ai_chat_history.append({
-                    "role": "user",
-                    "content": prompt
-                })
-                
-                with st.spinner("回答を生成中..."):
-                    ai_response = get_ai_response(
-                        prompt,
-                        knowledge_text,
-                        st.session_state.ai_chat_history
-                    )
-                
-                st.session_state.ai_chat_history.append({
-                    "role": "assistant",
-                    "content": ai_response
-                })
-                
-                st.rerun()
+        col1, col2 = st.columns(2)
+        with col1:
+            submit_button = st.form_submit_button("📤 送信", use_container_width=True)
+        with col2:
+            clear_button = st.form_submit_button("🗑️ クリア", use_container_width=True)
+    
+    if submit_button and user_input.strip():
+        _ask_ai(user_input.strip())
+        rerun_fragment()
+    
+    if clear_button:
+        st.session_state.ai_chat_history = []
+        st.session_state.ai_chat_summary = ""
+        st.session_state.pop("ai_pending", None)
+        rerun_fragment()
+    
+    # クイックアクション（AI提案）
+    st.markdown("---")
+    st.markdown("#### ⚡ クイック提案")
+    
+    quick_actions = [
+        ("📈 CPA改善のヒント", "CPAを改善するためのアドバイスを教えてください。"),
+        ("🎨 クリエイティブ改善", "クリエイティブの改善ポイントを教えてください。"),
+        ("📊 配信最適化", "Meta広告の配信を最適化するコツを教えてください。"),
+        ("🎯 ターゲティング戦略", "効果的なターゲティング戦略について教えてください。"),
+    ]
+    
+    for label, prompt in quick_actions:
+        if st.button(label, key=f"quick_{label}", use_container_width=True):
+            # クイックアクションを実行
+            _ask_ai(prompt)
+            rerun_fragment()
+
+    cache_stats = get_response_cache().stats()
+    st.caption(
+        f"応答キャッシュ: {cache_stats['size']}件 ・ ヒット率 {cache_stats['hit_rate'] * 100:.0f}%"
+        f"（{cache_stats['hits']}/{cache_stats['hits'] + cache_stats['misses']}）"
+    )
 
 
 def main():
+    perf.begin_run()
+    timer = perf.stage_timer("app")
+
     # --- AI Sidebar ---
     render_ai_sidebar()
+    timer.lap("sidebar")
     
     # --- 1. Data Loading ---
-    raw_data = load_data_from_sheets()
-    df = process_data(raw_data)
-    master_rules = build_master_rules(raw_data.get("Master_Setting", pd.DataFrame()))
+    # data_store=duckdb なら処理済みデータは共有ストアだけに置き（pandas のデータセットは作らない）、
+    # フィルタ・集計は SQL で押し下げる
+    store = get_data_store()
+    if store is None:
+        # 処理済みデータはデータ更新ごとに1回だけ作られる共有データセット（セッションはビューだけを持つ）
+        dataset = get_processed_dataset()
+        master_rules = dataset.master_rules
+        df = dataset.frame
+        n_rows = len(df)
+    else:
+        master_rules = get_master_rules()
+        df = None
+        n_rows = store.count()
+    timer.lap("process", rows=n_rows)
+    if metrics.is_enabled() and n_rows:
+        _record_data_metrics(df, store)
     
-    if df.empty:
+    if n_rows == 0:
         st.error("データの読み込みに失敗したか、対象データがありません。")
         return
 
@@ -393,26 +484,10 @@ def main():
         selected_tab = st.session_state.get("media_tab", "合計")
     
     # フィルタの選択肢を準備（タブに基づく）
-    if selected_tab == "Meta":
-        df_filter_source = df[df["Media"] == "Meta"]
-    elif selected_tab == "Beyond":
-        df_filter_source = df[df["Media"] == "Beyond"]
+    if store is not None:
+        all_campaigns, all_articles, all_creatives = store_filter_options(store, selected_tab)
     else:
-        df_filter_source = df # 合計
-    
-    all_campaigns = ["All"] + list(df_filter_source["Campaign_Name"].unique())
-    
-    # 記事 / クリエイティブ
-    if selected_tab == "Beyond":
-        all_articles = ["All"] + list(df_filter_source["Creative"].dropna().unique())
-        all_creatives = ["All"]
-    elif selected_tab == "Meta":
-        all_articles = ["All"]
-        all_creatives = ["All"] + list(df_filter_source["Creative"].dropna().unique())
-    else:
-        # 合計: 両方混ぜるか、あるいはフィルタしないか。
-        all_articles = ["All"] + list(df[df["Media"]=="Beyond"]["Creative"].dropna().unique())
-        all_creatives = ["All"] + list(df[df["Media"]=="Meta"]["Creative"].dropna().unique())
+        all_campaigns, all_articles, all_creatives = filter_options(df, selected_tab)
     
     with header_col3:
         selected_campaign = st.selectbox(
@@ -440,107 +515,35 @@ def main():
             value=(first_day_of_month, today)
         )
 
+    timer.lap("header")
+    metrics.set_interaction(_detect_interaction(selected_tab, selected_campaign, selected_article, selected_creative, date_range))
+
     # --- 5. Apply Filters ---
-    # フィルタリングは df 全体に対して行う
-    mask = pd.Series(True, index=df.index)
-    
-    # Date Filter
-    if isinstance(date_range, tuple) and len(date_range) == 2:
-        start_d, end_d = date_range
-        mask &= (df["Date"].dt.date >= start_d) & (df["Date"].dt.date <= end_d)
-    
-    # Campaign Filter
-    if selected_campaign != "All":
-        mask &= (df["Campaign_Name"] == selected_campaign)
-        
-    # Article Filter (Beyond Creative)
-    if selected_article != "All":
-        # Media=Beyond かつ Creative=selected_article の行を残す
-        # ただし、Metaデータも残さないと「合計」で消えてしまう？
-        # 「記事で絞り込む」ということは、その記事に関連するデータを見たい。
-        # Metaデータには記事情報がないので、記事フィルタ時はMetaデータは除外されるべきか？
-        # 通常、記事フィルタ＝Beyondの特定記事の成果を見たい、なのでMetaは0になるのが自然。
-        mask &= ( (df["Media"] == "Beyond") & (df["Creative"] == selected_article) ) | ( (df["Media"] == "Meta") & (selected_tab == "合計") & (selected_article == "All") )
-        # 修正: 上記は複雑。シンプルに:
-        # 記事フィルタが選ばれたら、Creativeが一致するものだけ残す。
-        # MetaデータはCreative(Ad Name)を持ってるが、記事名とは一致しないはず。
-        # よって記事フィルタONならMetaデータは消える。
-        mask &= (df["Creative"] == selected_article)
-
-    # Creative Filter (Meta Creative)
-    if selected_creative != "All":
-        mask &= (df["Creative"] == selected_creative)
-        
-    df_filtered = df[mask]
+    if store is not None:
+        # KPI・期間テーブル・グラフはどれも加算指標の合計なので、日付×媒体×案件の集計だけを受け取る
+        filters = store_filters(selected_campaign, selected_article, selected_creative, date_range)
+        df_filtered = store.aggregate(["Date", "Media", "Campaign_Name"], BASE_METRICS, **filters)
+
+        def load_unmapped():
+            # 診断は元の行が要るので、Unmapped の行だけを取り出す
+            if selected_campaign not in ("All", "Unmapped"):
+                return pd.DataFrame()
+            return store.rows(**{**filters, "campaign": "Unmapped"})
+    else:
+        # フィルタリングは df 全体に対して行う（タブでは絞らない）
+        df_filtered = filter_frame(df, selected_campaign, selected_article, selected_creative, date_range)
+
+        def load_unmapped():
+            return df_filtered[df_filtered["Campaign_Name"] == "Unmapped"]
+    timer.lap("filter", rows=len(df_filtered))
 
     if df_filtered.empty:
         st.warning("データがありません")
         return
 
-    # --- Unmapped 診断 ---
-    def _normalize_text(value: object) -> str:
-        if value is None or pd.isna(value):
-            return ""
-        s = str(value).replace("\u3000", " ")
-        for ch in ["[", "]", "［", "］", "(", ")", "（", "）", "【", "】"]:
-            s = s.replace(ch, "")
-        return " ".join(s.split()).strip().lower()
-
-    def _suggest_projects(text: object, tokens: list[tuple[str, str]], limit: int = 5) -> str:
-        """
-        マッチしなかった文字列に対して、近い Master token を推定表示。
-        tokens: [(token_norm, project), ...]
-        """
-        s = _normalize_text(text)
-        if not s or not tokens:
-            return ""
-        token_list = [t for t, _ in tokens if t]
-        close = difflib.get_close_matches(s, token_list, n=limit, cutoff=0.15)
-        if not close:
-            return ""
-        # token -> project の対応（同一tokenが複数案件に紐づくことは想定しない）
-        token_to_project = {t: p for t, p in tokens}
-        return " / ".join([f"{token_to_project.get(t, '')}({t})" for t in close])
-
-    with st.expander("🧭 Unmapped診断（マスターに紐づかない行）", expanded=False):
-        unmapped = df_filtered[df_filtered["Campaign_Name"] == "Unmapped"].copy()
-        st.caption("Master_Setting の Meta名/Beyond名 にマッチせず、案件に紐づかなかった行の一覧です。")
-
-        if unmapped.empty:
-            st.success("この条件（期間/フィルタ）では Unmapped はありません。")
-        else:
-            st.warning(f"Unmapped 行数: {len(unmapped)}")
-
-            meta_unmapped = unmapped[unmapped["Media"] == "Meta"].copy()
-            beyond_unmapped = unmapped[unmapped["Media"] == "Beyond"].copy()
-
-            meta_tokens = master_rules.get("meta_tokens", [])
-            beyond_tokens = master_rules.get("beyond_tokens", [])
-
-            if not meta_unmapped.empty:
-                # 近い候補を推定表示
-                meta_unmapped["マッチ対象（Campaign Name）"] = meta_unmapped.get("Campaign Name", "")
-                meta_unmapped["推定候補（近いMaster）"] = meta_unmapped["マッチ対象（Campaign Name）"].apply(
-                    lambda x: _suggest_projects(x, meta_tokens)
-                )
-                show_cols = [c for c in [
-                    "Date", "Account Name", "Campaign Name", "Ad Set Name", "Creative", "Cost", "Impressions", "Clicks", "MCV",
-                    "マッチ対象（Campaign Name）", "推定候補（近いMaster）"
-                ] if c in meta_unmapped.columns]
-                st.markdown("##### Meta Unmapped")
-                st.dataframe(meta_unmapped[show_cols].sort_values("Date", ascending=False), use_container_width=True)
-
-            if not beyond_unmapped.empty:
-                beyond_unmapped["マッチ対象（beyond_page_name）"] = beyond_unmapped.get("beyond_page_name", "")
-                beyond_unmapped["推定候補（近いMaster）"] = beyond_unmapped["マッチ対象（beyond_page_name）"].apply(
-                    lambda x: _suggest_projects(x, beyond_tokens)
-                )
-                show_cols = [c for c in [
-                    "Date", "beyond_page_name", "version_name", "Parameter", "Cost", "PV", "Clicks", "CV",
-                    "マッチ対象（beyond_page_name）", "推定候補（近いMaster）"
-                ] if c in beyond_unmapped.columns]
-                st.markdown("##### Beyond Unmapped")
-                st.dataframe(beyond_unmapped[show_cols].sort_values("Date", ascending=False), use_container_width=True)
+    # --- Unmapped 診断（開いたときだけ計算） ---
+    render_unmapped_diagnostics(load_unmapped, master_rules)
+    timer.lap("unmapped")
 
     # --- 6. KPI Calculation & Display ---
     # タブごとのロジック分岐
@@ -549,9 +552,6 @@ def main():
     df_meta = df_filtered[df_filtered["Media"] == "Meta"]
     df_beyond = df_filtered[df_filtered["Media"] == "Beyond"]
     
-    # safe_divide関数をインポート
-    from data.processor import safe_divide
-    
     # --- デバッグ用: Beyondデータのフィルタ結果確認（開発中のみ） ---
     # コメントアウトを外すと表示されます
     # if True:  # 開発中は True、本番では False に変更
@@ -730,209 +730,350 @@ def main():
         
         display_kpi_cards_beyond(cost, pv, clicks, cv, mcvr, cvr, cpc, cpa, mcpa, fv_exit_rate, sv_exit_rate, total_exit_rate)
 
-    # --- 7. Tables & Charts ---
-    
-    # テーブル表示用ヘルパー
-    def get_period_data(base_df, days_back=0, is_today=False, is_yesterday=False):
-        today = pd.Timestamp.now().normalize()
-        if is_today:
-            start_date = today
-            end_date = today
-        elif is_yesterday:
-            start_date = today - timedelta(days=1)
-            end_date = today - timedelta(days=1)
-        else:
-            start_date = today - timedelta(days=days_back)
-            end_date = today
-            
-        mask = (base_df["Date"] >= start_date) & (base_df["Date"] <= end_date)
-        return base_df[mask]
-
-    def display_period_table(df_period, title, tab_mode):
-        if df_period.empty:
-            st.markdown(f"##### {title}")
-            st.caption("データなし")
-            return
+    timer.lap("kpi")
 
-        # データを分離
-        df_meta_period = df_period[df_period["Media"] == "Meta"]
-        df_beyond_period = df_period[df_period["Media"] == "Beyond"]
-        
-        # 案件リストを取得
-        all_projects = set()
-        if not df_meta_period.empty:
-            all_projects.update(df_meta_period["Campaign_Name"].unique())
-        if not df_beyond_period.empty:
-            all_projects.update(df_beyond_period["Campaign_Name"].unique())
-        
-        if not all_projects:
-            st.markdown(f"##### {title}")
-            st.caption("データなし")
-            return
-        
-        table_data = []
-        
-        for project_name in sorted(all_projects):
-            if tab_mode == "合計":
-                # === 合計タブ ===
-                # Metaデータから取得
-                meta_project = df_meta_period[df_meta_period["Campaign_Name"] == project_name]
-                impressions = meta_project["Impressions"].sum()
-                meta_clicks = meta_project["Clicks"].sum()
-                meta_cost = meta_project["Cost"].sum()
-                
-                # Beyondデータから取得
-                beyond_project = df_beyond_period[df_beyond_period["Campaign_Name"] == project_name]
-                beyond_cost = beyond_project["Cost"].sum()
-                beyond_pv = beyond_project["PV"].sum()
-                beyond_clicks = beyond_project["Clicks"].sum()  # MCV（記事LP遷移）
-                beyond_cv = beyond_project["CV"].sum()
-                
-                # 売上計算（Master_Settingに基づき processor 側で計算済み）
-                revenue = beyond_project["Revenue"].sum() if "Revenue" in beyond_project.columns else 0
-                
-                # 出稿金額はBeyondを使用（表示用）
-                cost_for_display = beyond_cost
-                profit = revenue - cost_for_display
-                recovery_rate = safe_divide(revenue, beyond_cost) * 100
-                roas = safe_divide(profit, revenue) * 100
-                
-                # 率計算
-                ctr = safe_divide(meta_clicks, impressions) * 100
-                mcvr = safe_divide(beyond_clicks, beyond_pv) * 100
-                cvr = safe_divide(beyond_cv, beyond_clicks) * 100
-                
-                # コスト計算
-                cpm = safe_divide(meta_cost, impressions) * 1000
-                cpc = safe_divide(meta_cost, meta_clicks)
-                mcpa = safe_divide(beyond_cost, beyond_clicks)
-                cpa = safe_divide(beyond_cost, beyond_cv)
-                
-                table_data.append({
-                    '案件名': project_name,
-                    '出稿金額': int(cost_for_display) if not pd.isna(cost_for_display) else 0,
-                    '売上': int(revenue) if not pd.isna(revenue) else 0,
-                    '粗利': int(profit) if not pd.isna(profit) else 0,
-                    '回収率': f"{recovery_rate:.1f}%",
-                    'ROAS': f"{roas:.1f}%",
-                    'Imp': int(impressions) if not pd.isna(impressions) else 0,
-                    'Clicks': int(meta_clicks) if not pd.isna(meta_clicks) else 0,
-                    '商品LPクリック': int(beyond_clicks) if not pd.isna(beyond_clicks) else 0,
-                    'CV': int(beyond_cv) if not pd.isna(beyond_cv) else 0,
-                    'CTR': f"{ctr:.1f}%",
-                    'MCVR': f"{mcvr:.1f}%",
-                    'CVR': f"{cvr:.1f}%",
-                    'CPM': int(cpm) if not pd.isna(cpm) else 0,
-                    'CPC': int(cpc) if not pd.isna(cpc) else 0,
-                    'MCPA': int(mcpa) if not pd.isna(mcpa) else 0,
-                    'CPA': int(cpa) if not pd.isna(cpa) else 0,
-                })
-                
-            elif tab_mode == "Meta":
-                # === Metaタブ ===
-                meta_project = df_meta_period[df_meta_period["Campaign_Name"] == project_name]
-                
-                cost = meta_project["Cost"].sum()
-                impressions = meta_project["Impressions"].sum()
-                clicks = meta_project["Clicks"].sum()
-                cv = meta_project["MCV"].sum()  # MetaのCV = MCV相当
-                
-                ctr = safe_divide(clicks, impressions) * 100
-                cpm = safe_divide(cost, impressions) * 1000
-                cpc = safe_divide(cost, clicks)
-                cpa = safe_divide(cost, cv)
-                
-                table_data.append({
-                    '案件名': project_name,
-                    '出稿金額': int(cost) if not pd.isna(cost) else 0,
-                    'Imp': int(impressions) if not pd.isna(impressions) else 0,
-                    'Clicks': int(clicks) if not pd.isna(clicks) else 0,
-                    'CV': int(cv) if not pd.isna(cv) else 0,
-                    'CTR': f"{ctr:.1f}%",
-                    'CPM': int(cpm) if not pd.isna(cpm) else 0,
-                    'CPC': int(cpc) if not pd.isna(cpc) else 0,
-                    'CPA': int(cpa) if not pd.isna(cpa) else 0,
-                })
-                
-            elif tab_mode == "Beyond":
-                # === Beyondタブ ===
-                beyond_project = df_beyond_period[df_beyond_period["Campaign_Name"] == project_name]
-                
-                cost = beyond_project["Cost"].sum()
-                pv = beyond_project["PV"].sum()
-                clicks = beyond_project["Clicks"].sum()  # MCV（記事LP遷移）
-                cv = beyond_project["CV"].sum()
-                fv_exit = beyond_project["FV_Exit"].sum()
-                sv_exit = beyond_project["SV_Exit"].sum()
-                
-                # 売上・粗利・回収率・ROASは計算しない（合計タブでのみ表示）
-                mcvr = safe_divide(clicks, pv) * 100
-                cvr = safe_divide(cv, clicks) * 100
-                cpc = safe_divide(cost, clicks)
-                cpa = safe_divide(cost, cv)
-                mcpa = safe_divide(cost, clicks)
-                fv_rate = safe_divide(fv_exit, pv) * 100
-                sv_rate = safe_divide(sv_exit, (pv - fv_exit)) * 100
-                total_exit_rate = safe_divide((fv_exit + sv_exit), pv) * 100
-                
-                table_data.append({
-                    '案件名': project_name,
-                    '出稿金額': int(cost) if not pd.isna(cost) else 0,
-                    'PV': int(pv) if not pd.isna(pv) else 0,
-                    'Clicks': int(clicks) if not pd.isna(clicks) else 0,
-                    'CV': int(cv) if not pd.isna(cv) else 0,
-                    'MCVR': f"{mcvr:.1f}%",
-                    'CVR': f"{cvr:.1f}%",
-                    'CPC': int(cpc) if not pd.isna(cpc) else 0,
-                    'CPA': int(cpa) if not pd.isna(cpa) else 0,
-                    'MCPA': int(mcpa) if not pd.isna(mcpa) else 0,
-                    'FV離脱率': f"{fv_rate:.1f}%",
-                    'SV離脱率': f"{sv_rate:.1f}%",
-                    'FV+SV離脱率': f"{total_exit_rate:.1f}%",
-                })
-        
-        if not table_data:
-            st.markdown(f"##### {title}")
-            st.caption("データなし")
-            return
-        
-        # DataFrameに変換
-        result_df = pd.DataFrame(table_data)
-        
-        st.markdown(f"##### {title}")
-        st.dataframe(result_df, use_container_width=True)
+    # --- 7. Tables & Charts ---
 
     # フィルタ用ベースデータ作成 (日付フィルタ以外を適用)
-    # 1. Media Filter
-    if selected_tab == "Meta":
-        df_base = df[df["Media"] == "Meta"]
-    elif selected_tab == "Beyond":
-        df_base = df[df["Media"] == "Beyond"]
+    if store is not None:
+        # 期間テーブル（当日/昨日/直近7日）とAIダイジェストが使う範囲だけ 日付×媒体×案件 に集計して受け取る
+        base_filters = store_base_filters(selected_tab, selected_campaign, selected_article, selected_creative)
+        df_base = store.aggregate(["Date", "Media", "Campaign_Name"], BASE_METRICS, start=today - timedelta(days=6), **base_filters)
     else:
-        df_base = df
+        df_base = base_frame(df, selected_tab, selected_campaign, selected_article, selected_creative)
 
-    # 2. Campaign/Creative Filter
-    mask_base = pd.Series(True, index=df_base.index)
-    if selected_campaign != "All":
-        mask_base &= (df_base["Campaign_Name"] == selected_campaign)
-    if selected_article != "All":
-        mask_base &= (df_base["Creative"] == selected_article)
-    if selected_creative != "All":
-        mask_base &= (df_base["Creative"] == selected_creative)
-    
-    df_base = df_base[mask_base]
+    # AIアシスタント用: 表示中のフィルタ状態だけ登録（ダイジェストは質問送信時に共有データから生成）
+    st.session_state["ai_digest_filters"] = (selected_tab, selected_campaign, selected_article, selected_creative)
 
     st.markdown("---")
     
-    # すべての期間テーブルを縦1列に配置
-    display_period_table(get_period_data(df_base, is_today=True), "■案件別数値（当日）", selected_tab)
-    display_period_table(get_period_data(df_base, is_yesterday=True), "■案件別数値（昨日）", selected_tab)
-    display_period_table(get_period_data(df_base, days_back=2), "■案件別数値（直近3日間）", selected_tab)  # 当日含む3日
-    display_period_table(get_period_data(df_base, days_back=6), "■案件別数値（直近7日間）", selected_tab)  # 当日含む7日
-    display_period_table(df_filtered, "■案件別数値（選択期間）", selected_tab)
+    # 期間テーブルは選択されたものだけ計算・表示
+    render_period_tables(df_base, df_filtered, selected_tab)
+    timer.lap("tables")
     
     st.markdown("---")
-    display_charts(df_filtered)
+    # 同一フィルタ状態のリラン（AI送信や選択中タブの再クリック等）では生成済みグラフを再利用
+    chart_cache_key = (
+        load_data_version(),
+        selected_tab,
+        selected_campaign,
+        selected_article,
+        selected_creative,
+        tuple(str(d) for d in date_range) if isinstance(date_range, (tuple, list)) else str(date_range),
+    )
+    display_charts(df_filtered, cache_key=chart_cache_key)
+    timer.lap("charts")
+
+    display_perf_panel()
+
+# --- DuckDB ストア ---
+# KPI・期間テーブル・グラフ・AIダイジェスト用に 日付×媒体×案件 で集計しておく指標
+BASE_METRICS = ["Cost", "Impressions", "Clicks", "MCV", "CV", "PV", "FV_Exit", "SV_Exit", "Revenue", "Gross_Profit"]
+
+
+# --- Metrics ---
+def _record_data_metrics(df, store=None):
+    """媒体別の行数・Unmapped 行数をゲージに記録する（メトリクス有効時のみ呼ぶ）"""
+    if store is not None:
+        counts = store.aggregate(["Media", "Campaign_Name"], [])
+    else:
+        counts = df.groupby(["Media", "Campaign_Name"]).size().rename("Rows").reset_index()
+    for media, group in counts.groupby("Media"):
+        metrics.set_gauge("dashboard_rows", int(group["Rows"].sum()), media=media)
+        metrics.set_gauge("dashboard_unmapped_rows", int(group.loc[group["Campaign_Name"] == "Unmapped", "Rows"].sum()), media=media)
+
+
+def _detect_interaction(selected_tab, selected_campaign, selected_article, selected_creative, date_range):
+    """
+    前回のリランとのフィルタ差分から、このリランを起こした操作名を推定する。
+    差分が無ければ "other"（再読み込み・フィルタ以外のボタン等）
+    """
+    current = {
+        "tab": selected_tab,
+        "campaign": selected_campaign,
+        "article": selected_article,
+        "creative": selected_creative,
+        "date": str(date_range),
+    }
+    previous = st.session_state.get("_metrics_last_filters")
+    st.session_state["_metrics_last_filters"] = current
+    if previous is None:
+        return "initial"
+    return next((name for name, value in current.items() if previous.get(name) != value), "other")
+
+
+def _object_cache_metrics():
+    """図・ピボット・AI 応答キャッシュの件数とヒット/ミス（Prometheus 出力時に呼ばれる）"""
+    rows = []
+    caches = (
+        ("figures", get_figure_cache().stats()),
+        ("pivots", get_pivot_cache().stats()),
+        ("ai_response", get_response_cache().stats()),
+    )
+    for cache_name, stats in caches:
+        for field in ("size", "hits", "misses", "evictions"):
+            rows.append((f"dashboard_object_cache_{field}", {"cache": cache_name}, stats[field]))
+    return rows
+
+
+metrics.register_collector("object_caches", _object_cache_metrics)
+
+
+# --- Tables ---
+# テーブル表示用ヘルパー
+def get_period_data(base_df, days_back=0, is_today=False, is_yesterday=False):
+    today = pd.Timestamp.now().normalize()
+    if is_today:
+        start_date = today
+        end_date = today
+    elif is_yesterday:
+        start_date = today - timedelta(days=1)
+        end_date = today - timedelta(days=1)
+    else:
+        start_date = today - timedelta(days=days_back)
+        end_date = today
+
+    mask = (base_df["Date"] >= start_date) & (base_df["Date"] <= end_date)
+    return base_df[mask]
+
+def display_period_table(df_period, title, tab_mode):
+    if df_period.empty:
+        st.markdown(f"##### {title}")
+        st.caption("データなし")
+        return
+
+    # データを分離
+    df_meta_period = df_period[df_period["Media"] == "Meta"]
+    df_beyond_period = df_period[df_period["Media"] == "Beyond"]
+
+    # 案件リストを取得
+    all_projects = set()
+    if not df_meta_period.empty:
+        all_projects.update(df_meta_period["Campaign_Name"].unique())
+    if not df_beyond_period.empty:
+        all_projects.update(df_beyond_period["Campaign_Name"].unique())
+
+    if not all_projects:
+        st.markdown(f"##### {title}")
+        st.caption("データなし")
+        return
+
+    table_data = []
+
+    for project_name in sorted(all_projects):
+        if tab_mode == "合計":
+            # === 合計タブ ===
+            # Metaデータから取得
+            meta_project = df_meta_period[df_meta_period["Campaign_Name"] == project_name]
+            impressions = meta_project["Impressions"].sum()
+            meta_clicks = meta_project["Clicks"].sum()
+            meta_cost = meta_project["Cost"].sum()
+
+            # Beyondデータから取得
+            beyond_project = df_beyond_period[df_beyond_period["Campaign_Name"] == project_name]
+            beyond_cost = beyond_project["Cost"].sum()
+            beyond_pv = beyond_project["PV"].sum()
+            beyond_clicks = beyond_project["Clicks"].sum()  # MCV（記事LP遷移）
+            beyond_cv = beyond_project["CV"].sum()
+
+            # 売上計算（Master_Settingに基づき processor 側で計算済み）
+            revenue = beyond_project["Revenue"].sum() if "Revenue" in beyond_project.columns else 0
+
+            # 出稿金額はBeyondを使用（表示用）
+            cost_for_display = beyond_cost
+            profit = revenue - cost_for_display
+            recovery_rate = safe_divide(revenue, beyond_cost) * 100
+            roas = safe_divide(profit, revenue) * 100
+
+            # 率計算
+            ctr = safe_divide(meta_clicks, impressions) * 100
+            mcvr = safe_divide(beyond_clicks, beyond_pv) * 100
+            cvr = safe_divide(beyond_cv, beyond_clicks) * 100
+
+            # コスト計算
+            cpm = safe_divide(meta_cost, impressions) * 1000
+            cpc = safe_divide(meta_cost, meta_clicks)
+            mcpa = safe_divide(beyond_cost, beyond_clicks)
+            cpa = safe_divide(beyond_cost, beyond_cv)
+
+            table_data.append({
+                '案件名': project_name,
+                '出稿金額': int(cost_for_display) if not pd.isna(cost_for_display) else 0,
+                '売上': int(revenue) if not pd.isna(revenue) else 0,
+                '粗利': int(profit) if not pd.isna(profit) else 0,
+                '回収率': f"{recovery_rate:.1f}%",
+                'ROAS': f"{roas:.1f}%",
+                'Imp': int(impressions) if not pd.isna(impressions) else 0,
+                'Clicks': int(meta_clicks) if not pd.isna(meta_clicks) else 0,
+                '商品LPクリック': int(beyond_clicks) if not pd.isna(beyond_clicks) else 0,
+                'CV': int(beyond_cv) if not pd.isna(beyond_cv) else 0,
+                'CTR': f"{ctr:.1f}%",
+                'MCVR': f"{mcvr:.1f}%",
+                'CVR': f"{cvr:.1f}%",
+                'CPM': int(cpm) if not pd.isna(cpm) else 0,
+                'CPC': int(cpc) if not pd.isna(cpc) else 0,
+                'MCPA': int(mcpa) if not pd.isna(mcpa) else 0,
+                'CPA': int(cpa) if not pd.isna(cpa) else 0,
+            })
+
+        elif tab_mode == "Meta":
+            # === Metaタブ ===
+            meta_project = df_meta_period[df_meta_period["Campaign_Name"] == project_name]
+
+            cost = meta_project["Cost"].sum()
+            impressions = meta_project["Impressions"].sum()
+            clicks = meta_project["Clicks"].sum()
+            cv = meta_project["MCV"].sum()  # MetaのCV = MCV相当
+
+            ctr = safe_divide(clicks, impressions) * 100
+            cpm = safe_divide(cost, impressions) * 1000
+            cpc = safe_divide(cost, clicks)
+            cpa = safe_divide(cost, cv)
+
+            table_data.append({
+                '案件名': project_name,
+                '出稿金額': int(cost) if not pd.isna(cost) else 0,
+                'Imp': int(impressions) if not pd.isna(impressions) else 0,
+                'Clicks': int(clicks) if not pd.isna(clicks) else 0,
+                'CV': int(cv) if not pd.isna(cv) else 0,
+                'CTR': f"{ctr:.1f}%",
+                'CPM': int(cpm) if not pd.isna(cpm) else 0,
+                'CPC': int(cpc) if not pd.isna(cpc) else 0,
+                'CPA': int(cpa) if not pd.isna(cpa) else 0,
+            })
+
+        elif tab_mode == "Beyond":
+            # === Beyondタブ ===
+            beyond_project = df_beyond_period[df_beyond_period["Campaign_Name"] == project_name]
+
+            cost = beyond_project["Cost"].sum()
+            pv = beyond_project["PV"].sum()
+            clicks = beyond_project["Clicks"].sum()  # MCV（記事LP遷移）
+            cv = beyond_project["CV"].sum()
+            fv_exit = beyond_project["FV_Exit"].sum()
+            sv_exit = beyond_project["SV_Exit"].sum()
+
+            # 売上・粗利・回収率・ROASは計算しない（合計タブでのみ表示）
+            mcvr = safe_divide(clicks, pv) * 100
+            cvr = safe_divide(cv, clicks) * 100
+            cpc = safe_divide(cost, clicks)
+            cpa = safe_divide(cost, cv)
+            mcpa = safe_divide(cost, clicks)
+            fv_rate = safe_divide(fv_exit, pv) * 100
+            sv_rate = safe_divide(sv_exit, (pv - fv_exit)) * 100
+            total_exit_rate = safe_divide((fv_exit + sv_exit), pv) * 100
+
+            table_data.append({
+                '案件名': project_name,
+                '出稿金額': int(cost) if not pd.isna(cost) else 0,
+                'PV': int(pv) if not pd.isna(pv) else 0,
+                'Clicks': int(clicks) if not pd.isna(clicks) else 0,
+                'CV': int(cv) if not pd.isna(cv) else 0,
+                'MCVR': f"{mcvr:.1f}%",
+                'CVR': f"{cvr:.1f}%",
+                'CPC': int(cpc) if not pd.isna(cpc) else 0,
+                'CPA': int(cpa) if not pd.isna(cpa) else 0,
+                'MCPA': int(mcpa) if not pd.isna(mcpa) else 0,
+                'FV離脱率': f"{fv_rate:.1f}%",
+                'SV離脱率': f"{sv_rate:.1f}%",
+                'FV+SV離脱率': f"{total_exit_rate:.1f}%",
+            })
+
+    if not table_data:
+        st.markdown(f"##### {title}")
+        st.caption("データなし")
+        return
+
+    # DataFrameに変換
+    result_df = pd.DataFrame(table_data)
+
+    st.markdown(f"##### {title}")
+    st.dataframe(result_df, use_container_width=True)
+
+
+# 期間テーブル定義: (ラベル, get_period_data の引数 / None=選択期間)
+PERIOD_TABLES = [
+    ("■案件別数値（当日）", dict(is_today=True)),
+    ("■案件別数値（昨日）", dict(is_yesterday=True)),
+    ("■案件別数値（直近3日間）", dict(days_back=2)),  # 当日含む3日
+    ("■案件別数値（直近7日間）", dict(days_back=6)),  # 当日含む7日
+    ("■案件別数値（選択期間）", None),
+]
+
+
+@fragment
+def render_period_tables(df_base, df_filtered, selected_tab):
+    """
+    期間テーブル。選択された期間だけ集計・表示する
+    （フラグメントなので選択変更でページ全体はリランしない）
+    """
+    metrics.fragment_rerun("period_tables")
+    labels = [label for label, _ in PERIOD_TABLES]
+    selected = st.multiselect(
+        "表示する案件別テーブル",
+        options=labels,
+        default=[],
+        key="period_tables_selected",
+        placeholder="テーブルを選択すると集計して表示します",
+    )
+    for label, period_kwargs in PERIOD_TABLES:
+        if label not in selected:
+            continue
+        df_period = df_filtered if period_kwargs is None else get_period_data(df_base, **period_kwargs)
+        display_period_table(df_period, label, selected_tab)
+
+
+# --- Unmapped 診断 ---
+@fragment
+def render_unmapped_diagnostics(load_unmapped, master_rules):
+    """
+    Unmapped 診断。トグルを ON にしたときだけ集計・候補推定を行う
+    （フラグメントなので ON/OFF でページ全体はリランしない）
+    load_unmapped: 現在のフィルタ範囲の Unmapped 行を返す関数（ON のときだけ呼ぶ）
+    """
+    metrics.fragment_rerun("unmapped")
+    show = st.toggle("🧭 Unmapped診断（マスターに紐づかない行）", key="show_unmapped_diagnostics")
+    if not show:
+        return
+
+    unmapped = load_unmapped().copy()
+    st.caption("Master_Setting の Meta名/Beyond名 にマッチせず、案件に紐づかなかった行の一覧です。")
+
+    if unmapped.empty:
+        st.success("この条件（期間/フィルタ）では Unmapped はありません。")
+    else:
+        st.warning(f"Unmapped 行数: {len(unmapped)}")
+
+        meta_unmapped = unmapped[unmapped["Media"] == "Meta"].copy()
+        beyond_unmapped = unmapped[unmapped["Media"] == "Beyond"].copy()
+
+        meta_tokens = master_rules.get("meta_tokens", [])
+        beyond_tokens = master_rules.get("beyond_tokens", [])
+
+        if not meta_unmapped.empty:
+            # 近い候補を推定表示
+            meta_unmapped["マッチ対象（Campaign Name）"] = meta_unmapped.get("Campaign Name", "")
+            meta_unmapped["推定候補（近いMaster）"] = get_token_index(meta_tokens).suggest_series(
+                meta_unmapped["マッチ対象（Campaign Name）"]
+            )
+            show_cols = [c for c in [
+                "Date", "Account Name", "Campaign Name", "Ad Set Name", "Creative", "Cost", "Impressions", "Clicks", "MCV",
+                "マッチ対象（Campaign Name）", "推定候補（近いMaster）"
+            ] if c in meta_unmapped.columns]
+            st.markdown("##### Meta Unmapped")
+            st.dataframe(meta_unmapped[show_cols].sort_values("Date", ascending=False), use_container_width=True)
+
+        if not beyond_unmapped.empty:
+            beyond_unmapped["マッチ対象（beyond_page_name）"] = beyond_unmapped.get("beyond_page_name", "")
+            beyond_unmapped["推定候補（近いMaster）"] = get_token_index(beyond_tokens).suggest_series(
+                beyond_unmapped["マッチ対象（beyond_page_name）"]
+            )
+            show_cols = [c for c in [
+                "Date", "beyond_page_name", "version_name", "Parameter", "Cost", "PV", "Clicks", "CV",
+                "マッチ対象（beyond_page_name）", "推定候補（近いMaster）"
+            ] if c in beyond_unmapped.columns]
+            st.markdown("##### Beyond Unmapped")
+            st.dataframe(beyond_unmapped[show_cols].sort_values("Date", ascending=False), use_container_width=True)
 
 # --- KPI Card Helpers ---
 def kpi_card(label, value, unit="", color_class=""):
@@ -1016,4 +1157,6 @@ def display_aggregated_table(dataframe, title):
 
 if __name__ == "__main__":
     if check_password():
-        main()
+        metrics.start_exporter()
+        with metrics.full_run():
+            main()
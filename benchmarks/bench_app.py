@@ -0,0 +1,238 @@
+"""
+app.py のリラン遅延ベンチマーク（Streamlit AppTest でヘッドレス実行）。
+
+合成データのスナップショットを作ってローカル読み込み（DASHBOARD_DATA_DIR）に切り替え、
+認証（check_password）をセッション状態でバイパスし、AI はスタブモデル（DASHBOARD_AI_MODEL=stub）で動かす。
+タブ切替・商品/クリエイティブ絞り込み・期間変更・セクション展開・AI送信を台本どおりに操作し、
+操作種別ごとの p50/p95 リラン時間を出す。--sessions で同時セッション数を指定できる。
+失敗した操作（アプリ側の例外・AI の回答が履歴に入らない等）はサンプルから除き、1件でもあれば非ゼロ終了する。
+
+使い方:
+    python -m benchmarks.bench_app --rows 200000 --projects 30 --iterations 5
+    python -m benchmarks.bench_app --rows 200000 --sessions 4 --output bench_output.txt
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.synthetic import generate_dataset, generate_knowledge, write_snapshot
+
+APP_PATH = Path(__file__).resolve().parent.parent / "app.py"
+
+# app.py のクイック提案（ボタンのラベル, 送られる質問）
+QUICK_ACTIONS = [
+    ("📈 CPA改善のヒント", "CPAを改善するためのアドバイスを教えてください。"),
+    ("🎨 クリエイティブ改善", "クリエイティブの改善ポイントを教えてください。"),
+    ("📊 配信最適化", "Meta広告の配信を最適化するコツを教えてください。"),
+    ("🎯 ターゲティング戦略", "効果的なターゲティング戦略について教えてください。"),
+]
+
+
+def _find(elements, label):
+    return next(e for e in elements if e.label == label)
+
+
+class Session:
+    """1ユーザー分の AppTest。操作ごとの run() 時間を記録する"""
+
+    def __init__(self, timeout: float, seed: int):
+        from streamlit.testing.v1 import AppTest
+
+        self.at = AppTest.from_file(str(APP_PATH), default_timeout=timeout)
+        # 認証をバイパス
+        self.at.session_state["password_correct"] = True
+        self.rng = random.Random(seed)
+        self.timings: dict[str, list[float]] = defaultdict(list)
+        self.errors: list[str] = []
+
+    def _timed(self, name: str, action, check=None) -> None:
+        """
+        action() の時間を記録する。アプリ側の例外や check() の失敗（エラー文字列を返す）は
+        errors に記録し、その回の時間はサンプルに入れない
+        """
+        started = time.perf_counter()
+        action()
+        elapsed = time.perf_counter() - started
+        if self.at.exception:
+            self.errors.append(f"{name}: {self.at.exception[0].value}")
+            return
+        problem = check() if check is not None else None
+        if problem:
+            self.errors.append(f"{name}: {problem}")
+            return
+        self.timings[name].append(elapsed)
+
+    def _answered(self, question: str):
+        """AI 送信後のチェック: 履歴の末尾がこの質問とそれへの AI の回答になっていること"""
+        def check():
+            if "ai_pending" in self.at.session_state:
+                return "AI の回答が完了していません"
+            history = self.at.session_state["ai_chat_history"] if "ai_chat_history" in self.at.session_state else []
+            if len(history) < 2 or history[-2] != {"role": "user", "content": question} or history[-1]["role"] != "assistant":
+                return f"AI の回答が履歴にありません（末尾: {history[-2:]}）"
+            return None
+        return check
+
+    # --- 操作 ---
+    def initial(self):
+        self._timed("initial", lambda: self.at.run())
+
+    def rerun_noop(self):
+        self._timed("rerun_noop", lambda: self.at.run())
+
+    def tab_switch(self):
+        key = self.rng.choice(["tab_total", "tab_meta", "tab_beyond"])
+        self._timed("tab_switch", lambda: self.at.button(key=key).click().run())
+
+    def campaign_filter(self):
+        box = _find(self.at.selectbox, "商品名")
+        value = self.rng.choice(box.options)
+        self._timed("campaign_filter", lambda: box.set_value(value).run())
+
+    def creative_filter(self):
+        box = _find(self.at.selectbox, "クリエイティブ")
+        if box.disabled or len(box.options) < 2:
+            return
+        value = self.rng.choice(box.options[:50])
+        self._timed("creative_filter", lambda: box.set_value(value).run())
+
+    def date_range(self):
+        widget = _find(self.at.date_input, "期間")
+        end = widget.value[-1] if isinstance(widget.value, (tuple, list)) else widget.value
+        days = self.rng.choice([7, 30, 90, 180])
+        start = end - timedelta(days=days)
+        self._timed("date_range", lambda: widget.set_value((start, end)).run())
+
+    def expand_sections(self):
+        # 絞り込みの結果データが空ならグラフ・期間テーブルの選択は出ないので、あるものだけ開く
+        present = {t.key for t in self.at.toggle} | {m.key for m in self.at.multiselect}
+        if not present & ({f"show_chart_row_{i}" for i in range(4)} | {"period_tables_selected"}):
+            return
+
+        def action():
+            for i in range(4):
+                if f"show_chart_row_{i}" in present:
+                    self.at.toggle(key=f"show_chart_row_{i}").set_value(True)
+            if "period_tables_selected" in present:
+                self.at.multiselect(key="period_tables_selected").set_value(["■案件別数値（直近7日間）", "■案件別数値（選択期間）"])
+            self.at.run()
+        self._timed("expand_sections", action)
+
+    def ai_submit(self):
+        question = self.rng.choice([
+            "CPAが悪化している案件の改善策は？",
+            "CTRを改善するにはどうすればいいですか？",
+            "昨日と比べて費用が増えた理由を教えて",
+        ])
+
+        def action():
+            self.at.text_area(key="ai_user_input").input(question)
+            _find(self.at.button, "📤 送信").click()
+            self.at.run()
+        self._timed("ai_submit", action, check=self._answered(question))
+
+    def ai_quick_action(self):
+        label, prompt = self.rng.choice(QUICK_ACTIONS)
+        self._timed("ai_quick_action", lambda: self.at.button(key=f"quick_{label}").click().run(), check=self._answered(prompt))
+
+    def run_script(self, iterations: int) -> None:
+        self.initial()
+        steps = [
+            self.rerun_noop, self.tab_switch, self.campaign_filter, self.creative_filter,
+            self.date_range, self.expand_sections, self.ai_submit, self.ai_quick_action,
+        ]
+        for _ in range(iterations):
+            for step in steps:
+                try:
+                    step()
+                except Exception as e:  # 1操作の失敗で全体を止めない
+                    self.errors.append(f"{step.__name__}: {e!r}")
+
+
+def summarize(timings: dict[str, list[float]]) -> dict:
+    out = {}
+    for name, values in timings.items():
+        arr = np.asarray(values) * 1000
+        out[name] = {
+            "n": int(arr.size),
+            "p50_ms": round(float(np.percentile(arr, 50)), 1),
+            "p95_ms": round(float(np.percentile(arr, 95)), 1),
+            "max_ms": round(float(arr.max()), 1),
+        }
+    return out
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="app.py のリラン遅延ベンチマーク（AppTest）")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--projects", type=int, default=30)
+    parser.add_argument("--knowledge", type=int, default=300)
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--sessions", type=int, default=1, help="同時セッション数")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data = generate_dataset(n_rows=args.rows, n_projects=args.projects, seed=args.seed)
+        data["Knowledge"] = generate_knowledge(args.knowledge, np.random.default_rng(args.seed))
+        write_snapshot(data, tmp)
+
+        os.environ["DASHBOARD_DATA_DIR"] = tmp
+        os.environ["DASHBOARD_AI_MODEL"] = "stub"
+
+        sessions = [Session(args.timeout, seed=args.seed + i) for i in range(args.sessions)]
+        started = time.perf_counter()
+        if args.sessions == 1:
+            sessions[0].run_script(args.iterations)
+        else:
+            barrier = threading.Barrier(args.sessions)
+
+            def run(session):
+                barrier.wait()
+                session.run_script(args.iterations)
+
+            with ThreadPoolExecutor(max_workers=args.sessions) as pool:
+                list(pool.map(run, sessions))
+        wall = time.perf_counter() - started
+
+    merged: dict[str, list[float]] = defaultdict(list)
+    errors = []
+    for s in sessions:
+        for name, values in s.timings.items():
+            merged[name].extend(values)
+        errors.extend(s.errors)
+
+    summary = summarize(merged)
+    print(f"rows={args.rows:,} projects={args.projects} sessions={args.sessions} iterations={args.iterations} wall={wall:.1f}s")
+    print(f"{'interaction':<18} {'n':>5} {'p50(ms)':>10} {'p95(ms)':>10} {'max(ms)':>10}")
+    for name, row in summary.items():
+        print(f"{name:<18} {row['n']:>5} {row['p50_ms']:>10.1f} {row['p95_ms']:>10.1f} {row['max_ms']:>10.1f}")
+    if args.output:
+        report = {"args": vars(args), "wall_seconds": wall, "latency": summary, "errors": errors}
+        Path(args.output).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    # 失敗した操作がある計測結果は信用できないので、非ゼロ終了にする
+    if errors:
+        print(f"\nエラー {len(errors)} 件（先頭5件）:")
+        for e in errors[:5]:
+            print(f"  - {e}")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
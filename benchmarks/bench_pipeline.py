@@ -0,0 +1,213 @@
+"""
+data/loader・data/processor のマイクロベンチマーク。
+
+合成データ（benchmarks/synthetic.py）に対して各ステージの実行時間とピークメモリ
+（tracemalloc、時間とは別パス）を計測し、保存済みのベースラインと比較する。
+
+使い方:
+    python -m benchmarks.bench_pipeline --rows 100000 --projects 50
+    python -m benchmarks.bench_pipeline --scales 10000,100000,1000000 --save-baseline
+    python -m benchmarks.bench_pipeline --rows 1000000 --baseline benchmarks/baseline.json
+    python -m benchmarks.bench_pipeline --rows 100000 --dtype-backend pyarrow   # Arrow-backed 読み込み
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import platform
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import pandas as pd
+
+from benchmarks.synthetic import generate_dataset, write_snapshot
+from data import processor_polars
+from data.loader import read_sheet_csv
+from data.processor import (
+    _match_project,
+    build_master_rules,
+    extract_creative_from_text,
+    process_beyond_data,
+    process_data,
+    process_meta_data,
+)
+from utils.memory import frame_bytes
+
+DEFAULT_BASELINE = Path(__file__).with_name("baseline.json")
+
+# ベースライン比でこの倍率を超えたら回帰として報告する
+REGRESSION_TOLERANCE = 1.2
+
+
+def _copy_data(data: dict[str, pd.DataFrame]) -> dict[str, pd.DataFrame]:
+    # processor は入力の日付列を書き換えるので、計測ごとにコピーを渡す
+    return {k: v.copy() for k, v in data.items()}
+
+
+def measure(fn, setup=None, repeat: int = 3) -> dict:
+    """
+    fn を repeat 回実行し、最短時間と最大ピークメモリを返す。
+    tracemalloc 中は数倍遅くなるので、時間（トレースなし）とピークメモリ（トレースあり）は別パスで計る。
+    setup 指定時は毎回計測の外で setup() を呼び、戻り値のタプルを fn の引数にする（入力のコピー等）。
+    """
+    def call(traced: bool):
+        args = setup() if setup is not None else ()
+        gc.collect()
+        if traced:
+            tracemalloc.start()
+        started = time.perf_counter()
+        fn(*args)
+        elapsed = time.perf_counter() - started
+        peak = 0
+        if traced:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        return elapsed, peak
+
+    times = [call(traced=False)[0] for _ in range(repeat)]
+    peaks = [call(traced=True)[1] for _ in range(repeat)]
+    return {"seconds": min(times), "peak_mb": max(peaks) / 1024 / 1024}
+
+
+def build_stages(data: dict[str, pd.DataFrame], snapshot_dir: Path, dtype_backend: str | None = None) -> dict:
+    """
+    計測対象ステージ: 名前 -> (計測関数, 入力を用意する setup または None)。
+    入力のコピーは setup 側で作るので計測時間に含まれない
+    """
+    rules = build_master_rules(data["Master_Setting"])
+    campaigns = pd.concat([data["Meta_History"], data["Meta_Live"]])["Campaign Name"].tolist()
+    ad_names = pd.concat([data["Meta_History"], data["Meta_Live"]])["Ad Name"].tolist()
+
+    def copy_meta():
+        return data["Meta_Live"].copy(), data["Meta_History"].copy()
+
+    def copy_beyond():
+        return data["Beyond_Live"].copy(), data["Beyond_History"].copy()
+
+    def copy_all():
+        return (_copy_data(data),)
+
+    def stage_read_csv():
+        # load_sheet_data と同じ read_sheet_csv（ネットワーク分は含まない）
+        for name in data:
+            read_sheet_csv(snapshot_dir / f"{name}.csv", dtype_backend=dtype_backend)
+
+    stages = {
+        "read_csv": (stage_read_csv, None),
+        "build_master_rules": (lambda: build_master_rules(data["Master_Setting"]), None),
+        "_match_project": (lambda: [_match_project(c, rules["meta_tokens"]) for c in campaigns], None),
+        "extract_creative_from_text": (lambda: [extract_creative_from_text(a) for a in ad_names], None),
+        "process_meta_data": (lambda live, history: process_meta_data(live, history, master_rules=rules), copy_meta),
+        "process_beyond_data": (lambda live, history: process_beyond_data(live, history, master_rules=rules), copy_beyond),
+        "process_data": (process_data, copy_all),
+        # プロセス並列（2ワーカー・日付4チャンク）: pickle の往復込みで逐次の process_data より速いかを見る。
+        # コアが1つの環境では速くならない。peak は親プロセスの割り当て（結果の受け取り）だけ
+        "process_data_process": (lambda d: process_data(d, parallel="process", chunks=4, workers=2), copy_all),
+    }
+    if processor_polars.is_available():
+        stages["process_data_polars"] = (processor_polars.process_data, copy_all)
+    return stages
+
+
+def frame_sizes(data: dict[str, pd.DataFrame]) -> dict:
+    """入力シート合計と process_data 出力の deep メモリ（MB）"""
+    output = process_data(_copy_data(data))
+    return {
+        "input_mb": sum(frame_bytes(df) for df in data.values()) / 1024 / 1024,
+        "output_mb": frame_bytes(output) / 1024 / 1024,
+    }
+
+
+def run_suite(rows: int, projects: int, repeat: int = 3, stages: list[str] | None = None, seed: int = 0,
+              dtype_backend: str | None = None) -> dict:
+    data = generate_dataset(n_rows=rows, n_projects=projects, seed=seed)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        snapshot_dir = Path(tmp)
+        if dtype_backend or not stages or "read_csv" in stages:
+            write_snapshot(data, snapshot_dir)
+        if dtype_backend:
+            # 本番の読み込みと同じく CSV から Arrow-backed で読み直した入力で計測する
+            data = {name: read_sheet_csv(snapshot_dir / f"{name}.csv", dtype_backend=dtype_backend) for name in data}
+        sizes = frame_sizes(data)
+        print(f"  {'frames':<28} input {sizes['input_mb']:>8.1f} MB  output {sizes['output_mb']:>8.1f} MB")
+        for name, (fn, setup) in build_stages(data, snapshot_dir, dtype_backend=dtype_backend).items():
+            if stages and name not in stages:
+                continue
+            results[name] = measure(fn, setup=setup, repeat=repeat)
+            print(f"  {name:<28} {results[name]['seconds'] * 1000:>10.1f} ms  peak {results[name]['peak_mb']:>8.1f} MB")
+    return results
+
+
+def compare(current: dict, baseline: dict, tolerance: float = REGRESSION_TOLERANCE) -> list[str]:
+    """スケール×ステージごとに時間/メモリの比率を出し、回帰を列挙する"""
+    regressions = []
+    print("\nベースライン比較（current / baseline）")
+    for scale, stages in current.items():
+        base_stages = baseline.get(scale, {})
+        for name, cur in stages.items():
+            base = base_stages.get(name)
+            if not base:
+                continue
+            t_ratio = cur["seconds"] / base["seconds"] if base["seconds"] else float("inf")
+            m_ratio = cur["peak_mb"] / base["peak_mb"] if base["peak_mb"] else float("inf")
+            flag = ""
+            if t_ratio > tolerance or m_ratio > tolerance:
+                flag = "  ← 回帰"
+                regressions.append(f"{scale} {name}: time x{t_ratio:.2f}, mem x{m_ratio:.2f}")
+            print(f"  {scale:<22} {name:<28} time x{t_ratio:5.2f}  mem x{m_ratio:5.2f}{flag}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="loader/processor のステージ別ベンチマーク")
+    parser.add_argument("--rows", type=int, default=100_000, help="--scales 未指定時の行数")
+    parser.add_argument("--projects", type=int, default=50)
+    parser.add_argument("--scales", default="", help="カンマ区切りの行数（例: 10000,100000,1000000）")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--stages", default="", help="カンマ区切りで対象ステージを限定")
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE))
+    parser.add_argument("--save-baseline", action="store_true", help="今回の結果をベースラインとして保存")
+    parser.add_argument("--output", default="", help="結果 JSON の出力先")
+    parser.add_argument("--dtype-backend", choices=["numpy", "pyarrow"], default="numpy",
+                        help="入力シートの dtype backend（pyarrow は loader の dtype_backend=pyarrow と同じ読み込み）")
+    args = parser.parse_args()
+
+    scales = [int(s) for s in args.scales.split(",") if s] or [args.rows]
+    stages = [s for s in args.stages.split(",") if s] or None
+
+    dtype_backend = None if args.dtype_backend == "numpy" else args.dtype_backend
+    current = {}
+    for rows in scales:
+        # Arrow-backed はキーを分け、同じベースラインファイルで numpy と並べて比較できるようにする
+        key = f"{rows}rows_{args.projects}proj" + (f"_{dtype_backend}" if dtype_backend else "")
+        print(f"[{key}]")
+        current[key] = run_suite(rows, args.projects, repeat=args.repeat, stages=stages, dtype_backend=dtype_backend)
+
+    report = {
+        "meta": {"python": platform.python_version(), "pandas": pd.__version__, "machine": platform.machine()},
+        "results": current,
+    }
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    baseline_path = Path(args.baseline)
+    if args.save_baseline:
+        baseline_path.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"\nベースラインを保存しました: {baseline_path}")
+    elif baseline_path.exists():
+        baseline = json.loads(baseline_path.read_text(encoding="utf-8")).get("results", {})
+        regressions = compare(current, baseline)
+        if regressions:
+            print("\n回帰あり:")
+            for r in regressions:
+                print(f"  - {r}")
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
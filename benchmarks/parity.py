@@ -0,0 +1,283 @@
+"""
+processor の差分パリティハーネス。
+
+参照実装（data.processor.process_data）と候補実装を同じ入力（合成データ・ローカルスナップショット）で実行し、
+- 行単位: 列ごとの不一致件数（数値は許容誤差つき）と不一致例
+- 集計単位: 媒体×案件の指標合計（Revenue/Gross_Profit/MCV/CV/Cost 等）
+を比較して、速度比と一緒に出す。最適化の変更は「同じ数字が出る」証拠と一緒に出す。
+
+候補は data_dict -> DataFrame の関数。CANDIDATES に名前で登録するか、--candidate module:function で指定する。
+
+使い方:
+    python -m benchmarks.parity --candidate reference --rows 100000
+    python -m benchmarks.parity --candidate mypkg.fast:process_data --seeds 0,1,2 --snapshot snapshots/2024-06-01
+    python -m benchmarks.parity --candidate reference --candidate-backend pyarrow   # Arrow-backed 入力との比較
+"""
+
+from __future__ import annotations
+
+import argparse
+import importlib
+import io
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.bench_pipeline import _copy_data
+from benchmarks.synthetic import generate_dataset
+from data.loader import read_sheet_csv
+from data.processor import process_data
+
+# 名前 -> "module:function"（任意依存の候補もあるので実行時に import する）
+CANDIDATES = {
+    "reference": "data.processor:process_data",
+    "polars": "data.processor_polars:process_data",
+    "process": "benchmarks.parity:process_data_process",
+}
+
+SHEETS = ["Meta_Live", "Meta_History", "Beyond_Live", "Beyond_History", "Master_Setting"]
+
+# 集計比較する指標（請求に使う数字）
+AGG_METRICS = ["Cost", "Impressions", "Clicks", "MCV", "CV", "PV", "FV_Exit", "SV_Exit", "Revenue", "Gross_Profit"]
+AGG_KEYS = ["Media", "Campaign_Name"]
+
+ROW_RTOL = 1e-9
+ROW_ATOL = 1e-6
+AGG_RTOL = 1e-9
+AGG_ATOL = 0.01  # 円未満
+
+
+def process_data_process(data_dict):
+    """並列モード（プロセス2ワーカー・媒体 × 日付4チャンク）"""
+    return process_data(data_dict, parallel="process", chunks=4, workers=2)
+
+
+def resolve_candidate(spec: str):
+    """登録名または module:function から候補関数を返す"""
+    target = CANDIDATES.get(spec, spec)
+    module_name, _, func_name = target.partition(":")
+    if not func_name:
+        raise SystemExit(f"候補 '{spec}' は登録名か module:function で指定してください（登録名: {', '.join(CANDIDATES)}）")
+    return getattr(importlib.import_module(module_name), func_name)
+
+
+def load_snapshot(snapshot_dir: str | Path) -> dict[str, pd.DataFrame]:
+    """write_snapshot / DASHBOARD_DATA_DIR と同じ <dir>/<シート名>.csv を読む"""
+    snapshot_dir = Path(snapshot_dir)
+    return {
+        name: pd.read_csv(snapshot_dir / f"{name}.csv") if (snapshot_dir / f"{name}.csv").exists() else pd.DataFrame()
+        for name in SHEETS
+    }
+
+
+def reread_as(data: dict[str, pd.DataFrame], dtype_backend: str | None) -> dict[str, pd.DataFrame]:
+    """loader と同じ read_sheet_csv で CSV から読み直した入力（dtype backend 違いの比較用）"""
+    out = {}
+    for name, df in data.items():
+        buf = io.StringIO()
+        df.to_csv(buf, index=False)
+        buf.seek(0)
+        out[name] = read_sheet_csv(buf, dtype_backend=dtype_backend) if not df.empty else df
+    return out
+
+
+def _is_numeric(s: pd.Series) -> bool:
+    return pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_bool_dtype(s)
+
+
+def _as_text(s: pd.Series) -> pd.Series:
+    # 欠損表現（NaN / None / pd.NA / NaT）の差は同一扱いにして文字列で比べる
+    return s.astype(object).where(s.notna(), "").astype(str)
+
+
+def _canonical(df: pd.DataFrame, text_cols: list[str], num_cols: list[str]) -> pd.DataFrame:
+    """比較用に行順を正規化（文字列キー → 数値の順で安定ソート）"""
+    out = pd.DataFrame(index=df.index)
+    for c in text_cols:
+        out[c] = _as_text(df[c])
+    for c in num_cols:
+        out[c] = pd.to_numeric(df[c], errors="coerce").astype(float)
+    sort_cols = text_cols + num_cols
+    if sort_cols:
+        rounded = out[num_cols].round(6) if num_cols else None
+        key = out[text_cols].copy()
+        if rounded is not None:
+            key[num_cols] = rounded
+        order = key.sort_values(sort_cols, kind="mergesort").index
+        out = out.loc[order]
+    return out.reset_index(drop=True)
+
+
+def diff_rows(ref: pd.DataFrame, cand: pd.DataFrame, rtol: float = ROW_RTOL, atol: float = ROW_ATOL, max_examples: int = 5) -> dict:
+    """行単位の差分。列の過不足・行数差・列ごとの不一致件数と例"""
+    common = [c for c in ref.columns if c in cand.columns]
+    report = {
+        "ref_rows": len(ref),
+        "cand_rows": len(cand),
+        "missing_columns": [c for c in ref.columns if c not in cand.columns],
+        "extra_columns": [c for c in cand.columns if c not in ref.columns],
+        "dtype_changes": {c: [str(ref[c].dtype), str(cand[c].dtype)] for c in common if str(ref[c].dtype) != str(cand[c].dtype)},
+        "column_mismatches": {},
+        "examples": [],
+    }
+    num_cols = [c for c in common if _is_numeric(ref[c])]
+    text_cols = [c for c in common if c not in num_cols]
+    a = _canonical(ref, text_cols, num_cols)
+    b = _canonical(cand, text_cols, num_cols)
+
+    if len(a) != len(b):
+        # 行数が違う場合は文字列キー単位の過不足を出す
+        ka = a[text_cols].agg("\x1f".join, axis=1).value_counts() if text_cols else pd.Series(dtype=int)
+        kb = b[text_cols].agg("\x1f".join, axis=1).value_counts() if text_cols else pd.Series(dtype=int)
+        delta = ka.sub(kb, fill_value=0)
+        delta = delta[delta != 0]
+        report["key_count_diffs"] = int(len(delta))
+        report["examples"] = [
+            {"key": dict(zip(text_cols, k.split("\x1f"))), "ref_minus_cand": int(v)}
+            for k, v in delta.head(max_examples).items()
+        ]
+        return report
+
+    bad_any = np.zeros(len(a), dtype=bool)
+    for c in num_cols:
+        bad = ~np.isclose(a[c].to_numpy(), b[c].to_numpy(), rtol=rtol, atol=atol, equal_nan=True)
+        if bad.any():
+            report["column_mismatches"][c] = int(bad.sum())
+            bad_any |= bad
+    for c in text_cols:
+        bad = (a[c] != b[c]).to_numpy()
+        if bad.any():
+            report["column_mismatches"][c] = int(bad.sum())
+            bad_any |= bad
+    cols = list(report["column_mismatches"])
+    for i in np.flatnonzero(bad_any)[:max_examples]:
+        report["examples"].append({
+            "row": int(i),
+            "ref": {c: a.at[i, c] for c in cols},
+            "cand": {c: b.at[i, c] for c in cols},
+        })
+    return report
+
+
+def diff_aggregates(ref: pd.DataFrame, cand: pd.DataFrame, rtol: float = AGG_RTOL, atol: float = AGG_ATOL) -> dict:
+    """媒体×案件の指標合計を比較する"""
+    keys = [k for k in AGG_KEYS if k in ref.columns and k in cand.columns]
+    metrics = [m for m in AGG_METRICS if m in ref.columns and m in cand.columns]
+    if not keys or not metrics:
+        return {"groups": 0, "mismatches": []}
+
+    def totals(df):
+        frame = df[keys].apply(_as_text)
+        for m in metrics:
+            frame[m] = pd.to_numeric(df[m], errors="coerce").fillna(0).astype(float)
+        return frame.groupby(keys)[metrics].sum()
+
+    ta, tb = totals(ref), totals(cand)
+    ta, tb = ta.align(tb, fill_value=0.0)
+    mismatches = []
+    for m in metrics:
+        bad = ~np.isclose(ta[m].to_numpy(), tb[m].to_numpy(), rtol=rtol, atol=atol)
+        for idx in ta.index[bad]:
+            mismatches.append({
+                "group": dict(zip(keys, idx if isinstance(idx, tuple) else (idx,))),
+                "metric": m,
+                "ref": float(ta.at[idx, m]),
+                "cand": float(tb.at[idx, m]),
+                "delta": float(tb.at[idx, m] - ta.at[idx, m]),
+            })
+    return {"groups": int(len(ta)), "mismatches": mismatches}
+
+
+def _time(fn, data: dict, repeat: int):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        inputs = _copy_data(data)
+        started = time.perf_counter()
+        result = fn(inputs)
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def run_case(name: str, data: dict, reference, candidate, repeat: int = 3, cand_data: dict | None = None) -> dict:
+    """1入力分: 参照/候補を実行し、差分と速度比を返す（cand_data 指定時は候補だけその入力で実行）"""
+    ref_s, ref_df = _time(reference, data, repeat)
+    cand_s, cand_df = _time(candidate, data if cand_data is None else cand_data, repeat)
+    rows = diff_rows(ref_df, cand_df)
+    aggs = diff_aggregates(ref_df, cand_df)
+    ok = (
+        not rows["missing_columns"]
+        and rows["ref_rows"] == rows["cand_rows"]
+        and not rows["column_mismatches"]
+        and not aggs["mismatches"]
+    )
+    return {
+        "case": name,
+        "ok": ok,
+        "ref_seconds": ref_s,
+        "cand_seconds": cand_s,
+        "speedup": ref_s / cand_s if cand_s else float("inf"),
+        "rows": rows,
+        "aggregates": aggs,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="processor の参照実装と候補実装の差分パリティ")
+    parser.add_argument("--candidate", default="reference", help=f"登録名（{', '.join(CANDIDATES)}）または module:function")
+    parser.add_argument("--reference", default="reference")
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--projects", type=int, default=30)
+    parser.add_argument("--seeds", default="0", help="合成データのシード（カンマ区切り）。空なら合成データを使わない")
+    parser.add_argument("--snapshot", action="append", default=[], help="ローカルスナップショットのディレクトリ（複数可）")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", default="", help="結果 JSON の出力先")
+    parser.add_argument("--candidate-backend", choices=["numpy", "pyarrow"], default="numpy",
+                        help="候補に渡す入力の dtype backend（pyarrow は CSV から Arrow-backed で読み直す）")
+    args = parser.parse_args()
+
+    reference = resolve_candidate(args.reference)
+    candidate = resolve_candidate(args.candidate)
+
+    cases = [
+        (f"synthetic_{args.rows}rows_seed{seed}", lambda seed=int(seed): generate_dataset(n_rows=args.rows, n_projects=args.projects, seed=seed))
+        for seed in args.seeds.split(",") if seed.strip()
+    ]
+    cases += [(f"snapshot:{d}", lambda d=d: load_snapshot(d)) for d in args.snapshot]
+
+    results = []
+    print(f"reference={args.reference} candidate={args.candidate}")
+    for name, make in cases:
+        data = make()
+        cand_data = None
+        if args.candidate_backend != "numpy":
+            # 参照側も同じ CSV を numpy で読み直し、差が backend だけになるようにする
+            cand_data = reread_as(data, args.candidate_backend)
+            data = reread_as(data, None)
+        result = run_case(name, data, reference, candidate, repeat=args.repeat, cand_data=cand_data)
+        results.append(result)
+        rows, aggs = result["rows"], result["aggregates"]
+        status = "OK " if result["ok"] else "NG "
+        print(
+            f"  {status} {name:<36} ref {result['ref_seconds'] * 1000:>9.1f} ms  cand {result['cand_seconds'] * 1000:>9.1f} ms"
+            f"  x{result['speedup']:.2f}  rows {rows['ref_rows']:,}/{rows['cand_rows']:,}"
+            f"  列不一致 {len(rows['column_mismatches'])}  集計不一致 {len(aggs['mismatches'])}"
+        )
+        if rows["missing_columns"]:
+            print(f"       欠けている列: {rows['missing_columns']}")
+        for col, n in rows["column_mismatches"].items():
+            print(f"       {col}: {n:,} 行")
+        for m in aggs["mismatches"][:5]:
+            print(f"       {m['group']} {m['metric']}: ref {m['ref']:,.2f} cand {m['cand']:,.2f} (Δ {m['delta']:,.2f})")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, ensure_ascii=False, indent=2, default=str), encoding="utf-8")
+
+    if not all(r["ok"] for r in results):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+pandas 経路と DuckDB ストア経路（data_store=duckdb）のパリティハーネス。
+
+同じ処理済みデータに対して、app.py が使うフィルタ（data/filters.py）を
+pandas（filter_options / filter_frame / base_frame）と DuckDBStore（store_filter_options / store_filters /
+store_base_filters + aggregate）の両方で掛け、タブ × 商品 × 記事 × クリエイティブ × 期間 の組み合わせごとに
+- 選択肢（商品 / 記事 / クリエイティブ、並び順も含む）
+- 本体の絞り込み結果: 日付×媒体×案件 の指標合計と行数（KPI・期間テーブル・グラフの入力）
+- 期間テーブル用ベース（直近7日）: 日付×媒体×案件 の指標合計と行数
+- Unmapped 診断の行数
+が一致するかを比べる。1件でも不一致があれば非ゼロ終了する。
+
+使い方:
+    python -m benchmarks.store_parity --rows 50000
+    python -m benchmarks.store_parity --rows 200000 --seeds 0,1,2 --output store_parity.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import random
+from datetime import timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.parity import AGG_ATOL, AGG_METRICS, AGG_RTOL
+from benchmarks.synthetic import generate_dataset
+from data import store as data_store
+from data.filters import base_frame, filter_frame, filter_options, store_base_filters, store_filter_options, store_filters
+from data.processor import process_data
+
+KEYS = ["Date", "Media", "Campaign_Name"]
+TABS = ["合計", "Meta", "Beyond"]
+
+
+def _pandas_aggregate(df: pd.DataFrame) -> pd.DataFrame:
+    """DuckDBStore.aggregate と同じ形（キー + 指標合計 + Rows）を pandas で"""
+    metrics = [m for m in AGG_METRICS if m in df.columns]
+    grouped = df.groupby(KEYS, dropna=False)
+    out = grouped[metrics].sum()
+    out["Rows"] = grouped.size()
+    for m in AGG_METRICS:
+        if m not in out.columns:
+            out[m] = 0.0
+    return out.reset_index()
+
+
+def _normalize(df: pd.DataFrame) -> pd.DataFrame:
+    out = df.copy()
+    out["Date"] = pd.to_datetime(out["Date"]).astype("datetime64[ns]")
+    for col in ["Media", "Campaign_Name"]:
+        out[col] = out[col].astype(object).where(out[col].notna(), None)
+    return out.set_index(KEYS).sort_index()
+
+
+def compare_aggregates(ref: pd.DataFrame, cand: pd.DataFrame) -> list[str]:
+    """日付×媒体×案件ごとの指標合計・行数の不一致（先頭から最大5件）"""
+    ref, cand = _normalize(ref), _normalize(cand)
+    joined = ref.join(cand, how="outer", lsuffix="_ref", rsuffix="_cand")
+    problems = []
+    for col in AGG_METRICS + ["Rows"]:
+        r = pd.to_numeric(joined[f"{col}_ref"], errors="coerce").fillna(0).to_numpy(dtype=float)
+        c = pd.to_numeric(joined[f"{col}_cand"], errors="coerce").fillna(0).to_numpy(dtype=float)
+        bad = ~np.isclose(r, c, rtol=AGG_RTOL, atol=AGG_ATOL)
+        for i in np.flatnonzero(bad)[:5]:
+            problems.append(f"{joined.index[i]} {col}: pandas {r[i]:,.2f} duckdb {c[i]:,.2f}")
+    return problems
+
+
+def build_cases(df: pd.DataFrame, today, rng: random.Random) -> list[tuple]:
+    """(タブ, 商品, 記事, クリエイティブ, 期間) の組み合わせ。値は実データから選ぶ"""
+    campaigns = [c for c in df["Campaign_Name"].dropna().unique() if c != "Unmapped"]
+    articles = list(df.loc[df["Media"] == "Beyond", "Creative"].dropna().unique())
+    creatives = list(df.loc[df["Media"] == "Meta", "Creative"].dropna().unique())
+    date_ranges = [
+        (today.replace(day=1), today),     # 既定（当月）
+        (today - timedelta(days=6), today),
+        (today - timedelta(days=30),),     # 片側だけ選択中 → 期間で絞らない
+    ]
+    return list(itertools.product(
+        TABS,
+        ["All", "Unmapped"] + rng.sample(campaigns, min(2, len(campaigns))),
+        ["All"] + rng.sample(articles, min(1, len(articles))),
+        ["All"] + rng.sample(creatives, min(1, len(creatives))),
+        date_ranges,
+    ))
+
+
+def run_case(df: pd.DataFrame, store, case: tuple, today) -> list[str]:
+    tab, campaign, article, creative, date_range = case
+    problems = []
+
+    if filter_options(df, tab) != store_filter_options(store, tab):
+        problems.append("選択肢が一致しません")
+
+    df_filtered = filter_frame(df, campaign, article, creative, date_range)
+    filters = store_filters(campaign, article, creative, date_range)
+    problems += [f"絞り込み {p}" for p in compare_aggregates(
+        _pandas_aggregate(df_filtered), store.aggregate(KEYS, AGG_METRICS, **filters)
+    )]
+
+    start = today - timedelta(days=6)
+    df_base = base_frame(df, tab, campaign, article, creative)
+    df_base = df_base[df_base["Date"].dt.date >= start]
+    base_filters = store_base_filters(tab, campaign, article, creative)
+    problems += [f"ベース {p}" for p in compare_aggregates(
+        _pandas_aggregate(df_base), store.aggregate(KEYS, AGG_METRICS, start=start, **base_filters)
+    )]
+
+    # app.py の load_unmapped と同じ取り方
+    n_ref = int((df_filtered["Campaign_Name"] == "Unmapped").sum())
+    n_cand = 0 if campaign not in ("All", "Unmapped") else store.count(**{**filters, "campaign": "Unmapped"})
+    if n_ref != n_cand:
+        problems.append(f"Unmapped 行数: pandas {n_ref} duckdb {n_cand}")
+    return problems
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="pandas 経路と DuckDB ストア経路のフィルタ・集計パリティ")
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--projects", type=int, default=20)
+    parser.add_argument("--seeds", default="0")
+    parser.add_argument("--output", default="")
+    args = parser.parse_args()
+
+    if not data_store.is_available():
+        raise SystemExit("duckdb が入っていないため比較できません")
+
+    today = pd.Timestamp.now().normalize().date()
+    results = []
+    for seed in [int(s) for s in args.seeds.split(",") if s.strip()]:
+        df = process_data(generate_dataset(n_rows=args.rows, n_projects=args.projects, seed=seed))
+        store = data_store.DuckDBStore.build(df, f"parity{seed}")
+        cases = build_cases(df, today, random.Random(seed))
+        failed = 0
+        for case in cases:
+            problems = run_case(df, store, case, today)
+            results.append({"seed": seed, "case": [str(v) for v in case], "problems": problems})
+            if problems:
+                failed += 1
+                print(f"  NG seed={seed} {case}")
+                for p in problems[:5]:
+                    print(f"       {p}")
+        print(f"seed={seed} rows={len(df):,} cases={len(cases)} 不一致 {failed}")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    if any(r["problems"] for r in results):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""
+ベンチマーク/差分検証用の合成データ生成。
+
+Meta_Live / Meta_History / Beyond_Live / Beyond_History / Master_Setting を
+本番シートと同じ列構成で生成する（日本語の案件名、【】や[] 付きトークン、
+Live/History の重複日、Unmapped になる行、クリエイティブIDのいろいろな書式を含む）。
+
+使い方:
+    from benchmarks.synthetic import generate_dataset
+    data = generate_dataset(n_rows=100_000, n_projects=50)
+    # data は load_data_from_sheets() と同じ {シート名: DataFrame}
+
+    python -m benchmarks.synthetic --rows 100000 --projects 50 --knowledge 300 --out ./snapshot
+    # → snapshot/<シート名>.csv を書き出す（DASHBOARD_DATA_DIR=./snapshot でアプリから読める）
+"""
+
+from __future__ import annotations
+
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+BRANDS = [
+    "サプリ", "美容液", "育毛剤", "青汁", "酵素", "ダイエット", "スキンケア", "シャンプー",
+    "オールインワン", "クレンジング", "プロテイン", "アイクリーム", "ヘアオイル", "まつ毛美容液",
+]
+SUFFIXES = ["成果", "予算", "IH"]
+CV_COLUMNS = ["購入", "登録完了", "Website purchases"]
+ADSET_WORDS = ["女性30代", "女性40代", "男性", "LAL1%", "ブロード", "リタゲ"]
+CREATIVE_WORDS = ["動画", "静止画", "カルーセル", "UGC", "比較", "体験談"]
+
+
+def _choice(rng: np.random.Generator, pool, size: int) -> np.ndarray:
+    """文字列プールから size 個を選ぶ（object 配列）"""
+    pool = np.asarray(pool, dtype=object)
+    return pool[rng.integers(0, len(pool), size=size)]
+
+
+def generate_master(n_projects: int, rng: np.random.Generator) -> pd.DataFrame:
+    """Master_Setting（管理用案件名 / Meta名 / Beyond名 / 運用タイプ / 単価 / 手数料率 / Meta CV名）"""
+    idx = np.arange(n_projects)
+    brands = _choice(rng, BRANDS, n_projects)
+    types = _choice(rng, SUFFIXES, n_projects)
+    names = [f"{b}{i:03d}_{t}" for i, b, t in zip(idx, brands, types)]
+    return pd.DataFrame({
+        "管理用案件名": names,
+        "Meta名": [f"【運用】{n}" for n in names],
+        "Beyond名": [f"[{n}]" for n in names],
+        "運用タイプ": types,
+        "成果単価": np.where(types == "成果", rng.integers(5, 100, n_projects) * 1000, 0),
+        "手数料率": np.where(types == "成果", 0, rng.choice([0.15, 0.2, 0.25], n_projects)),
+        "Meta CV名": np.where(rng.random(n_projects) < 0.5, _choice(rng, CV_COLUMNS, n_projects), ""),
+    })
+
+
+def _creative_tokens(rng: np.random.Generator, size: int) -> np.ndarray:
+    """クリエイティブIDの書式ゆれ（123_ab / 123ab / bt12 / 123 / 日付入り / IDなし）"""
+    n = rng.integers(0, 1000, size)
+    letters = _choice(rng, ["a", "b", "ab", "cd", "x"], size)
+    kind = rng.integers(0, 6, size)
+    out = np.empty(size, dtype=object)
+    for k, fmt in enumerate([
+        lambda i: f"{n[i]:03d}_{letters[i]}",
+        lambda i: f"{n[i]:03d}{letters[i]}",
+        lambda i: f"bt{n[i] % 100}",
+        lambda i: f"{n[i]:03d}",
+        lambda i: f"20250{1 + n[i] % 9}{10 + n[i] % 18}_{n[i]:03d}",
+        lambda i: "",
+    ]):
+        for i in np.flatnonzero(kind == k):
+            out[i] = fmt(i)
+    return out
+
+
+def _days(rng: np.random.Generator, size: int, n_days: int, today: pd.Timestamp) -> np.ndarray:
+    """直近 n_days 日の日付文字列（"YYYY-MM-DD"）"""
+    pool = np.array([(today - pd.Timedelta(days=d)).strftime("%Y-%m-%d") for d in range(n_days)], dtype=object)
+    return pool[rng.integers(0, n_days, size)]
+
+
+def generate_meta(n_rows: int, master: pd.DataFrame, rng: np.random.Generator, n_days: int, today: pd.Timestamp, unmapped_ratio: float) -> pd.DataFrame:
+    """Meta 形式（Day / Account Name / Campaign Name / Ad Set Name / Ad Name / Amount Spent / ...）"""
+    meta_names = master["Meta名"].to_numpy(dtype=object)
+    proj = rng.integers(0, len(meta_names), n_rows)
+    campaign = np.char.add(np.char.add(meta_names[proj].astype(str), "_CBO_"), rng.integers(1, 5, n_rows).astype(str)).astype(object)
+    unmapped = rng.random(n_rows) < unmapped_ratio
+    campaign[unmapped] = _choice(rng, ["テスト配信", "旧アカウント_キャンペーン", "検証用"], int(unmapped.sum()))
+
+    # 広告名のクリエイティブトークンは種類を絞ってから行に割り当てる（大規模でも生成が速い）
+    creative_pool = _creative_tokens(rng, min(n_rows, 5000))
+    creative = creative_pool[rng.integers(0, len(creative_pool), n_rows)]
+    ad_word = _choice(rng, CREATIVE_WORDS, n_rows)
+    ad_name = np.char.add(np.char.add(creative.astype(str), "_"), ad_word.astype(str)).astype(object)
+
+    impressions = rng.integers(100, 50_000, n_rows)
+    clicks = (impressions * rng.uniform(0.002, 0.03, n_rows)).astype(int)
+    df = pd.DataFrame({
+        "Day": _days(rng, n_rows, n_days, today),
+        "Account Name": _choice(rng, [f"allattain{i:02d}" for i in range(1, 9)], n_rows),
+        "Campaign Name": campaign,
+        "Ad Set Name": _choice(rng, ADSET_WORDS, n_rows),
+        "Ad Name": ad_name,
+        "Amount Spent": np.round(impressions * rng.uniform(0.5, 3.0, n_rows), 0),
+        "Impressions": impressions,
+        "Link Clicks": clicks,
+        "Results": (clicks * rng.uniform(0, 0.1, n_rows)).astype(int),
+    })
+    for col in CV_COLUMNS:
+        df[col] = (clicks * rng.uniform(0, 0.05, n_rows)).astype(int)
+    return df
+
+
+def generate_beyond(n_rows: int, master: pd.DataFrame, rng: np.random.Generator, n_days: int, today: pd.Timestamp, unmapped_ratio: float) -> pd.DataFrame:
+    """Beyond 形式（date_jst / beyond_page_name / version_name / parameter / cost / pv / click / cv / ...）"""
+    beyond_names = master["Beyond名"].to_numpy(dtype=object)
+    proj = rng.integers(0, len(beyond_names), n_rows)
+    page = np.char.add(np.char.add("記事_", beyond_names[proj].astype(str)), _choice(rng, ["_A", "_B", "_LP"], n_rows).astype(str)).astype(object)
+    unmapped = rng.random(n_rows) < unmapped_ratio
+    page[unmapped] = _choice(rng, ["テスト記事", "旧LP"], int(unmapped.sum()))
+
+    creative_pool = _creative_tokens(rng, min(n_rows, 5000))
+    creative = creative_pool[rng.integers(0, len(creative_pool), n_rows)]
+    parameter = np.char.add("utm_creative=", creative.astype(str)).astype(object)
+
+    pv = rng.integers(10, 5000, n_rows)
+    click = (pv * rng.uniform(0.05, 0.4, n_rows)).astype(int)
+    fv_exit = (pv * rng.uniform(0.1, 0.5, n_rows)).astype(int)
+    return pd.DataFrame({
+        "date_jst": _days(rng, n_rows, n_days, today),
+        "beyond_page_name": page,
+        "version_name": _choice(rng, ["ver1", "ver2", "ver3"], n_rows),
+        "parameter": parameter,
+        "folder_name": beyond_names[proj],
+        "cost": np.round(pv * rng.uniform(5, 40, n_rows), 0),
+        "pv": pv,
+        "click": click,
+        "cv": (click * rng.uniform(0, 0.05, n_rows)).astype(int),
+        "fv_exit": fv_exit,
+        "sv_exit": ((pv - fv_exit) * rng.uniform(0.05, 0.3, n_rows)).astype(int),
+    })
+
+
+def _split_live_history(df: pd.DataFrame, day_col: str, today: str, rng: np.random.Generator, dup_ratio: float) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    本番と同じく Live=当日+昨日、History=昨日以前 に分け、
+    昨日分を Live/History の両方に入れる（重複日）＋ History 内にも重複行を混ぜる。
+    """
+    yesterday = (pd.Timestamp(today) - pd.Timedelta(days=1)).strftime("%Y-%m-%d")
+    live = df[df[day_col] >= yesterday]
+    history = df[df[day_col] < today]
+    if dup_ratio > 0 and not history.empty:
+        dups = history.sample(frac=dup_ratio, random_state=int(rng.integers(0, 2**31 - 1)))
+        history = pd.concat([history, dups], ignore_index=True)
+    return live.reset_index(drop=True), history.reset_index(drop=True)
+
+
+KNOWLEDGE_CATEGORIES = {
+    "クリエイティブ": ["訴求", "動画", "静止画"],
+    "配信": ["入札", "予算配分", "ターゲティング"],
+    "LP": ["FV", "CTA", "離脱対策"],
+}
+
+
+def generate_knowledge(n_items: int, rng: np.random.Generator, dup_ratio: float = 0.1) -> pd.DataFrame:
+    """Knowledge シート（Category / Subcategory / Knowledge）。一部は言い回し違いの近似重複"""
+    cats = list(KNOWLEDGE_CATEGORIES)
+    rows = []
+    for i in range(n_items):
+        cat = cats[int(rng.integers(0, len(cats)))]
+        subs = KNOWLEDGE_CATEGORIES[cat]
+        sub = subs[int(rng.integers(0, len(subs)))]
+        metric = ["CPA", "CTR", "CVR", "MCVR", "CPM"][int(rng.integers(0, 5))]
+        text = f"{sub}を見直すと{metric}が改善しやすい。{BRANDS[i % len(BRANDS)]}案件では{10 + i % 40}%改善した事例あり（No.{i}）"
+        rows.append((cat, sub, text))
+        if rng.random() < dup_ratio:
+            rows.append((cat, sub, text + "。"))
+    return pd.DataFrame(rows, columns=["Category", "Subcategory", "Knowledge"])
+
+
+def generate_dataset(
+    n_rows: int = 100_000,
+    n_projects: int = 50,
+    n_days: int = 180,
+    meta_share: float = 0.6,
+    unmapped_ratio: float = 0.02,
+    dup_ratio: float = 0.01,
+    seed: int = 0,
+    today: str | None = None,
+) -> dict[str, pd.DataFrame]:
+    """
+    load_data_from_sheets() と同じ形の合成データを返す。
+    n_rows は Meta + Beyond の合計行数（Live/History の重複を除く）。
+    """
+    rng = np.random.default_rng(seed)
+    today_ts = pd.Timestamp(today).normalize() if today else pd.Timestamp.now().normalize()
+    today_str = today_ts.strftime("%Y-%m-%d")
+
+    master = generate_master(n_projects, rng)
+    n_meta = int(n_rows * meta_share)
+    meta = generate_meta(n_meta, master, rng, n_days, today_ts, unmapped_ratio)
+    beyond = generate_beyond(n_rows - n_meta, master, rng, n_days, today_ts, unmapped_ratio)
+
+    meta_live, meta_history = _split_live_history(meta, "Day", today_str, rng, dup_ratio)
+    beyond_live, beyond_history = _split_live_history(beyond, "date_jst", today_str, rng, dup_ratio)
+    return {
+        "Meta_Live": meta_live,
+        "Meta_History": meta_history,
+        "Beyond_Live": beyond_live,
+        "Beyond_History": beyond_history,
+        "Master_Setting": master,
+    }
+
+
+def write_snapshot(data: dict[str, pd.DataFrame], out_dir: str | Path) -> None:
+    """<out_dir>/<シート名>.csv に書き出す"""
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    for name, df in data.items():
+        df.to_csv(out / f"{name}.csv", index=False)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="合成シートデータを生成して CSV に書き出す")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--projects", type=int, default=50)
+    parser.add_argument("--days", type=int, default=180)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--knowledge", type=int, default=0, help="Knowledge シートの件数（0 なら出力しない）")
+    parser.add_argument("--out", required=True)
+    args = parser.parse_args()
+
+    data = generate_dataset(n_rows=args.rows, n_projects=args.projects, n_days=args.days, seed=args.seed)
+    if args.knowledge:
+        data["Knowledge"] = generate_knowledge(args.knowledge, np.random.default_rng(args.seed))
+    write_snapshot(data, args.out)
+    for name, df in data.items():
+        print(f"{name:<16} {len(df):>10,} rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,16 @@
+import time
+
 import plotly.graph_objects as go
+import plotly.io
 import streamlit as st
 import pandas as pd
 
+from components.downsample import lttb_indices
+from components.figure_cache import get_figure_cache, get_pivot_cache
+from utils import metrics
+from utils.settings import get_setting
+from utils.streamlit_compat import fragment, plotly_chart_spec
+
 # --- Color Palette ---
 METRIC_COLORS = {
     "Revenue": "#3b82f6",       # Blue
@@ -19,100 +28,268 @@ CAMPAIGN_COLORS = {
     "default": "#6B7280"        # Gray
 }
 
-def display_charts(df):
+# 日次×案件ピボットに持たせる加算可能な指標（比率系はここから算出）
+ADDITIVE_COLUMNS = ["Revenue", "Cost", "Gross_Profit", "CV", "MCV", "Clicks", "Impressions"]
+
+# 比率系指標: metric -> (分子, 分母, 倍率)
+RATIO_METRICS = {
+    "CPA": ("Cost", "CV", 1),
+    "MCPA": ("Cost", "MCV", 1),
+    "CPC": ("Cost", "Clicks", 1),
+    "CPM": ("Cost", "Impressions", 1000),
+    "CTR": ("Clicks", "Impressions", 100),
+    "MCVR": ("MCV", "Clicks", 100),
+    "CVR": ("CV", "Clicks", 100),
+    "Recovery_Rate": ("Revenue", "Cost", 100),
+}
+
+# グラフグリッド定義: 1行3枚 × 4行
+# (metric_col, title, color, unit_format, is_bar)
+CHART_ROWS = [
+    [
+        ("Revenue", "売上", "#3498DB", None, True),
+        ("Cost", "出稿金額", "#E74C3C", None, True),
+        ("Gross_Profit", "粗利", "#F39C12", None, False),
+    ],
+    [
+        ("Recovery_Rate", "回収率", "#2ECC71", ".0%", False),
+        ("CV", "CV数", "#2ECC71", None, True),
+        ("CPA", "CPA", "#6B7280", None, False),
+    ],
+    [
+        ("MCPA", "MCPA", "#9B59B6", None, False),
+        ("CPC", "CPC", "#34495E", None, False),
+        ("CPM", "CPM", "#95A5A6", None, False),
+    ],
+    [
+        ("CTR", "CTR", "#1ABC9C", ".1f%", False),
+        ("MCVR", "MCVR", "#16A085", ".1f%", False),
+        ("CVR", "CVR", "#27AE60", ".1f%", False),
+    ],
+]
+
+# 1グラフあたりの点数上限（全トレース合計）。超えると軽量描画モードに切り替える
+# - 折れ線: Scattergl (WebGL) + LTTB 間引き
+# - 棒: 週次 → それでも超えれば月次に再集計
+CHART_POINT_BUDGET = get_setting("chart_point_budget", 2000, int)
+
+# 棒グラフ再集計の候補（粗い方へ順に試す）
+BAR_RESAMPLE_RULES = [("W-MON", "週次"), ("MS", "月次")]
+
+# 共通レイアウト設定
+LAYOUT_SETTINGS = dict(
+    template="plotly_white",
+    margin=dict(l=10, r=10, t=30, b=20),
+    height=250, # 高さを少し抑える
+    legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1, font=dict(size=10)),
+    title=dict(font=dict(size=14))
+)
+
+
+def build_campaign_pivot(df: pd.DataFrame) -> dict:
+    """
+    Date × Campaign_Name の加算指標ピボットを1回の groupby で作成する。
+    戻り値:
+      {
+        "values": {指標名: DataFrame(index=Date, columns=Campaign_Name)},
+        "present": DataFrame(bool)  # その日に案件の行が存在したか
+        "campaigns": [Campaign_Name, ...]  # 出現順
+      }
+    """
+    campaigns = list(df["Campaign_Name"].unique())
+    value_cols = [c for c in ADDITIVE_COLUMNS if c in df.columns]
+
+    if not value_cols:
+        # 加算指標が1列も無い → 日付行の無い空ピボット（グラフは空で描画される）
+        empty = pd.DataFrame(index=pd.DatetimeIndex([], name="Date"), columns=campaigns, dtype=float)
+        values = {col: empty.copy() for col in ADDITIVE_COLUMNS}
+        return {"values": values, "present": empty.astype(bool), "campaigns": campaigns}
+
+    grouped = df.groupby(["Date", "Campaign_Name"], sort=True)[value_cols].sum()
+    wide = grouped.unstack("Campaign_Name")
+
+    # 行が存在しない (日付, 案件) は unstack で NaN になる → 各案件のトレースから除外する
+    present = wide[value_cols[0]].reindex(columns=campaigns).notna()
+
+    values = {}
+    for col in ADDITIVE_COLUMNS:
+        if col in value_cols:
+            values[col] = wide[col].reindex(columns=campaigns)
+        else:
+            values[col] = pd.DataFrame(0.0, index=wide.index, columns=campaigns)
+
+    return {"values": values, "present": present, "campaigns": campaigns}
+
+
+def compute_metric_frame(pivot: dict, metric_col: str) -> pd.DataFrame:
+    """
+    ピボットから単一指標の Date × Campaign フレームをベクトル演算で算出する。
+    """
+    values = pivot["values"]
+    if metric_col in RATIO_METRICS:
+        num, den, scale = RATIO_METRICS[metric_col]
+        frame = values[num] / values[den] * scale
+    else:
+        frame = values[metric_col]
+    # NaN処理（0/0 など）
+    return frame.fillna(0)
+
+
+def resample_pivot(pivot: dict, rule: str) -> dict:
+    """
+    ピボットを週次/月次に再集計する（加算指標は合計、行の有無は OR）。
+    比率系は再集計後の加算指標から compute_metric_frame で算出し直す。
+    """
+    values = {
+        col: frame.resample(rule, label="left", closed="left").sum(min_count=1)
+        for col, frame in pivot["values"].items()
+    }
+    present = pivot["present"].resample(rule, label="left", closed="left").max().fillna(False).astype(bool)
+    return {"values": values, "present": present, "campaigns": pivot["campaigns"]}
+
+
+def create_chart(pivot: dict, metric_col, title, color, unit_format=None, is_bar=False, point_budget=None):
+    """
+    単一指標のグラフを作成 (案件別積み上げ or 折れ線)
+    戻り値: (fig, stats)  stats は描画モード・点数・生成時間（ペイロードサイズは serialize_chart で付く）
+    """
+    started = time.perf_counter()
+    budget = CHART_POINT_BUDGET if point_budget is None else point_budget
+    total_points = int(pivot["present"].values.sum())
+    n_campaigns = max(len(pivot["campaigns"]), 1)
+    mode = "svg"
+
+    # 棒: 点数上限を超えたら週次 → 月次に再集計
+    if is_bar and budget and total_points > budget:
+        for rule, label in BAR_RESAMPLE_RULES:
+            pivot = resample_pivot(pivot, rule)
+            mode = label
+            if int(pivot["present"].values.sum()) <= budget:
+                break
+
+    # 折れ線: 点数上限を超えたら WebGL + LTTB 間引き（1トレースあたりの上限に按分）
+    use_webgl = (not is_bar) and bool(budget) and total_points > budget
+    per_trace_budget = max(budget // n_campaigns, 3) if use_webgl else None
+    if use_webgl:
+        mode = "webgl+lttb"
+
+    fig = go.Figure()
+    frame = compute_metric_frame(pivot, metric_col)
+    present = pivot["present"]
+    rendered_points = 0
+
+    # 案件ごとにTrace追加（集計済みフレームの列を切り出すだけ）
+    for campaign in pivot["campaigns"]:
+        rows = present[campaign]
+        val = frame.loc[rows, campaign]
+
+        # グラフタイプ
+        if is_bar:
+            fig.add_trace(go.Bar(x=val.index, y=val.values, name=campaign))
+        elif use_webgl:
+            idx = lttb_indices(val.index.values.astype("int64"), val.values, per_trace_budget)
+            val = val.iloc[idx]
+            fig.add_trace(go.Scattergl(x=val.index, y=val.values, name=campaign, mode='lines+markers'))
+        else:
+            fig.add_trace(go.Scatter(x=val.index, y=val.values, name=campaign, mode='lines+markers'))
+        rendered_points += len(val)
+
+    layout = LAYOUT_SETTINGS.copy()
+    layout["title"] = title
+    if is_bar: layout["barmode"] = "stack"
+    if unit_format: layout["yaxis"] = dict(tickformat=unit_format)
+
+    fig.update_layout(**layout)
+
+    stats = {
+        "metric": metric_col,
+        "mode": mode,
+        "points": total_points,
+        "rendered_points": rendered_points,
+        "build_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+    return fig, stats
+
+
+def serialize_chart(fig, stats):
+    """
+    Figure を送信用の spec（JSON 文字列）にする。シリアライズはここでの1回だけで、
+    payload_kb は実際に送る spec の大きさ。戻り値: (spec, stats)
+    """
+    spec = plotly.io.to_json(fig, validate=False)
+    return spec, {**stats, "payload_kb": round(len(spec) / 1024, 1)}
+
+
+def _get_pivot(df, cache_key):
+    """ピボットを取得（cache_key 指定時は行フラグメント間で共有。図の LRU とは別のキャッシュ）"""
+    if cache_key is None:
+        return build_campaign_pivot(df)
+    return get_pivot_cache().get_or_build(tuple(cache_key), lambda: build_campaign_pivot(df))
+
+
+@fragment
+def _render_chart_row(df, row_idx, cache_key=None):
+    """
+    グラフ1行分（3枚）。トグルが ON のときだけ生成・送信する。
+    フラグメントなので ON/OFF でページ全体はリランしない。
+    """
+    metrics.fragment_rerun("chart_row")
+    row = CHART_ROWS[row_idx]
+    label = " / ".join(title for _, title, _, _, _ in row)
+    if not st.toggle(f"📈 {label}", key=f"show_chart_row_{row_idx}"):
+        return
+
+    figure_cache = get_figure_cache() if cache_key is not None else None
+    render_stats = []
+
+    def get_spec(metric_col, title, color, unit_format, is_bar):
+        def build():
+            fig, stats = create_chart(_get_pivot(df, cache_key), metric_col, title, color, unit_format=unit_format, is_bar=is_bar)
+            return serialize_chart(fig, stats)
+
+        if figure_cache is None:
+            spec, stats = build()
+            cached = False
+        else:
+            key = tuple(cache_key) + (metric_col, CHART_POINT_BUDGET)
+            entry = figure_cache.get(key)
+            cached = entry is not None
+            if entry is None:
+                entry = build()
+                figure_cache.put(key, entry)
+            spec, stats = entry
+        render_stats.append({**stats, "cached": cached})
+        return spec
+
+    # キャッシュには spec（JSON 文字列）を持ち、リランごとの Figure 検証・再シリアライズを省く
+    cols = st.columns(3)
+    for col, (metric_col, title, color, unit_format, is_bar) in zip(cols, row):
+        plotly_chart_spec(col, get_spec(metric_col, title, color, unit_format, is_bar), height=LAYOUT_SETTINGS["height"])
+
+    # 描画統計（モード・ペイロード・生成時間）
+    stats_df = pd.DataFrame(render_stats)
+    st.caption(
+        " ・ ".join(
+            f"{r.metric}: {r.mode} {r.rendered_points:,}/{r.points:,}点 {r.payload_kb:,.1f}KB "
+            + ("(cache)" if r.cached else f"{r.build_ms:,.1f}ms")
+            for r in stats_df.itertuples()
+        )
+    )
+
+
+def display_charts(df, cache_key=None):
     """
     指定されたグラフ群を表示 (3カラムグリッドレイアウト)
+    日次×案件ピボットを1回だけ作り、12グラフすべてをそこから派生させる
+    行ごとにトグルで展開し、開いた行だけを生成する。
+
+    cache_key: (データバージョン, タブ, 商品, 記事, クリエイティブ, 期間) のタプル。
+    指定時は指標ごとに生成済み spec を再利用し、全件ヒットならピボットも作らない。
     """
     if df.empty:
         st.warning("表示するデータがありません")
         return
 
-    # 日次集計
-    # 日次集計
-    daily_df = df.groupby("Date").agg({
-        "Revenue": "sum",
-        "Cost": "sum",
-        "Gross_Profit": "sum",
-        "CV": "sum",
-        "MCV": "sum",
-        "Clicks": "sum",
-        "Impressions": "sum"
-    }).reset_index()
-    
-    # 計算指標追加
-    daily_df["Recovery_Rate"] = (daily_df["Revenue"] / daily_df["Cost"] * 100).fillna(0)
-    
-    # 共通レイアウト設定
-    layout_settings = dict(
-        template="plotly_white",
-        margin=dict(l=10, r=10, t=30, b=20),
-        height=250, # 高さを少し抑える
-        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1, font=dict(size=10)),
-        title=dict(font=dict(size=14))
-    )
-
-    def create_chart(metric_col, title, color, unit_format=None, is_bar=False):
-        """
-        単一指標のグラフを作成 (案件別積み上げ or 折れ線)
-        """
-        fig = go.Figure()
-        
-        # 案件ごとにループしてTrace追加
-        for campaign in df["Campaign_Name"].unique():
-            camp_df = df[df["Campaign_Name"] == campaign].groupby("Date").sum(numeric_only=True).reset_index()
-            
-            # 指標計算
-            val = None
-            if metric_col == "CPA": val = camp_df["Cost"] / camp_df["CV"]
-            elif metric_col == "MCPA": val = camp_df["Cost"] / camp_df["MCV"]
-            elif metric_col == "CPC": val = camp_df["Cost"] / camp_df["Clicks"]
-            elif metric_col == "CPM": val = camp_df["Cost"] / camp_df["Impressions"] * 1000
-            elif metric_col == "CTR": val = camp_df["Clicks"] / camp_df["Impressions"] * 100
-            elif metric_col == "MCVR": val = camp_df["MCV"] / camp_df["Clicks"] * 100
-            elif metric_col == "CVR": val = camp_df["CV"] / camp_df["Clicks"] * 100
-            elif metric_col == "Recovery_Rate": val = camp_df["Revenue"] / camp_df["Cost"] * 100
-            else: val = camp_df[metric_col]
-            
-            # NaN処理
-            val = val.fillna(0)
-            
-            # グラフタイプ
-            if is_bar:
-                fig.add_trace(go.Bar(x=camp_df["Date"], y=val, name=campaign))
-            else:
-                fig.add_trace(go.Scatter(x=camp_df["Date"], y=val, name=campaign, mode='lines+markers'))
-
-        layout = layout_settings.copy()
-        layout["title"] = title
-        if is_bar: layout["barmode"] = "stack"
-        if unit_format: layout["yaxis"] = dict(tickformat=unit_format)
-        
-        fig.update_layout(**layout)
-        return fig
-
-    # --- Row 1: 売上, 出稿金額, 粗利 ---
-    c1, c2, c3 = st.columns(3)
-    with c1: st.plotly_chart(create_chart("Revenue", "売上", "#3498DB", is_bar=True), use_container_width=True)
-    with c2: st.plotly_chart(create_chart("Cost", "出稿金額", "#E74C3C", is_bar=True), use_container_width=True)
-    with c3: st.plotly_chart(create_chart("Gross_Profit", "粗利", "#F39C12"), use_container_width=True)
-
-    # --- Row 2: 回収率, CV, CPA ---
-    st.markdown("###")
-    c4, c5, c6 = st.columns(3)
-    with c4: st.plotly_chart(create_chart("Recovery_Rate", "回収率", "#2ECC71", unit_format=".0%"), use_container_width=True)
-    with c5: st.plotly_chart(create_chart("CV", "CV数", "#2ECC71", is_bar=True), use_container_width=True)
-    with c6: st.plotly_chart(create_chart("CPA", "CPA", "#6B7280"), use_container_width=True)
-
-    # --- Row 3: MCPA, CPC, CPM ---
-    st.markdown("###")
-    c7, c8, c9 = st.columns(3)
-    with c7: st.plotly_chart(create_chart("MCPA", "MCPA", "#9B59B6"), use_container_width=True)
-    with c8: st.plotly_chart(create_chart("CPC", "CPC", "#34495E"), use_container_width=True)
-    with c9: st.plotly_chart(create_chart("CPM", "CPM", "#95A5A6"), use_container_width=True)
-
-    # --- Row 4: CTR, MCVR, CVR ---
-    st.markdown("###")
-    c10, c11, c12 = st.columns(3)
-    with c10: st.plotly_chart(create_chart("CTR", "CTR", "#1ABC9C", unit_format=".1f%"), use_container_width=True)
-    with c11: st.plotly_chart(create_chart("MCVR", "MCVR", "#16A085", unit_format=".1f%"), use_container_width=True)
-    with c12: st.plotly_chart(create_chart("CVR", "CVR", "#27AE60", unit_format=".1f%"), use_container_width=True)
+    st.caption(f"点数上限/グラフ: {CHART_POINT_BUDGET:,}（超過時は WebGL+LTTB / 週次・月次集計で描画）")
+    for row_idx in range(len(CHART_ROWS)):
+        _render_chart_row(df, row_idx, cache_key=cache_key)
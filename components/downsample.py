@@ -0,0 +1,43 @@
+import numpy as np
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets で残す点のインデックスを返す。
+    x は昇順の数値（日付は int64 ナノ秒などに変換して渡す）。
+    先頭・末尾は必ず残し、間を (threshold - 2) 個のバケットに分けて
+    前に採用した点・次バケットの平均点と作る三角形が最大の点を1つずつ選ぶ。
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype="float64")
+    y = np.asarray(y, dtype="float64")
+    # NaN/inf は面積計算を壊すので 0 とみなす（表示値は元の y を使う）
+    y = np.where(np.isfinite(y), y, 0.0)
+
+    selected = np.empty(threshold, dtype="int64")
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    # 中間点 1..n-2 を threshold-2 個のバケットに分割
+    edges = np.linspace(1, n - 1, threshold - 1).astype("int64")
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], max(edges[i + 1], edges[i] + 1)
+        # 次バケットの平均点（最後は末尾点）
+        if i + 1 < threshold - 2:
+            nxt_start, nxt_end = edges[i + 1], max(edges[i + 2], edges[i + 1] + 1)
+            avg_x = x[nxt_start:nxt_end].mean()
+            avg_y = y[nxt_start:nxt_end].mean()
+        else:
+            avg_x, avg_y = x[n - 1], y[n - 1]
+
+        bx = x[start:end]
+        by = y[start:end]
+        area = np.abs((x[a] - avg_x) * (by - y[a]) - (x[a] - bx) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+
+    return selected
@@ -0,0 +1,78 @@
+import threading
+from collections import OrderedDict
+
+import streamlit as st
+
+
+class FigureCache:
+    """
+    生成済みグラフ（シリアライズ済み spec と描画統計）の LRU キャッシュ（上限件数つき）。
+    キーはフィルタ状態・データバージョン・指標を含むタプル。
+    複数セッションから同時に触られるため、操作はロックで保護する。
+    """
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_build(self, key, builder):
+        """キャッシュにあればそれを返し、無ければ builder() の結果を格納して返す。"""
+        value = self.get(key)
+        if value is None:
+            value = builder()
+            self.put(key, value)
+        return value
+
+    def entries(self) -> list:
+        """(キー, 値) の一覧（メモリレポート用のスナップショット）"""
+        with self._lock:
+            return list(self._entries.items())
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / total) if total else 0.0,
+            }
+
+
+@st.cache_resource
+def get_figure_cache() -> FigureCache:
+    """プロセス内で共有する FigureCache（全セッション共通）。"""
+    return FigureCache()
+
+
+@st.cache_resource
+def get_pivot_cache() -> FigureCache:
+    """グラフ用の日次×案件ピボットのキャッシュ（図の LRU とは別枠にして、統計・追い出しを分ける）。"""
+    return FigureCache(maxsize=32)
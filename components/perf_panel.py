@@ -0,0 +1,79 @@
+import json
+
+import pandas as pd
+import streamlit as st
+
+from ai.assistant import get_response_cache
+from components.figure_cache import get_figure_cache, get_pivot_cache
+from data.digest import get_digest_cache
+from data.loader import get_data_store, get_knowledge_store, get_processed_dataset, load_data_from_sheets
+from utils import memory, perf
+from utils.settings import get_setting
+
+
+def _mb(rows, col):
+    df = pd.DataFrame(rows)
+    df[col] = (df.pop(col) / (1024 * 1024)).round(2)
+    return df.rename(columns={col: col.replace("bytes", "MB")})
+
+
+def display_perf_panel():
+    """
+    管理者用パフォーマンスパネル。設定 perf_panel（管理者/デバッグ用フラグ）が有効で、
+    かつ perf_timing / perf_memory のどちらかが有効なときだけ表示する。
+    今回のリランのステージ別時間、直近のリラン全体の p50/p95、中間フレーム・キャッシュのメモリを表示する。
+    生データ（シート）はメモリ計測が有効なときだけここで取得する（通常のリランでは読まない）。
+    """
+    if not get_setting("perf_panel", False, bool):
+        return
+    timing, mem = perf.is_enabled(), memory.is_enabled()
+    if not (timing or mem):
+        return
+
+    with st.expander("🛠 パフォーマンス（管理者用）", expanded=False):
+        run = perf.current_run() if timing else []
+        if run:
+            total_ms = sum(r["ms"] for r in run if r["name"].startswith("app."))
+            st.caption(f"今回のリラン: app ステージ合計 {total_ms:,.0f} ms / スパン {len(run)} 件")
+            df_run = pd.DataFrame(run)
+            df_run["ステージ"] = ["　" * d + n for d, n in zip(df_run["depth"], df_run["name"])]
+            st.dataframe(df_run[["ステージ", "ms"]], use_container_width=True, hide_index=True)
+
+        recent = perf.recent_spans() if timing else []
+        if recent:
+            st.markdown("##### 直近のスパン集計（全セッション）")
+            st.dataframe(pd.DataFrame(perf.summarize(recent)), use_container_width=True, hide_index=True)
+            st.download_button(
+                "📥 スパンをJSONでダウンロード",
+                data="\n".join(json.dumps(r, ensure_ascii=False, default=str) for r in recent),
+                file_name="perf_spans.jsonl",
+                mime="application/json",
+            )
+
+        if mem:
+            store = get_data_store()
+            report = memory.memory_report(
+                load_data_from_sheets(),
+                get_figure_cache(),
+                get_knowledge_store(),
+                pivot_cache=get_pivot_cache(),
+                dataset=get_processed_dataset() if store is None else None,
+                data_store=store,
+                response_cache=get_response_cache(),
+                digest_cache=get_digest_cache(),
+            )
+            st.markdown("##### メモリ（中間フレーム / ステージピーク / キャッシュ）")
+            st.caption(f"tracemalloc 現在量: {report['traced_current_bytes'] / (1024 * 1024):,.1f}MB")
+            if report["frames"]:
+                st.dataframe(_mb(report["frames"], "bytes"), use_container_width=True, hide_index=True)
+            if report["stages"]:
+                stages = _mb(_mb(report["stages"], "peak_bytes"), "retained_bytes")
+                st.dataframe(stages, use_container_width=True, hide_index=True)
+            if report["caches"]:
+                st.dataframe(_mb(report["caches"], "bytes"), use_container_width=True, hide_index=True)
+            st.download_button(
+                "📥 メモリレポートをJSONでダウンロード",
+                data=json.dumps(report, ensure_ascii=False, indent=2, default=str),
+                file_name="memory_report.json",
+                mime="application/json",
+            )
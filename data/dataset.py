@@ -0,0 +1,132 @@
+"""
+全セッションで共有する処理済みデータセット（読み取り専用）。
+
+データ更新（バージョン）ごとに1回だけ process_data した結果を st.cache_resource で共有し、
+各セッションはそのビュー（浅いコピー）だけを持つ。同時ユーザーが増えても処理済みデータは1つ。
+- 共有データの保護は pandas の Copy-on-Write に任せる（pandas 3 は既定。pandas 2 ではこのモジュールの
+  import 時に有効にする）。セッション側の .loc 代入や列の上書きはそのセッションの列のコピーに対して行われ、
+  共有データは書き換わらない
+- shared_dataset_dir 指定時はバージョンごとの Feather ファイル（dataset_<version>.feather）に書き出し、
+  メモリマップで読む。既にファイルがあるプロセスは open_existing で開くだけで、process_data しない
+"""
+
+import os
+from pathlib import Path
+from types import MappingProxyType
+
+import pandas as pd
+
+from data.processor import ARROW_STRING
+
+# pandas 3 は Copy-on-Write が既定（オプション自体が無い）。pandas 2 では同じ動作にそろえる
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
+
+# 古いバージョンの Feather ファイルはこの個数だけ残す
+KEEP_VERSIONS = 3
+
+
+def _freeze_rules(value):
+    """master_rules を読み取り専用に（dict -> MappingProxyType, list -> tuple）"""
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze_rules(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze_rules(v) for v in value)
+    return value
+
+
+class ProcessedDataset:
+    """
+    処理済みデータ・master_rules・データバージョンの組（読み取り専用）。
+    frame はセッションごとの浅いコピーを返す（Copy-on-Write なので代入・列の追加削除は共有データに影響しない）。
+    """
+
+    def __init__(self, df: pd.DataFrame, master_rules: dict, version: str, path: str | None = None):
+        self._df = df
+        self.master_rules = _freeze_rules(master_rules)
+        self.version = version
+        self.path = path
+
+    @property
+    def frame(self) -> pd.DataFrame:
+        return self._df.copy(deep=False)
+
+    def __len__(self) -> int:
+        return len(self._df)
+
+    @classmethod
+    def open_existing(cls, master_rules: dict, version: str, directory: str) -> "ProcessedDataset | None":
+        """他プロセスが書き出し済みの Feather ファイルがあればメモリマップで開く（無い・読めなければ None）"""
+        path = Path(directory) / f"dataset_{version}.feather"
+        if not path.exists():
+            return None
+        try:
+            return cls(_read_feather(path), master_rules, version, str(path))
+        except Exception as e:
+            print(f"[WARNING] 共有データセット {path.name} を開けないため処理し直します: {e}")
+            return None
+
+    @classmethod
+    def build(cls, df: pd.DataFrame, master_rules: dict, version: str, directory: str | None = None) -> "ProcessedDataset":
+        """
+        df から共有データセットを作る。directory 指定時は Feather に書き出して
+        （同じバージョンのファイルが書き出し途中の競合で先にできていればそれを使って）メモリマップで開き直す。
+        書き出せない場合（pyarrow 未導入・型の混在等）はプロセス内のまま使う。
+        """
+        if directory is None or df.empty:
+            return cls(df, master_rules, version)
+        try:
+            path = _write_feather(df, version, Path(directory))
+            mapped = _read_feather(path)
+        except Exception as e:
+            print(f"[WARNING] 共有データセットを Feather に書き出せないためプロセス内で保持します: {e}")
+            return cls(df, master_rules, version)
+        return cls(mapped, master_rules, version, str(path))
+
+
+def _write_feather(df: pd.DataFrame, version: str, directory: Path) -> Path:
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"dataset_{version}.feather"
+    if path.exists():
+        return path
+    tmp = directory / f".dataset_{version}.{os.getpid()}.tmp"
+    try:
+        # 非圧縮（メモリマップでそのまま参照できるように）
+        df.reset_index(drop=True).to_feather(tmp, compression="uncompressed")
+        os.replace(tmp, path)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+    _cleanup(directory, keep=path)
+    return path
+
+
+def _read_feather(path: Path) -> pd.DataFrame:
+    """
+    メモリマップで読む。欠損の無い数値列はゼロコピー（split_blocks）、
+    文字列は NaN 意味論の Arrow 文字列があればそれで受ける（無ければ object に展開）
+    """
+    import pyarrow as pa
+    from pyarrow import feather
+
+    nan_semantics = ARROW_STRING is not None and ARROW_STRING.na_value is not pd.NA
+
+    def types_mapper(arrow_type):
+        if nan_semantics and (pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type)):
+            return ARROW_STRING
+        return None
+
+    table = feather.read_table(str(path), memory_map=True)
+    return table.to_pandas(split_blocks=True, types_mapper=types_mapper)
+
+
+def _cleanup(directory: Path, keep: Path) -> None:
+    """新しい方から KEEP_VERSIONS 個を残して古い Feather ファイルを消す（使用中で消せなければ次回）"""
+    files = sorted(directory.glob("dataset_*.feather"), key=lambda p: p.stat().st_mtime, reverse=True)
+    for old in files[KEEP_VERSIONS:]:
+        if old == keep:
+            continue
+        try:
+            old.unlink()
+        except OSError:
+            pass
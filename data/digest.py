@@ -0,0 +1,133 @@
+import pandas as pd
+import streamlit as st
+
+from ai.response_cache import ResponseCache
+from utils.tokens import estimate_tokens
+
+# (ラベル, 今日から何日前まで) ※当日=0
+DIGEST_PERIODS = [("当日", 0, 0), ("昨日", 1, 1), ("7日", 6, 0)]
+
+# 当日 vs 昨日でこの割合以上動いた指標を「注目の変化」に挙げる
+DELTA_THRESHOLD = 0.3
+
+
+def _fmt_int(v) -> str:
+    return "-" if pd.isna(v) else f"{v:,.0f}"
+
+
+def _fmt_pct(v) -> str:
+    return "-" if pd.isna(v) else f"{v:.0f}%"
+
+
+def _period_totals(df: pd.DataFrame, today: pd.Timestamp) -> pd.DataFrame:
+    """
+    案件 × 期間（当日/昨日/7日）の Cost/CV/Revenue 合計を1回の groupby から作る。
+    戻り値: index=Campaign_Name, columns=MultiIndex(期間, 指標)
+    """
+    start = today - pd.Timedelta(days=6)
+    window = df[(df["Date"] >= start) & (df["Date"] <= today)]
+    cols = [c for c in ["Cost", "CV", "Revenue"] if c in window.columns]
+    daily = window.groupby(["Campaign_Name", "Date"])[cols].sum()
+    for c in ["Cost", "CV", "Revenue"]:
+        if c not in daily.columns:
+            daily[c] = 0.0
+
+    dates = daily.index.get_level_values("Date")
+    frames = {}
+    for label, days_from, days_to in DIGEST_PERIODS:
+        lo = today - pd.Timedelta(days=days_from)
+        hi = today - pd.Timedelta(days=days_to)
+        frames[label] = daily[(dates >= lo) & (dates <= hi)].groupby(level="Campaign_Name").sum()
+    totals = pd.concat(frames, axis=1).fillna(0)
+
+    for label, _, _ in DIGEST_PERIODS:
+        if label not in totals.columns.get_level_values(0):
+            continue
+        cost = totals[(label, "Cost")]
+        cv = totals[(label, "CV")]
+        rev = totals[(label, "Revenue")]
+        totals[(label, "CPA")] = (cost / cv).where(cv > 0)
+        totals[(label, "回収率")] = (rev / cost * 100).where(cost > 0)
+    return totals
+
+
+def build_data_digest(df: pd.DataFrame, today=None, max_tokens: int = 600, max_projects: int = 10) -> str:
+    """
+    表示中のフィルタ条件のデータから、AIプロンプトに入れる小さな集計表を作る。
+    - 案件ごとに 当日/昨日/直近7日 の 費用・CV・CPA・回収率
+    - 当日 vs 昨日 で大きく動いた CPA/費用
+    合計タブと同じく Beyond を基準にし、Beyond が無い（Metaタブ等）場合は Meta を使う。
+    出力は max_tokens 以内（行単位で切り詰め）、案件は直近7日の費用上位 max_projects 件まで。
+    """
+    if df is None or df.empty:
+        return ""
+    today = pd.Timestamp(today).normalize() if today is not None else pd.Timestamp.now().normalize()
+
+    media = "Beyond" if (df["Media"] == "Beyond").any() else "Meta"
+    totals = _period_totals(df[df["Media"] == media], today)
+    if totals.empty:
+        return ""
+
+    totals = totals.sort_values(("7日", "Cost"), ascending=False) if ("7日", "Cost") in totals.columns else totals
+    shown = totals.head(max_projects)
+
+    lines = [
+        f"【現在の表示データ概況（{today:%Y-%m-%d}時点・{media}基準）】",
+        "案件|期間|費用|CV|CPA|回収率",
+    ]
+    for project, row in shown.iterrows():
+        for label, _, _ in DIGEST_PERIODS:
+            if (label, "Cost") not in row.index:
+                continue
+            lines.append(
+                f"{project}|{label}|{_fmt_int(row[(label, 'Cost')])}|{_fmt_int(row[(label, 'CV')])}|"
+                f"{_fmt_int(row[(label, 'CPA')])}|{_fmt_pct(row[(label, '回収率')])}"
+            )
+    if len(totals) > len(shown):
+        lines.append(f"（他 {len(totals) - len(shown)} 案件は省略）")
+
+    # 注目の変化（当日 vs 昨日）
+    deltas = []
+    if ("当日", "Cost") in totals.columns and ("昨日", "Cost") in totals.columns:
+        for project, row in shown.iterrows():
+            for metric in ["CPA", "Cost"]:
+                cur, prev = row[("当日", metric)], row[("昨日", metric)]
+                if pd.isna(cur) or pd.isna(prev) or prev == 0:
+                    continue
+                change = cur / prev - 1
+                if abs(change) >= DELTA_THRESHOLD:
+                    name = "費用" if metric == "Cost" else metric
+                    deltas.append(f"・{project}: {name} {_fmt_int(cur)} (昨日比 {change * 100:+.0f}%)")
+    if deltas:
+        lines.append("注目の変化:")
+        lines.extend(deltas)
+
+    # トークン上限（行単位）
+    kept, used = [], 0
+    for line in lines:
+        cost = estimate_tokens(line) + 1
+        if used + cost > max_tokens:
+            break
+        kept.append(line)
+        used += cost
+    return "\n".join(kept)
+
+
+@st.cache_resource
+def get_digest_cache() -> ResponseCache:
+    """全セッションで共有するダイジェストのキャッシュ（LRU + TTL。メモリレポートから中身を数えられる）"""
+    return ResponseCache(maxsize=64, ttl_seconds=600)
+
+
+def get_cached_digest(filter_key, df, max_tokens: int = 600):
+    """
+    フィルタ状態（データバージョン・タブ・商品・記事・クリエイティブ・日付）ごとにダイジェストをキャッシュ。
+    df はキーに含めない（filter_key で内容が決まる前提）。DataFrame を返す関数も渡せる（キャッシュミス時だけ呼ぶ）。
+    """
+    cache = get_digest_cache()
+    key = (filter_key, max_tokens)
+    digest = cache.get(key)
+    if digest is None:
+        digest = build_data_digest(df() if callable(df) else df, max_tokens=max_tokens)
+        cache.put(key, digest)
+    return digest
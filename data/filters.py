@@ -0,0 +1,113 @@
+"""
+ヘッダーのフィルタ（タブ・商品・記事・クリエイティブ・期間）の適用。
+
+pandas の処理済みデータと DuckDBStore（data_store=duckdb）に同じ条件を掛ける。
+両者の一致は benchmarks/store_parity.py で確認する。
+- 選択肢: 商品はタブの媒体内、記事は Beyond の Creative、クリエイティブは Meta の Creative（出現順）
+- 本体の絞り込み: タブでは絞らない（KPI・テーブル側で媒体を分ける）。記事指定時は Beyond の行だけ残す
+- 期間テーブル・AIダイジェスト用のベース: タブの媒体・商品・記事・クリエイティブで絞り、期間では絞らない
+"""
+
+import pandas as pd
+
+
+def _date_bounds(date_range):
+    """st.date_input の値が (開始, 終了) のときだけ期間で絞る（片側だけ選択中は絞らない）"""
+    if isinstance(date_range, tuple) and len(date_range) == 2:
+        return date_range
+    return None
+
+
+def _tab_media(selected_tab):
+    return None if selected_tab == "合計" else selected_tab
+
+
+# --- pandas ---
+def filter_options(df: pd.DataFrame, selected_tab: str) -> tuple[list, list, list]:
+    """タブに応じた 商品 / 記事 / クリエイティブ の選択肢"""
+    media = _tab_media(selected_tab)
+    df_filter_source = df if media is None else df[df["Media"] == media]
+
+    all_campaigns = ["All"] + list(df_filter_source["Campaign_Name"].unique())
+
+    # 記事 = Beyond の Creative、クリエイティブ = Meta の Creative（合計タブは両方）
+    if selected_tab == "Meta":
+        all_articles = ["All"]
+    else:
+        all_articles = ["All"] + list(df[df["Media"] == "Beyond"]["Creative"].dropna().unique())
+    if selected_tab == "Beyond":
+        all_creatives = ["All"]
+    else:
+        all_creatives = ["All"] + list(df[df["Media"] == "Meta"]["Creative"].dropna().unique())
+    return all_campaigns, all_articles, all_creatives
+
+
+def filter_frame(df: pd.DataFrame, selected_campaign, selected_article, selected_creative, date_range) -> pd.DataFrame:
+    """本体の絞り込み（タブでは絞らない）"""
+    mask = pd.Series(True, index=df.index)
+
+    bounds = _date_bounds(date_range)
+    if bounds is not None:
+        start_d, end_d = bounds
+        mask &= (df["Date"].dt.date >= start_d) & (df["Date"].dt.date <= end_d)
+
+    if selected_campaign != "All":
+        mask &= (df["Campaign_Name"] == selected_campaign)
+
+    # 記事フィルタ = Beyond の特定記事の成果。Meta には記事情報が無いので Meta の行は消える
+    if selected_article != "All":
+        mask &= (df["Media"] == "Beyond") & (df["Creative"] == selected_article)
+
+    # クリエイティブフィルタ（Meta Creative）
+    if selected_creative != "All":
+        mask &= (df["Creative"] == selected_creative)
+
+    return df[mask]
+
+
+def base_frame(df: pd.DataFrame, selected_tab, selected_campaign, selected_article, selected_creative) -> pd.DataFrame:
+    """期間テーブル用のベース（タブの媒体で絞り、期間では絞らない）"""
+    media = _tab_media(selected_tab)
+    df_base = df if media is None else df[df["Media"] == media]
+
+    mask_base = pd.Series(True, index=df_base.index)
+    if selected_campaign != "All":
+        mask_base &= (df_base["Campaign_Name"] == selected_campaign)
+    if selected_article != "All":
+        mask_base &= (df_base["Creative"] == selected_article)
+    if selected_creative != "All":
+        mask_base &= (df_base["Creative"] == selected_creative)
+    return df_base[mask_base]
+
+
+# --- DuckDBStore（DuckDBStore.where の引数） ---
+def store_filter_options(store, selected_tab: str) -> tuple[list, list, list]:
+    """filter_options と同じ選択肢を SQL で（出現順 = 挿入順）"""
+    all_campaigns = ["All"] + store.distinct("Campaign_Name", media=_tab_media(selected_tab))
+    all_articles = ["All"] if selected_tab == "Meta" else ["All"] + store.distinct("Creative", media="Beyond")
+    all_creatives = ["All"] if selected_tab == "Beyond" else ["All"] + store.distinct("Creative", media="Meta")
+    return all_campaigns, all_articles, all_creatives
+
+
+def store_filters(selected_campaign, selected_article, selected_creative, date_range) -> dict:
+    """filter_frame と同じ条件"""
+    filters = dict(
+        media="Beyond" if selected_article != "All" else None,
+        campaign=selected_campaign,
+        article=selected_article,
+        creative=selected_creative,
+    )
+    bounds = _date_bounds(date_range)
+    if bounds is not None:
+        filters["start"], filters["end"] = bounds
+    return filters
+
+
+def store_base_filters(selected_tab, selected_campaign, selected_article, selected_creative) -> dict:
+    """base_frame と同じ条件"""
+    return dict(
+        media=_tab_media(selected_tab),
+        campaign=selected_campaign,
+        article=selected_article,
+        creative=selected_creative,
+    )
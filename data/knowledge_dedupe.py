@@ -0,0 +1,97 @@
+import re
+import unicodedata
+import zlib
+
+import numpy as np
+import pandas as pd
+
+# MinHash の素数モジュロ（2^61 - 1）
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def _shingles(text: object, k: int = 3) -> set[int]:
+    """正規化した本文の文字 k-shingle（crc32 でハッシュ化）"""
+    if text is None or (isinstance(text, float) and pd.isna(text)):
+        return set()
+    s = unicodedata.normalize("NFKC", str(text)).lower()
+    s = re.sub(r"\s+", "", s)
+    if len(s) <= k:
+        return {zlib.crc32(s.encode("utf-8"))} if s else set()
+    return {zlib.crc32(s[i : i + k].encode("utf-8")) for i in range(len(s) - k + 1)}
+
+
+class MinHasher:
+    """num_perm 本のハッシュ関数 (a*x + b) mod p による MinHash 署名"""
+
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self.a = rng.randint(1, _MAX_HASH, size=num_perm, dtype=np.uint64)
+        self.b = rng.randint(0, _MAX_HASH, size=num_perm, dtype=np.uint64)
+
+    def signature(self, shingles: set[int]) -> np.ndarray:
+        if not shingles:
+            return np.full(self.num_perm, _MAX_HASH, dtype=np.uint64)
+        x = np.fromiter(shingles, dtype=np.uint64)
+        # (a*x + b) mod p を 32bit に丸める（x, a < 2^32 なので積は 2^64 未満）
+        hv = (np.outer(x, self.a) + self.b) % np.uint64(_MERSENNE_PRIME) & np.uint64(_MAX_HASH)
+        return hv.min(axis=0)
+
+
+def _find(parent: list[int], i: int) -> int:
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def dedupe_knowledge(df_knowledge: pd.DataFrame, threshold: float = 0.8, num_perm: int = 64, bands: int = 16) -> tuple[pd.DataFrame, dict]:
+    """
+    Knowledge 本文の近似重複（MinHash 推定 Jaccard >= threshold）を1件に集約する。
+    - LSH（bands × rows の帯分割）で候補ペアだけを比較
+    - 同一カテゴリ内のみ統合し、クラスタ代表は本文が最長の行（同長なら先の行）
+    - 行順は元のまま（代表行だけを残す）
+    戻り値: (集約後 DataFrame, レポート)
+    """
+    n = len(df_knowledge)
+    report = {"original": n, "deduped": n, "clusters_merged": 0, "compression_ratio": 1.0}
+    if n < 2 or "Knowledge" not in df_knowledge.columns:
+        return df_knowledge, report
+
+    rows_per_band = num_perm // bands
+    hasher = MinHasher(num_perm=num_perm)
+    texts = df_knowledge["Knowledge"].tolist()
+    categories = df_knowledge["Category"].tolist() if "Category" in df_knowledge.columns else [None] * n
+    signatures = np.vstack([hasher.signature(_shingles(t)) for t in texts])
+
+    parent = list(range(n))
+    for band in range(bands):
+        buckets: dict[tuple, list[int]] = {}
+        band_sig = signatures[:, band * rows_per_band : (band + 1) * rows_per_band]
+        for i in range(n):
+            buckets.setdefault((categories[i], band_sig[i].tobytes()), []).append(i)
+        for members in buckets.values():
+            if len(members) < 2:
+                continue
+            first = members[0]
+            for j in members[1:]:
+                ri, rj = _find(parent, first), _find(parent, j)
+                if ri == rj:
+                    continue
+                # 候補ペアは署名全体の一致率（推定 Jaccard）で確定
+                if np.mean(signatures[first] == signatures[j]) >= threshold:
+                    parent[rj] = ri
+
+    clusters: dict[int, list[int]] = {}
+    for i in range(n):
+        clusters.setdefault(_find(parent, i), []).append(i)
+
+    keep = sorted(max(members, key=lambda i: (len(str(texts[i])), -i)) for members in clusters.values())
+    deduped = df_knowledge.iloc[keep]
+    report.update(
+        deduped=len(deduped),
+        clusters_merged=sum(1 for members in clusters.values() if len(members) > 1),
+        compression_ratio=(len(deduped) / n) if n else 1.0,
+    )
+    return deduped, report
@@ -0,0 +1,114 @@
+import math
+import re
+import unicodedata
+from collections import Counter
+
+import pandas as pd
+
+from utils.tokens import estimate_tokens
+
+# 英数字は単語、それ以外（日本語など）は連続部分を文字 bigram に分解する
+_WORD_RE = re.compile(r"[0-9a-z]+|[^\s0-9a-z\W_]+")
+
+
+def tokenize(text: object) -> list[str]:
+    """
+    BM25 用の語分割。形態素解析を使わず、日本語は文字 bigram（1文字だけの場合は unigram）で扱う。
+    例: "CPA改善" -> ["cpa", "改善"]、"クリエイティブ" -> ["クリ", "リエ", ...]
+    """
+    if text is None or (isinstance(text, float) and pd.isna(text)):
+        return []
+    s = unicodedata.normalize("NFKC", str(text)).lower()
+    terms = []
+    for run in _WORD_RE.findall(s):
+        if run.isascii():
+            terms.append(run)
+        elif len(run) == 1:
+            terms.append(run)
+        else:
+            terms.extend(run[i : i + 2] for i in range(len(run) - 1))
+    return terms
+
+
+class KnowledgeIndex:
+    """
+    Knowledge シートに対する BM25 検索インデックス。
+    質問ごとに関連の高いナレッジを上位から選び、トークン予算内に収めて返す。
+    """
+
+    def __init__(self, df_knowledge: pd.DataFrame, k1: float = 1.5, b: float = 0.75, snippets: list[str] | None = None):
+        self.k1 = k1
+        self.b = b
+        df = df_knowledge.reset_index(drop=True) if df_knowledge is not None else pd.DataFrame()
+        self.categories = df["Category"].fillna("").astype(str).tolist() if "Category" in df.columns else [""] * len(df)
+        subcategories = df["Subcategory"].fillna("").astype(str).tolist() if "Subcategory" in df.columns else [""] * len(df)
+        knowledge = df["Knowledge"].fillna("").astype(str).tolist() if "Knowledge" in df.columns else [""] * len(df)
+
+        # snippets: 整形済みスニペット（KnowledgeStore から渡されれば作り直さない）
+        if snippets is None:
+            snippets = [f"【{c} / {s}】{k}" for c, s, k in zip(self.categories, subcategories, knowledge)]
+        self.snippets = snippets
+        self.snippet_tokens = [estimate_tokens(t) for t in self.snippets]
+
+        # 文書 = カテゴリ + サブカテゴリ + 本文
+        self.doc_terms = [Counter(tokenize(f"{c} {s} {k}")) for c, s, k in zip(self.categories, subcategories, knowledge)]
+        self.doc_len = [sum(tf.values()) for tf in self.doc_terms]
+        self.avg_len = (sum(self.doc_len) / len(self.doc_len)) if self.doc_len else 0.0
+
+        # 転置インデックス: term -> [(doc_id, tf), ...]
+        self.postings: dict[str, list[tuple[int, int]]] = {}
+        for doc_id, tf in enumerate(self.doc_terms):
+            for term, freq in tf.items():
+                self.postings.setdefault(term, []).append((doc_id, freq))
+
+        n = len(self.doc_terms)
+        self.idf = {
+            term: math.log(1 + (n - len(plist) + 0.5) / (len(plist) + 0.5))
+            for term, plist in self.postings.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.snippets)
+
+    def score(self, query: str) -> dict[int, float]:
+        """質問に対する BM25 スコア（ヒットした文書のみ）"""
+        scores: dict[int, float] = {}
+        for term in set(tokenize(query)):
+            plist = self.postings.get(term)
+            if not plist:
+                continue
+            idf = self.idf[term]
+            for doc_id, freq in plist:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_len[doc_id] / (self.avg_len or 1.0))
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * freq * (self.k1 + 1) / (freq + norm)
+        return scores
+
+    def search(self, query: str, top_k: int = 20, token_budget: int = 3000, category: str | None = None) -> list[int]:
+        """
+        上位 top_k 件の文書IDを返す（累積トークンが token_budget を超える文書はスキップ）。
+        category 指定時はそのカテゴリ内だけを対象にする。
+        ヒットが無い場合は先頭から（従来の head と同じ並びで）予算内に詰める。
+        """
+        def allowed(doc_id: int) -> bool:
+            return not category or category == "All" or self.categories[doc_id] == category
+
+        scores = self.score(query)
+        ranked = sorted((d for d in scores if allowed(d)), key=lambda d: (-scores[d], d))
+        if not ranked:
+            ranked = [d for d in range(len(self.snippets)) if allowed(d)]
+
+        selected = []
+        used = 0
+        for doc_id in ranked:
+            if len(selected) >= top_k:
+                break
+            cost = self.snippet_tokens[doc_id]
+            if used + cost > token_budget:
+                continue
+            selected.append(doc_id)
+            used += cost
+        return selected
+
+    def format_for_ai(self, query: str, top_k: int = 20, token_budget: int = 3000, category: str | None = None) -> str:
+        """search の結果を format_knowledge_for_ai と同じ形式で連結する"""
+        return "\n".join(self.snippets[d] for d in self.search(query, top_k=top_k, token_budget=token_budget, category=category))
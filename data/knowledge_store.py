@@ -0,0 +1,84 @@
+import hashlib
+
+import pandas as pd
+
+from data.knowledge_index import KnowledgeIndex
+
+
+def format_snippets(df_knowledge: pd.DataFrame) -> pd.Series:
+    """ナレッジ各行を "【Category / Subcategory】Knowledge" 形式に（列演算で一括生成）"""
+    def col(name):
+        if name in df_knowledge.columns:
+            return df_knowledge[name].fillna("").astype(str)
+        return pd.Series("", index=df_knowledge.index)
+
+    return "【" + col("Category") + " / " + col("Subcategory") + "】" + col("Knowledge")
+
+
+class KnowledgeStore:
+    """
+    ナレッジ更新ごとに1回だけ構築する読み取り専用のナレッジ置き場。
+    カテゴリ/サブカテゴリの索引・整形済みスニペット・BM25 インデックスを持ち、
+    サイドバーのリランでは DataFrame に触らずにここから引く。
+    """
+
+    def __init__(self, df_knowledge: pd.DataFrame, dedupe_report: dict | None = None):
+        df = df_knowledge.reset_index(drop=True) if df_knowledge is not None else pd.DataFrame()
+        self.frame = df
+        self.dedupe_report = dedupe_report or {}
+        self.snippets = format_snippets(df).tolist() if not df.empty else []
+
+        categories = df["Category"] if "Category" in df.columns else pd.Series(dtype=object)
+        subcategories = df["Subcategory"] if "Subcategory" in df.columns else pd.Series(dtype=object)
+
+        # 出現順を保った一覧（従来の dropna().unique() と同じ並び）
+        self.categories = categories.dropna().unique().tolist()
+        self.subcategories = {"All": subcategories.dropna().unique().tolist()}
+
+        # カテゴリ → 行番号、(カテゴリ, サブカテゴリ) → 行番号
+        self.ids_by_category: dict[str, list[int]] = {}
+        self.ids_by_pair: dict[tuple, list[int]] = {}
+        for i, (cat, sub) in enumerate(zip(categories.tolist(), subcategories.tolist() or [None] * len(df))):
+            if pd.isna(cat):
+                continue
+            self.ids_by_category.setdefault(cat, []).append(i)
+            if not pd.isna(sub):
+                self.ids_by_pair.setdefault((cat, sub), []).append(i)
+                subs = self.subcategories.setdefault(cat, [])
+                if sub not in subs:
+                    subs.append(sub)
+
+        self.version = hashlib.sha1("\n".join(self.snippets).encode("utf-8")).hexdigest()[:16]
+        self._index = None
+
+    def __len__(self) -> int:
+        return len(self.snippets)
+
+    def ids(self, category=None, subcategory=None) -> list[int]:
+        """カテゴリ/サブカテゴリに該当する行番号（"All"/None は絞り込みなし）"""
+        if category and category != "All":
+            if subcategory and subcategory != "All":
+                return self.ids_by_pair.get((category, subcategory), [])
+            return self.ids_by_category.get(category, [])
+        if subcategory and subcategory != "All":
+            return [i for (_, sub), ids in self.ids_by_pair.items() if sub == subcategory for i in ids]
+        return list(range(len(self.snippets)))
+
+    def count(self, category=None, subcategory=None) -> int:
+        return len(self.ids(category, subcategory))
+
+    def get_subcategories(self, category=None) -> list:
+        return self.subcategories.get(category if category and category != "All" else "All", [])
+
+    def get_frame(self, category=None, subcategory=None) -> pd.DataFrame:
+        """後方互換用: 絞り込んだ DataFrame（元の行順）"""
+        if self.frame.empty:
+            return self.frame
+        return self.frame.iloc[self.ids(category, subcategory)]
+
+    @property
+    def index(self) -> KnowledgeIndex:
+        """BM25 インデックス（初回アクセス時に構築。整形済みスニペットはそのまま共有する）"""
+        if self._index is None:
+            self._index = KnowledgeIndex(self.frame, snippets=self.snippets)
+        return self._index
@@ -1,6 +1,17 @@
 import pandas as pd
 import numpy as np
 import re
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from utils import memory, perf
+from utils.memory import traced_stage, track_frame
+from utils.perf import record, stage_timer, timed
+from utils.settings import get_setting
 
 # --- Master (Master_Setting) ---
 MASTER_REQUIRED_COLS = [
@@ -13,6 +24,78 @@ MASTER_REQUIRED_COLS = [
     "Meta CV名",
 ]
 
+# --- Beyond の PageName / Ver.Name 列の候補（先にあるものを優先） ---
+BEYOND_PAGE_CANDIDATES = [
+    "Beyond PageName",
+    "Beyond Pagename",
+    "beyond_page_name",
+    "PageName",
+    "Pagename",
+    "page_name",
+    "pageName",
+    "page",
+    "folder_name",  # fallback
+]
+BEYOND_VER_CANDIDATES = [
+    "Ver.Name",
+    "Ver Name",
+    "ver_name",
+    "verName",
+    "version_name",
+    "version",
+    "version_name",
+]
+
+def _arrow_string_dtype():
+    """
+    Arrow-backed 入力（loader の dtype_backend="pyarrow"）で文字列列に使う型。
+    欠損との比較が False になる（NA にならない）NaN 意味論の Arrow 文字列を優先する
+    （NA 意味論だと app.py のフィルタ用マスクが NA を含んで使えなくなるため）
+    """
+    try:
+        return pd.StringDtype("pyarrow", na_value=np.nan)  # pandas >= 2.3
+    except TypeError:
+        pass
+    try:
+        return pd.StringDtype("pyarrow_numpy")  # pandas 2.1 / 2.2
+    except ValueError:
+        return pd.StringDtype("pyarrow")
+
+
+try:
+    ARROW_STRING = _arrow_string_dtype()
+except ImportError:  # pyarrow 未導入（Arrow-backed 入力は来ない）
+    ARROW_STRING = None
+
+
+def _is_arrow(s: pd.Series) -> bool:
+    """Arrow-backed の列か（ArrowDtype / Arrow 文字列）"""
+    return isinstance(s.dtype, pd.ArrowDtype) or str(getattr(s.dtype, "storage", "")).startswith("pyarrow")
+
+
+def _as_text(s: pd.Series) -> pd.Series:
+    """
+    astype(str) 相当。Arrow-backed の列は object に戻さず Arrow 文字列のまま
+    （欠損は astype(str) と同じ "nan" にして、後続の .str / 正規表現の結果を揃える）
+    """
+    if _is_arrow(s):
+        return s.astype(ARROW_STRING).fillna("nan")
+    return s.astype(str)
+
+
+def _text_like(values: pd.Series, source: pd.Series) -> pd.Series:
+    """map/apply で作った文字列列を、元の列が Arrow-backed なら Arrow 文字列にそろえる"""
+    return values.astype(ARROW_STRING) if _is_arrow(source) else values
+
+
+def _to_number(s: pd.Series) -> pd.Series:
+    """pd.to_numeric(errors="coerce").fillna(0)。Arrow の数値は numpy に戻す（集計・グラフ側は numpy 前提）"""
+    out = pd.to_numeric(s, errors="coerce").fillna(0)
+    if isinstance(out.dtype, pd.ArrowDtype):
+        out = out.astype(out.dtype.numpy_dtype)
+    return out
+
+
 def _normalize_text(value: object) -> str:
     """
     マッチング用の文字列正規化。
@@ -206,7 +289,10 @@ def calculate_revenue_profit(row, project_settings):
     
     return revenue, profit
 
+@timed("process.meta")
+@traced_stage("process.meta")
 def process_meta_data(df_live, df_history, master_rules: dict | None = None):
+    timer = stage_timer("meta")
     # 1. Combine Live & History
     if not df_live.empty:
         df_live['Day'] = pd.to_datetime(df_live['Day']).dt.strftime('%Y-%m-%d')
@@ -218,6 +304,8 @@ def process_meta_data(df_live, df_history, master_rules: dict | None = None):
     live_filtered = df_live[df_live['Day'] == today] if not df_live.empty else pd.DataFrame()
     
     combined = pd.concat([history_filtered, live_filtered], ignore_index=True)
+    timer.lap("combine", rows=len(combined))
+    track_frame("meta.combine", combined)
     if combined.empty: return pd.DataFrame()
 
     rules = master_rules or {"projects": {}, "meta_tokens": [], "beyond_tokens": []}
@@ -234,12 +322,15 @@ def process_meta_data(df_live, df_history, master_rules: dict | None = None):
         # 極端なケース: Campaign Name列が無ければ、できるだけ落とさずに見える化する
         combined["Campaign_Name"] = "Unmapped"
     else:
-        combined["Campaign_Name"] = combined[campaign_col].apply(lambda x: _match_project(x, meta_tokens) or "Unmapped")
+        combined["Campaign_Name"] = _text_like(
+            combined[campaign_col].apply(lambda x: _match_project(x, meta_tokens) or "Unmapped"), combined[campaign_col]
+        )
+    timer.lap("match")
 
     # 3. Rename Columns
     # 重複除外用にリネーム前の Ad Name を保持
     if "Ad Name" in combined.columns:
-        combined["_ad_raw"] = combined["Ad Name"].astype(str)
+        combined["_ad_raw"] = _as_text(combined["Ad Name"])
 
     # Metaデータ: Amount Spent -> Cost, Impressions -> Impressions, Link Clicks -> Clicks
     rename_map = {
@@ -251,12 +342,16 @@ def process_meta_data(df_live, df_history, master_rules: dict | None = None):
     }
     combined.rename(columns=rename_map, inplace=True)
     combined['Date'] = pd.to_datetime(combined['Date'])
+    timer.lap("rename")
 
     # クリエイティブID（Meta/Beyond と同一ルール）を抽出し、Creative を表示用に揃える
     if "Creative" in combined.columns:
-        combined["creative_value"] = combined["Creative"].astype(str).map(extract_creative_from_text)
-        has_id = combined["creative_value"].astype(str).str.len() > 0
+        creative_text = _as_text(combined["Creative"])
+        combined["creative_value"] = _text_like(creative_text.map(extract_creative_from_text), creative_text)
+        has_id = (combined["creative_value"].str.len() > 0).to_numpy(dtype=bool)
         combined.loc[has_id, "Creative"] = combined.loc[has_id, "creative_value"]
+        combined["Creative"] = _text_like(combined["Creative"], creative_text)
+    timer.lap("creative")
 
     # 重複除外キー用に、元の Ad Name 相当を保持（リネームで消えた場合）
     if "Ad Name" not in combined.columns and "Creative" in combined.columns and "_ad_raw" not in combined.columns:
@@ -276,9 +371,9 @@ def process_meta_data(df_live, df_history, master_rules: dict | None = None):
             if not mask.any():
                 continue
             if cv_col and cv_col in combined.columns:
-                combined.loc[mask, "MCV"] = pd.to_numeric(combined.loc[mask, cv_col], errors="coerce").fillna(0)
+                combined.loc[mask, "MCV"] = _to_number(combined.loc[mask, cv_col])
             elif has_results:
-                combined.loc[mask, "MCV"] = pd.to_numeric(combined.loc[mask, "Results"], errors="coerce").fillna(0)
+                combined.loc[mask, "MCV"] = _to_number(combined.loc[mask, "Results"])
             else:
                 combined.loc[mask, "MCV"] = 0
 
@@ -286,23 +381,24 @@ def process_meta_data(df_live, df_history, master_rules: dict | None = None):
         if has_results:
             unmapped_mask = combined["Campaign_Name"].isin(["Unmapped", "", None]) if "Campaign_Name" in combined.columns else pd.Series(False, index=combined.index)
             if unmapped_mask.any():
-                combined.loc[unmapped_mask, "MCV"] = pd.to_numeric(combined.loc[unmapped_mask, "Results"], errors="coerce").fillna(0)
+                combined.loc[unmapped_mask, "MCV"] = _to_number(combined.loc[unmapped_mask, "Results"])
     else:
         if has_results:
-            combined["MCV"] = pd.to_numeric(combined["Results"], errors="coerce").fillna(0)
+            combined["MCV"] = _to_number(combined["Results"])
 
     # 数値型変換
     for col in ['Cost', 'Impressions', 'Clicks', 'MCV']:
         if col in combined.columns:
-            combined[col] = pd.to_numeric(combined[col], errors='coerce').fillna(0)
+            combined[col] = _to_number(combined[col])
 
-    combined['Media'] = 'Meta'
+    combined['Media'] = _text_like(pd.Series('Meta', index=combined.index), combined["Campaign_Name"])
     
     # Metaデータには「本CV」はないとする（合計タブではBeyondのCVを使うため）
     # ただしMetaタブ単体で見るときは Results = CV とみなす場合もあるが、
     # 今回の要件では「MetaタブのKPI: CV = meta_data['Results']」となっているため、
     # 便宜上 CV カラムも作っておく（中身はMCVと同じ）
     combined['CV'] = combined['MCV'] 
+    timer.lap("mcv")
 
     # 重複除外（ユーザー指定キー）
     # 日付×Account Name×Campaign Name×Ad Set Name×元Ad Name が一致する行は同一扱い
@@ -316,6 +412,8 @@ def process_meta_data(df_live, df_history, master_rules: dict | None = None):
     dedupe_cols = [c for c in dedupe_cols if c in combined.columns]
     if len(dedupe_cols) >= 2:
         combined = combined.drop_duplicates(subset=dedupe_cols, keep="last").copy()
+    timer.lap("dedupe", rows=len(combined))
+    track_frame("meta.dedupe", combined)
 
     # 売上・粗利（行レベル）はここでは0にしておく（合計タブで案件単位で再計算した方が安全）
     # ただし予算/IHの案件は Meta Cost から手数料売上を算出できるので、参考値として入れる
@@ -329,10 +427,15 @@ def process_meta_data(df_live, df_history, master_rules: dict | None = None):
                 if mask.any():
                     combined.loc[mask, "Revenue"] = combined.loc[mask, "Cost"] * fee
                     combined.loc[mask, "Gross_Profit"] = combined.loc[mask, "Revenue"]
+    timer.lap("revenue")
+    track_frame("meta.result", combined)
 
     return combined
 
+@timed("process.beyond")
+@traced_stage("process.beyond")
 def process_beyond_data(df_live, df_history, master_rules: dict | None = None):
+    timer = stage_timer("beyond")
     rules = master_rules or {"projects": {}, "meta_tokens": [], "beyond_tokens": []}
     project_settings = rules.get("projects", {})
     beyond_tokens = rules.get("beyond_tokens", [])
@@ -358,6 +461,8 @@ def process_beyond_data(df_live, df_history, master_rules: dict | None = None):
     live_filtered = df_live[df_live['date_jst'] == today] if not df_live.empty else pd.DataFrame()
     
     combined = pd.concat([history_filtered, live_filtered], ignore_index=True)
+    timer.lap("combine", rows=len(combined))
+    track_frame("beyond.combine", combined)
     if combined.empty: return pd.DataFrame()
     
     # 必須カラムの最終チェック
@@ -367,29 +472,8 @@ def process_beyond_data(df_live, df_history, master_rules: dict | None = None):
             return pd.DataFrame()
 
     # 2. PageName/Ver.Name の列推測（Master_Setting の Beyond名 は PageName に含まれる想定）
-    page_candidates = [
-        "Beyond PageName",
-        "Beyond Pagename",
-        "beyond_page_name",
-        "PageName",
-        "Pagename",
-        "page_name",
-        "pageName",
-        "page",
-        "folder_name",  # fallback
-    ]
-    ver_candidates = [
-        "Ver.Name",
-        "Ver Name",
-        "ver_name",
-        "verName",
-        "version_name",
-        "version",
-        "version_name",
-    ]
-
-    page_col = next((c for c in page_candidates if c in combined.columns), None)
-    ver_col = next((c for c in ver_candidates if c in combined.columns), None)
+    page_col = next((c for c in BEYOND_PAGE_CANDIDATES if c in combined.columns), None)
+    ver_col = next((c for c in BEYOND_VER_CANDIDATES if c in combined.columns), None)
 
     if page_col is None:
         print("[WARNING] Beyond: PageName列が見つかりません（案件判定が Unmapped になります）")
@@ -398,7 +482,10 @@ def process_beyond_data(df_live, df_history, master_rules: dict | None = None):
         combined["_page_for_match"] = combined[page_col]
 
     # 3. 案件判定（Beyond名 token が PageName に含まれるかで管理用案件名に正規化）
-    combined["Campaign_Name"] = combined["_page_for_match"].apply(lambda x: _match_project(x, beyond_tokens) or "Unmapped")
+    combined["Campaign_Name"] = _text_like(
+        combined["_page_for_match"].apply(lambda x: _match_project(x, beyond_tokens) or "Unmapped"), combined["parameter"]
+    )
+    timer.lap("match")
 
     # 4. 重複除外（ユーザー指定キー）
     # 日付×Beyond PageName×Ver.Name×Parameter が一致する行は同一扱い
@@ -411,6 +498,8 @@ def process_beyond_data(df_live, df_history, master_rules: dict | None = None):
     dedupe_cols = [c for c in dedupe_cols if c in combined.columns]
     if len(dedupe_cols) >= 2:
         combined = combined.drop_duplicates(subset=dedupe_cols, keep="last").copy()
+    timer.lap("dedupe", rows=len(combined))
+    track_frame("beyond.dedupe", combined)
     
     # 5. Rename
     # Beyondデータ:
@@ -431,28 +520,32 @@ def process_beyond_data(df_live, df_history, master_rules: dict | None = None):
     }
     combined.rename(columns=rename_map, inplace=True)
     combined['Date'] = pd.to_datetime(combined['Date'])
+    timer.lap("rename")
 
     # Creative（記事用表示）を作成
     if page_col and page_col in combined.columns:
-        combined["Creative"] = combined[page_col].astype(str)
+        combined["Creative"] = _as_text(combined[page_col])
     else:
         combined["Creative"] = ""
 
     # Beyond: parameter からクリエイティブID（Meta と同一ルール）。Live/History 合算後もここで統一。
     if "Parameter" in combined.columns:
-        combined["creative_value"] = combined["Parameter"].astype(str).apply(
-            lambda p: extract_creative_from_text(_beyond_param_value(p)) or extract_creative_from_text(p)
+        param_text = _as_text(combined["Parameter"])
+        combined["creative_value"] = _text_like(
+            param_text.apply(lambda p: extract_creative_from_text(_beyond_param_value(p)) or extract_creative_from_text(p)),
+            param_text,
         )
     else:
         combined["creative_value"] = ""
+    timer.lap("creative")
 
     # 数値変換
     cols = ['Cost', 'PV', 'Clicks', 'CV', 'FV_Exit', 'SV_Exit']
     for col in cols:
         if col in combined.columns:
-            combined[col] = pd.to_numeric(combined[col], errors='coerce').fillna(0)
+            combined[col] = _to_number(combined[col])
             
-    combined['Media'] = 'Beyond'
+    combined['Media'] = _text_like(pd.Series('Beyond', index=combined.index), combined["Campaign_Name"])
 
     # 売上・粗利計算 (Beyondデータ用, マスタベース)
     combined["Revenue"] = 0.0
@@ -476,28 +569,134 @@ def process_beyond_data(df_live, df_history, master_rules: dict | None = None):
             return revenue, profit
 
         rev_prof = combined.apply(calc_beyond_row, axis=1, result_type="expand")
+        track_frame("beyond.rev_prof", rev_prof)
         combined["Revenue"] = rev_prof[0]
         combined["Gross_Profit"] = rev_prof[1]
+    timer.lap("revenue")
+    track_frame("beyond.result", combined)
 
     return combined
 
-def process_data(data_dict):
+# --- 並列実行（Meta / Beyond と日付チャンク） ---
+# 媒体: (処理関数, Live シート, History シート, 日付列)
+BRANCHES = {
+    "meta": (process_meta_data, "Meta_Live", "Meta_History", "Day"),
+    "beyond": (process_beyond_data, "Beyond_Live", "Beyond_History", "date_jst"),
+}
+
+_executors: dict[int, ProcessPoolExecutor] = {}
+_executors_lock = threading.Lock()
+
+
+def _init_worker():
+    """
+    ワーカープロセスでは計測しない（tracemalloc・スパンはプロセスごとで親に届かないため）。
+    各タスクの所要時間は親が process.branch として記録する
+    """
+    memory.set_enabled(False)
+    perf.set_enabled(False)
+
+
+def _get_executor(workers: int) -> ProcessPoolExecutor:
+    """
+    プロセス内で使い回すプール（リランごとにプロセスを起動し直さない）。
+    Streamlit サーバーはマルチスレッドなので fork せず、forkserver（無ければ spawn）で起動する
+    """
+    with _executors_lock:
+        executor = _executors.get(workers)
+        if executor is None:
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            executor = _executors[workers] = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context(method), initializer=_init_worker
+            )
+        return executor
+
+
+def _date_chunks(df_live, df_history, date_col: str, chunks: int) -> list[tuple]:
+    """
+    Live/History を日付の連続した範囲で chunks 個に分ける。
+    重複除外キーに日付が入っているので、チャンクごとに処理しても結果の行は変わらない（並びは日付チャンク順）
+    """
+    frames = (df_live, df_history)
+    if chunks <= 1 or any(not df.empty and date_col not in df.columns for df in frames):
+        return [(df_live, df_history)]
+    days = [pd.to_datetime(df[date_col]).dt.normalize() if not df.empty else pd.Series(dtype="datetime64[ns]") for df in frames]
+    uniques = pd.Index(pd.concat(days).dropna().unique()).sort_values()
+    if len(uniques) < 2:
+        return [(df_live, df_history)]
+    groups = np.array_split(np.arange(len(uniques)), min(chunks, len(uniques)))
+    bucket = pd.Series(np.repeat(np.arange(len(groups)), [len(g) for g in groups]), index=uniques)
+    ids = [d.map(bucket) for d in days]
+    return [(df_live[ids[0] == i], df_history[ids[1] == i]) for i in range(len(groups))]
+
+
+def _run_branch(branch: str, df_live, df_history, master_rules: dict):
+    """1媒体（1チャンク）分を処理して (結果, 所要秒) を返す（プロセスプールから呼べるようモジュール直下に置く）"""
+    func = BRANCHES[branch][0]
+    started = time.perf_counter()
+    result = func(df_live, df_history, master_rules=master_rules)
+    return result, time.perf_counter() - started
+
+
+def _process_parallel(data_dict, master_rules: dict, workers: int, chunks: int) -> list[pd.DataFrame]:
+    """
+    Meta / Beyond（chunks > 1 なら各媒体を日付チャンクに分割）をプロセスプールで並列に処理し、媒体ごとに結合する。
+    入力・結果はプロセス間で pickle されるので、その分の時間とメモリが上乗せされる。
+    各タスクの所要時間は process.branch スパンとして記録する
+    """
+    executor = _get_executor(workers)
+    futures = []
+    for branch, (_, live_key, history_key, date_col) in BRANCHES.items():
+        df_live = data_dict.get(live_key, pd.DataFrame())
+        df_history = data_dict.get(history_key, pd.DataFrame())
+        for chunk, (live, history) in enumerate(_date_chunks(df_live, df_history, date_col, chunks)):
+            futures.append((branch, chunk, executor.submit(_run_branch, branch, live, history, master_rules)))
+
+    results = {branch: [] for branch in BRANCHES}
+    for branch, chunk, future in futures:
+        df, seconds = future.result()
+        record("process.branch", seconds, branch=branch, chunk=chunk, rows=len(df))
+        results[branch].append(df)
+    return [frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True) for frames in results.values()]
+
+
+@timed("process")
+@traced_stage("process")
+def process_data(data_dict, parallel: str | None = None, chunks: int | None = None, workers: int | None = None):
     """
     データ処理メイン関数
+    parallel = "process" なら Meta と Beyond（chunks > 1 なら日付チャンクごと）を別プロセスで並列に処理する。
+    未指定なら設定 process_parallel / process_chunks / process_workers（既定は逐次・分割なし）。
+    処理は GIL を握る pandas / apply が中心なのでスレッドでは重ならず、スレッド並列は持たない。
+    プロセス並列も pickle の往復があるため、コアが2つ以上あり、データが大きいときだけ速くなり得る
+    （ワーカーが1つなら逐次で処理する）
     """
     master_rules = build_master_rules(data_dict.get("Master_Setting", pd.DataFrame()))
-
-    df_meta = process_meta_data(
-        data_dict.get('Meta_Live', pd.DataFrame()),
-        data_dict.get('Meta_History', pd.DataFrame()),
-        master_rules=master_rules
-    )
-    
-    df_beyond = process_beyond_data(
-        data_dict.get('Beyond_Live', pd.DataFrame()),
-        data_dict.get('Beyond_History', pd.DataFrame()),
-        master_rules=master_rules
-    )
+    parallel = parallel or get_setting("process_parallel", "off")
+    chunks = chunks or get_setting("process_chunks", 1, int)
+    workers = workers or get_setting("process_workers", min(4, os.cpu_count() or 1), int)
+
+    df_meta = df_beyond = None
+    if parallel == "process" and workers > 1:
+        try:
+            df_meta, df_beyond = _process_parallel(data_dict, master_rules, workers, chunks)
+        except BrokenProcessPool as e:
+            # ワーカーが落ちたプールは使えないので捨て、今回は逐次で処理する
+            with _executors_lock:
+                _executors.pop(workers, None)
+            print(f"[WARNING] プロセス並列の処理に失敗したため逐次で処理します: {e}")
+    if df_meta is None:
+        df_meta = process_meta_data(
+            data_dict.get('Meta_Live', pd.DataFrame()),
+            data_dict.get('Meta_History', pd.DataFrame()),
+            master_rules=master_rules
+        )
+        
+        df_beyond = process_beyond_data(
+            data_dict.get('Beyond_Live', pd.DataFrame()),
+            data_dict.get('Beyond_History', pd.DataFrame()),
+            master_rules=master_rules
+        )
     
     # 結合して返す (Mediaカラムで区別)
     # 共通カラム: Date, Campaign_Name, Media, Cost, Creative
@@ -507,5 +706,6 @@ def process_data(data_dict):
     # CV (Meta=Results, Beyond=CV)
     
     df_all = pd.concat([df_meta, df_beyond], ignore_index=True)
+    track_frame("process.concat", df_all)
     return df_all
 
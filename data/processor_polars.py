@@ -0,0 +1,284 @@
+"""
+process_data の Polars 版（任意依存・polars >= 1.0）。
+
+設定 processor_backend = "polars"（環境変数 DASHBOARD_PROCESSOR_BACKEND）で loader が使う。
+Meta / Beyond それぞれを1つの LazyFrame（案件判定・クリエイティブ抽出・数値化・重複除外・売上）にまとめ、
+collect_all で両方を一度に最適化・実行する。出力は data.processor.process_data と同じ列・同じ値の pandas DataFrame。
+- 日付の解釈は pandas（pd.to_datetime）に合わせるため入力時に pandas で行う
+- 案件判定とクリエイティブ抽出は既存の Python 関数（正規化・正規表現ルール）を値の種類ごとに1回だけ呼ぶ
+差分は benchmarks/parity.py --candidate polars で確認する。
+"""
+
+import pandas as pd
+
+from data.processor import (
+    BEYOND_PAGE_CANDIDATES,
+    BEYOND_VER_CANDIDATES,
+    _beyond_param_value,
+    _match_project,
+    build_master_rules,
+    extract_creative_from_text,
+)
+from utils.memory import traced_stage, track_frame
+from utils.perf import stage_timer, timed
+
+try:
+    import polars as pl
+except ImportError:  # 任意依存
+    pl = None
+
+
+def is_available() -> bool:
+    return pl is not None
+
+
+# --- 入力 ---
+def _to_lazy(df: pd.DataFrame, date_col: str):
+    """
+    pandas のシートを LazyFrame にする（日付は pandas と同じ解釈で日単位に丸める）。
+    型の混在した object 列は Polars が受け取れないため、欠損以外を文字列に揃える
+    """
+    out = df.copy()
+    out[date_col] = pd.to_datetime(out[date_col]).dt.normalize()
+    for col in out.columns:
+        if out[col].dtype == object:
+            out[col] = out[col].where(out[col].isna(), out[col].astype(str))
+    return pl.from_pandas(out).lazy().with_columns(pl.col(date_col).cast(pl.Datetime("ns")))
+
+
+def _combine(df_live: pd.DataFrame, df_history: pd.DataFrame, date_col: str):
+    """History は今日より前、Live は今日の行だけを残して縦に結合する（列は和集合）"""
+    today = pd.Timestamp.now().normalize().to_pydatetime()
+    parts = []
+    if not df_history.empty:
+        parts.append(_to_lazy(df_history, date_col).filter(pl.col(date_col) < today))
+    if not df_live.empty:
+        parts.append(_to_lazy(df_live, date_col).filter(pl.col(date_col) == today))
+    if not parts:
+        return None
+    return pl.concat(parts, how="diagonal_relaxed")
+
+
+# --- 式 ---
+def _as_text(col: str):
+    """astype(str) 相当（欠損は "nan"）"""
+    return pl.col(col).cast(pl.Utf8).fill_null("nan")
+
+
+def _map_text(expr, func):
+    """
+    文字列の式に Python 関数を適用する。バッチ内の値の種類ごとに1回だけ呼び、
+    結果は replace_strict で行に戻す（行ごとの map_elements より大幅に少ない呼び出し回数）
+    """
+    def apply(s):
+        values = s.drop_nulls().unique().to_list()
+        out = s.replace_strict(values, [func(v) for v in values], default=None, return_dtype=pl.Utf8)
+        fill = func(None)
+        if s.null_count() and fill is not None:
+            out = out.fill_null(fill)
+        return out
+
+    return expr.map_batches(apply, return_dtype=pl.Utf8)
+
+
+def _num(col: str, schema):
+    """pd.to_numeric(errors="coerce").fillna(0) 相当"""
+    dtype = schema[col]
+    expr = pl.col(col)
+    if dtype.is_integer():
+        return expr.fill_null(0)
+    if dtype == pl.Utf8:
+        expr = expr.str.strip_chars().cast(pl.Float64, strict=False)
+    elif not dtype.is_float():
+        expr = expr.cast(pl.Float64, strict=False)
+    return expr.fill_nan(None).fill_null(0)
+
+
+def _lookup(key: str, mapping: dict):
+    """列の値 -> mapping の値（無ければ null）"""
+    if not mapping:
+        return pl.lit(None, dtype=pl.Float64)
+    return pl.col(key).replace_strict(list(mapping), list(mapping.values()), default=None, return_dtype=pl.Float64)
+
+
+def _dedupe(lf, cols: list[str]):
+    """drop_duplicates(subset=cols, keep="last") 相当（残る行の順序も同じ）"""
+    if len(cols) < 2:
+        return lf
+    # キーごとの出現位置が最後の行だけ残す（キーの欠損同士は同一扱い）
+    return lf.filter(pl.int_range(pl.len()).over(cols) == pl.len().over(cols) - 1)
+
+
+# --- Meta ---
+def _meta_plan(df_live, df_history, master_rules: dict):
+    lf = _combine(df_live, df_history, "Day")
+    if lf is None:
+        return None
+
+    project_settings = master_rules.get("projects", {})
+    meta_tokens = master_rules.get("meta_tokens", [])
+
+    schema = lf.collect_schema()
+    campaign_col = next((c for c in ["Campaign Name", "Campaign", "campaign_name"] if c in schema), None)
+    if campaign_col is None:
+        lf = lf.with_columns(pl.lit("Unmapped").alias("Campaign_Name"))
+    else:
+        matched = _map_text(pl.col(campaign_col).cast(pl.Utf8), lambda x: _match_project(x, meta_tokens))
+        lf = lf.with_columns(matched.fill_null("Unmapped").alias("Campaign_Name"))
+
+    if "Ad Name" in schema:
+        lf = lf.with_columns(_as_text("Ad Name").alias("_ad_raw"))
+
+    rename_map = {"Day": "Date", "Ad Name": "Creative", "Amount Spent": "Cost", "Link Clicks": "Clicks"}
+    lf = lf.rename({k: v for k, v in rename_map.items() if k in schema})
+    schema = lf.collect_schema()
+
+    if "Creative" in schema:
+        lf = lf.with_columns(_map_text(_as_text("Creative"), extract_creative_from_text).alias("creative_value"))
+        lf = lf.with_columns(
+            pl.when(pl.col("creative_value").str.len_chars() > 0)
+            .then(pl.col("creative_value"))
+            .otherwise(pl.col("Creative").cast(pl.Utf8))
+            .alias("Creative")
+        )
+    if "Ad Name" not in schema and "Creative" in schema and "_ad_raw" not in schema:
+        lf = lf.with_columns(pl.col("Creative").alias("Ad Name"))
+    schema = lf.collect_schema()
+
+    # Meta CV列（案件別の Meta CV名 → Results → 0）。Unmapped 行は Results を優先
+    has_results = "Results" in schema
+    results = _num("Results", schema) if has_results else pl.lit(0.0)
+    branches = []
+    if project_settings:
+        if has_results:
+            branches.append((pl.col("Campaign_Name").is_in(["Unmapped", ""]) | pl.col("Campaign_Name").is_null(), results))
+        for project, conf in project_settings.items():
+            cv_col = str(conf.get("meta_cv_name", "")).strip()
+            value = _num(cv_col, schema) if cv_col and cv_col in schema else results
+            branches.append((pl.col("Campaign_Name") == project, value))
+        mcv = pl.lit(0.0)
+        for cond, value in reversed(branches):
+            mcv = pl.when(cond).then(value).otherwise(mcv)
+    else:
+        mcv = results
+    lf = lf.with_columns(mcv.cast(pl.Float64).alias("MCV"))
+    schema = lf.collect_schema()
+
+    lf = lf.with_columns([_num(c, schema) for c in ["Cost", "Impressions", "Clicks", "MCV"] if c in schema])
+    lf = lf.with_columns(pl.lit("Meta").alias("Media"), pl.col("MCV").alias("CV"))
+
+    dedupe_cols = ["Date", "Account Name", "Campaign Name", "Ad Set Name"]
+    dedupe_cols.append(next((c for c in ["_ad_raw", "Ad Name", "Creative"] if c in schema), "_ad_raw"))
+    lf = _dedupe(lf, [c for c in dedupe_cols if c in schema])
+
+    # 予算/IH の案件だけ Meta Cost から手数料売上（参考値）
+    fees = {
+        project: float(conf.get("fee_rate", 0) or 0)
+        for project, conf in project_settings.items()
+        if str(conf.get("type", "")).strip() in ("予算", "IH")
+    }
+    fee = _lookup("Campaign_Name", fees)
+    cost = pl.col("Cost") if "Cost" in schema else pl.lit(0.0)
+    revenue = pl.when(fee.is_not_null()).then(cost * fee).otherwise(0.0)
+    return lf.with_columns(revenue.alias("Revenue"), revenue.alias("Gross_Profit"))
+
+
+# --- Beyond ---
+def _beyond_plan(df_live, df_history, master_rules: dict):
+    if not df_live.empty and "date_jst" not in df_live.columns:
+        print(f"[WARNING] Beyond_Live: 必須カラムがありません。存在するカラム: {list(df_live.columns)}")
+        df_live = pd.DataFrame()
+    if not df_history.empty and "date_jst" not in df_history.columns:
+        print(f"[WARNING] Beyond_History: 必須カラムがありません。存在するカラム: {list(df_history.columns)}")
+        df_history = pd.DataFrame()
+
+    lf = _combine(df_live, df_history, "date_jst")
+    if lf is None:
+        return None
+
+    schema = lf.collect_schema()
+    for col in ["date_jst", "parameter"]:
+        if col not in schema:
+            print(f"[ERROR] Beyond: 必須カラム '{col}' が見つかりません")
+            return None
+
+    project_settings = master_rules.get("projects", {})
+    beyond_tokens = master_rules.get("beyond_tokens", [])
+
+    page_col = next((c for c in BEYOND_PAGE_CANDIDATES if c in schema), None)
+    ver_col = next((c for c in BEYOND_VER_CANDIDATES if c in schema), None)
+    if page_col is None:
+        print("[WARNING] Beyond: PageName列が見つかりません（案件判定が Unmapped になります）")
+        lf = lf.with_columns(pl.lit("").alias("_page_for_match"))
+    else:
+        lf = lf.with_columns(pl.col(page_col).alias("_page_for_match"))
+
+    matched = _map_text(pl.col("_page_for_match").cast(pl.Utf8), lambda x: _match_project(x, beyond_tokens))
+    lf = lf.with_columns(matched.fill_null("Unmapped").alias("Campaign_Name"))
+
+    lf = _dedupe(lf, [c for c in ["date_jst", page_col, ver_col, "parameter"] if c and c in schema])
+
+    rename_map = {
+        "date_jst": "Date",
+        "parameter": "Parameter",
+        "cost": "Cost",
+        "pv": "PV",
+        "click": "Clicks",
+        "cv": "CV",
+        "fv_exit": "FV_Exit",
+        "sv_exit": "SV_Exit",
+    }
+    lf = lf.rename({k: v for k, v in rename_map.items() if k in schema})
+    schema = lf.collect_schema()
+
+    creative = _as_text(page_col) if page_col and page_col in schema else pl.lit("")
+    creative_value = _map_text(
+        _as_text("Parameter"),
+        lambda p: extract_creative_from_text(_beyond_param_value(p)) or extract_creative_from_text(p),
+    )
+    lf = lf.with_columns(creative.alias("Creative"), creative_value.alias("creative_value"))
+
+    lf = lf.with_columns([_num(c, schema) for c in ["Cost", "PV", "Clicks", "CV", "FV_Exit", "SV_Exit"] if c in schema])
+    lf = lf.with_columns(pl.lit("Beyond").alias("Media"))
+
+    # 成果: CV × 成果単価（粗利 = 売上 - Cost）/ それ以外: Cost × 手数料率（粗利 = 売上）/ 未登録: 0
+    unit_prices, fees = {}, {}
+    for project, conf in project_settings.items():
+        if str(conf.get("type", "")).strip() == "成果":
+            unit_prices[project] = float(conf.get("unit_price", 0) or 0)
+        else:
+            fees[project] = float(conf.get("fee_rate", 0) or 0)
+    unit_price = _lookup("Campaign_Name", unit_prices)
+    fee = _lookup("Campaign_Name", fees)
+    cost = pl.col("Cost") if "Cost" in schema else pl.lit(0.0)
+    cv = pl.col("CV") if "CV" in schema else pl.lit(0.0)
+    revenue = pl.when(unit_price.is_not_null()).then(cv * unit_price).when(fee.is_not_null()).then(cost * fee).otherwise(0.0)
+    profit = pl.when(unit_price.is_not_null()).then(revenue - cost).otherwise(revenue)
+    return lf.with_columns(revenue.alias("Revenue"), profit.alias("Gross_Profit"))
+
+
+@timed("process.polars")
+@traced_stage("process.polars")
+def process_data(data_dict):
+    """
+    data.processor.process_data の Polars 版（同じ入力・同じ出力スキーマ）
+    """
+    timer = stage_timer("polars")
+    master_rules = build_master_rules(data_dict.get("Master_Setting", pd.DataFrame()))
+    plans = [
+        _meta_plan(data_dict.get("Meta_Live", pd.DataFrame()), data_dict.get("Meta_History", pd.DataFrame()), master_rules),
+        _beyond_plan(data_dict.get("Beyond_Live", pd.DataFrame()), data_dict.get("Beyond_History", pd.DataFrame()), master_rules),
+    ]
+    plans = [p for p in plans if p is not None]
+    timer.lap("plan")
+
+    # Meta / Beyond のクエリをまとめて最適化・並列実行
+    frames = [f for f in pl.collect_all(plans) if f.height > 0] if plans else []
+    timer.lap("collect", rows=sum(f.height for f in frames))
+    if not frames:
+        return pd.DataFrame()
+
+    df_all = pl.concat(frames, how="diagonal_relaxed").to_pandas()
+    timer.lap("to_pandas")
+    track_frame("polars.result", df_all)
+    return df_all
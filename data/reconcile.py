@@ -0,0 +1,296 @@
+"""
+シート（raw）とダッシュボード（process_data の結果）の突き合わせ。
+
+期間 × 媒体 × 案件 × 指標 の差分を、各側1回の groupby（日次×媒体×案件）で求め、
+期間の集計は小さな日次テーブル上で行う。結果は縦持ちの DataFrame で、CSV/JSON に書き出せる。
+
+raw 側は processor と同じ規則（今日=Live/過去=History、重複除外キー、Master_Setting による案件判定・
+Meta CV列選択・売上計算）で期待値を作るので、差分が出れば processor 側の変化か入力の異常。
+
+使い方（スケジューラ等から）:
+    python -m data.reconcile --snapshot snapshots/latest --csv reconcile.csv --json reconcile.json
+    python -m data.reconcile --save-snapshot snapshots/2024-06-01   # シートを取得して保存してから突き合わせ
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from data.processor import (
+    BEYOND_PAGE_CANDIDATES,
+    BEYOND_VER_CANDIDATES,
+    _match_project,
+    build_master_rules,
+    process_data,
+)
+
+SHEETS = ["Meta_Live", "Meta_History", "Beyond_Live", "Beyond_History", "Master_Setting"]
+
+# raw 列 -> processed 列
+META_METRICS = {"Amount Spent": "Cost", "Impressions": "Impressions", "Link Clicks": "Clicks"}
+BEYOND_METRICS = {"cost": "Cost", "pv": "PV", "click": "Clicks", "cv": "CV"}
+
+KEYS = ["Media", "Campaign_Name"]
+
+# 差分の許容（件数・金額とも 0.5 未満は一致扱い）
+ABS_TOLERANCE = 0.5
+
+
+def default_periods(today: pd.Timestamp | None = None) -> list[tuple[str, str | None, str | None]]:
+    """(ラベル, 開始, 終了)。None は無制限"""
+    today = (today or pd.Timestamp.now()).normalize()
+    fmt = lambda d: d.strftime("%Y-%m-%d")
+    return [
+        ("当日", fmt(today), fmt(today)),
+        ("昨日", fmt(today - pd.Timedelta(days=1)), fmt(today - pd.Timedelta(days=1))),
+        ("直近7日", fmt(today - pd.Timedelta(days=6)), fmt(today)),
+        ("当月", fmt(today.replace(day=1)), fmt(today)),
+        ("全期間", None, None),
+    ]
+
+
+def _num(df: pd.DataFrame, col: str) -> pd.Series:
+    if col not in df.columns:
+        return pd.Series(0.0, index=df.index)
+    return pd.to_numeric(df[col], errors="coerce").fillna(0)
+
+
+def _combine(live: pd.DataFrame, history: pd.DataFrame, date_col: str, today: str) -> pd.DataFrame:
+    """processor と同じ分担: 今日=Live / 過去=History"""
+    parts = []
+    for df, keep in ((history, lambda d: d < today), (live, lambda d: d == today)):
+        if df is None or df.empty or date_col not in df.columns:
+            continue
+        day = pd.to_datetime(df[date_col], errors="coerce").dt.strftime("%Y-%m-%d")
+        part = df[keep(day).fillna(False)].copy()
+        part[date_col] = day[part.index]
+        parts.append(part)
+    return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
+
+
+def _map_projects(values: pd.Series, tokens: list) -> pd.Series:
+    """案件判定（ユニーク値ごとに1回だけ _match_project）"""
+    uniques = pd.unique(values.astype(object))
+    mapping = {v: (_match_project(v, tokens) or "Unmapped") for v in uniques}
+    return values.astype(object).map(mapping)
+
+
+def _meta_expected(raw: dict, rules: dict, today: str, dedupe: bool) -> pd.DataFrame:
+    df = _combine(raw.get("Meta_Live"), raw.get("Meta_History"), "Day", today)
+    if df.empty:
+        return pd.DataFrame()
+    if dedupe:
+        cols = [c for c in ["Day", "Account Name", "Campaign Name", "Ad Set Name", "Ad Name"] if c in df.columns]
+        if len(cols) >= 2:
+            df = df.drop_duplicates(subset=cols, keep="last")
+    campaign_col = next((c for c in ["Campaign Name", "Campaign", "campaign_name"] if c in df.columns), None)
+    project = _map_projects(df[campaign_col], rules["meta_tokens"]) if campaign_col else pd.Series("Unmapped", index=df.index)
+
+    out = pd.DataFrame({"Date": df["Day"].to_numpy(), "Media": "Meta", "Campaign_Name": project.to_numpy()})
+    for raw_col, col in META_METRICS.items():
+        out[col] = _num(df, raw_col).to_numpy()
+
+    # MCV: 案件の Meta CV名 列があればそれ、無ければ Results（マスター外は Results）
+    mcv = _num(df, "Results").to_numpy().copy()
+    cost = out["Cost"].to_numpy()
+    revenue = np.zeros(len(df))
+    for name, conf in rules["projects"].items():
+        mask = (project == name).to_numpy()
+        if not mask.any():
+            continue
+        cv_col = str(conf.get("meta_cv_name", "")).strip()
+        if cv_col and cv_col in df.columns:
+            mcv[mask] = _num(df, cv_col).to_numpy()[mask]
+        if str(conf.get("type", "")).strip() in ("予算", "IH"):
+            revenue[mask] = cost[mask] * float(conf.get("fee_rate", 0) or 0)
+    out["MCV"] = mcv
+    out["CV"] = mcv
+    out["Revenue"] = revenue
+    return out
+
+
+def _beyond_expected(raw: dict, rules: dict, today: str, dedupe: bool) -> pd.DataFrame:
+    df = _combine(raw.get("Beyond_Live"), raw.get("Beyond_History"), "date_jst", today)
+    if df.empty or "parameter" not in df.columns:
+        return pd.DataFrame()
+    page_col = next((c for c in BEYOND_PAGE_CANDIDATES if c in df.columns), None)
+    ver_col = next((c for c in BEYOND_VER_CANDIDATES if c in df.columns), None)
+    if dedupe:
+        cols = [c for c in ["date_jst", page_col, ver_col, "parameter"] if c and c in df.columns]
+        if len(cols) >= 2:
+            df = df.drop_duplicates(subset=cols, keep="last")
+    project = _map_projects(df[page_col], rules["beyond_tokens"]) if page_col else pd.Series("Unmapped", index=df.index)
+
+    out = pd.DataFrame({"Date": df["date_jst"].to_numpy(), "Media": "Beyond", "Campaign_Name": project.to_numpy()})
+    for raw_col, col in BEYOND_METRICS.items():
+        out[col] = _num(df, raw_col).to_numpy()
+
+    # 売上: 成果 = CV × 単価 / それ以外 = Cost × 手数料率（マスター外は 0）
+    revenue = np.zeros(len(df))
+    cost, cv = out["Cost"].to_numpy(), out["CV"].to_numpy()
+    for name, conf in rules["projects"].items():
+        mask = (project == name).to_numpy()
+        if not mask.any():
+            continue
+        if str(conf.get("type", "")).strip() == "成果":
+            revenue[mask] = cv[mask] * float(conf.get("unit_price", 0) or 0)
+        else:
+            revenue[mask] = cost[mask] * float(conf.get("fee_rate", 0) or 0)
+    out["Revenue"] = revenue
+    return out
+
+
+def _daily(df: pd.DataFrame) -> pd.DataFrame:
+    """日次×媒体×案件の合計（Rows = 行数）"""
+    if df.empty:
+        return pd.DataFrame(columns=["Date"] + KEYS)
+    metrics = [c for c in df.columns if c not in ["Date"] + KEYS]
+    frame = df[["Date"] + KEYS + metrics].copy()
+    frame["Rows"] = 1
+    return frame.groupby(["Date"] + KEYS, sort=False).sum().reset_index()
+
+
+def _processed_daily(processed: pd.DataFrame) -> pd.DataFrame:
+    if processed.empty:
+        return pd.DataFrame(columns=["Date"] + KEYS)
+    metrics = [c for c in ["Cost", "Impressions", "Clicks", "MCV", "CV", "PV", "Revenue"] if c in processed.columns]
+    frame = processed[KEYS].copy()
+    frame.insert(0, "Date", pd.to_datetime(processed["Date"]).dt.strftime("%Y-%m-%d"))
+    for c in metrics:
+        frame[c] = pd.to_numeric(processed[c], errors="coerce").fillna(0)
+    frame["Rows"] = 1
+    return frame.groupby(["Date"] + KEYS, sort=False).sum().reset_index()
+
+
+def _by_period(daily: pd.DataFrame, periods, value_name: str) -> pd.DataFrame:
+    """日次テーブルを期間ごとに合計し、縦持ち（period, Media, Campaign_Name, metric, value）にする"""
+    frames = []
+    for label, start, end in periods:
+        mask = pd.Series(True, index=daily.index)
+        if start is not None:
+            mask &= daily["Date"] >= start
+        if end is not None:
+            mask &= daily["Date"] <= end
+        part = daily[mask].drop(columns="Date").groupby(KEYS).sum()
+        if part.empty or part.shape[1] == 0:
+            continue
+        part = part.stack().rename(value_name).reset_index().rename(columns={"level_2": "metric"})
+        part.insert(0, "period", label)
+        frames.append(part)
+    if not frames:
+        return pd.DataFrame(columns=["period"] + KEYS + ["metric", value_name])
+    return pd.concat(frames, ignore_index=True)
+
+
+def reconcile(raw: dict, processed: pd.DataFrame | None = None, periods=None, today: pd.Timestamp | None = None,
+              tolerance: float = ABS_TOLERANCE) -> pd.DataFrame:
+    """
+    raw（シート辞書）と processed（未指定なら process_data(raw)）の差分表。
+    列: period, start, end, Media, Campaign_Name, metric, raw, raw_dedup, processed, delta, dup_impact, ok
+      delta = processed - raw_dedup（0 が期待値） / dup_impact = raw - raw_dedup（重複除外で落ちた分）
+    """
+    periods = periods or default_periods(today)
+    # Live/History の分担は processor と同じく実行日で判定する（today は期間の基準日だけに使う）
+    today_str = pd.Timestamp.now().strftime("%Y-%m-%d")
+    rules = build_master_rules(raw.get("Master_Setting", pd.DataFrame()))
+    if processed is None:
+        processed = process_data({k: v.copy() for k, v in raw.items()})
+
+    sides = {}
+    for name, dedupe in (("raw", False), ("raw_dedup", True)):
+        expected = pd.concat(
+            [_meta_expected(raw, rules, today_str, dedupe), _beyond_expected(raw, rules, today_str, dedupe)],
+            ignore_index=True,
+        )
+        sides[name] = _by_period(_daily(expected), periods, name)
+    sides["processed"] = _by_period(_processed_daily(processed), periods, "processed")
+
+    on = ["period"] + KEYS + ["metric"]
+    report = sides["raw"].merge(sides["raw_dedup"], on=on, how="outer").merge(sides["processed"], on=on, how="outer")
+    # 片側にしか無い指標（Meta の PV 等）は比較対象外
+    report = report.dropna(subset=["raw_dedup", "processed"], how="any").copy()
+    report[["raw", "raw_dedup", "processed"]] = report[["raw", "raw_dedup", "processed"]].fillna(0.0)
+    report["delta"] = report["processed"] - report["raw_dedup"]
+    report["dup_impact"] = report["raw"] - report["raw_dedup"]
+    report["ok"] = report["delta"].abs() < tolerance
+
+    bounds = {label: (start or "", end or "") for label, start, end in periods}
+    report.insert(1, "start", report["period"].map(lambda p: bounds[p][0]))
+    report.insert(2, "end", report["period"].map(lambda p: bounds[p][1]))
+    order = {label: i for i, (label, _, _) in enumerate(periods)}
+    report["_order"] = report["period"].map(order)
+    report = report.sort_values(["_order", "Media", "Campaign_Name", "metric"]).drop(columns="_order")
+    return report.reset_index(drop=True)
+
+
+def summarize(report: pd.DataFrame) -> dict:
+    """JSON 用の要約（期間×媒体ごとの不一致件数と、差分の大きい行）"""
+    bad = report[~report["ok"]]
+    return {
+        "rows": int(len(report)),
+        "mismatches": int(len(bad)),
+        "by_period_media": (
+            report.groupby(["period", "Media"], sort=False)["ok"].agg(checked="size", mismatched=lambda s: int((~s).sum()))
+            .reset_index().to_dict(orient="records")
+        ),
+        "top_mismatches": bad.reindex(bad["delta"].abs().sort_values(ascending=False).index).head(20).to_dict(orient="records"),
+    }
+
+
+def load_snapshot(snapshot_dir: str | Path) -> dict[str, pd.DataFrame]:
+    """<dir>/<シート名>.csv（DASHBOARD_DATA_DIR と同じ形式）を読む"""
+    snapshot_dir = Path(snapshot_dir)
+    return {
+        name: pd.read_csv(snapshot_dir / f"{name}.csv") if (snapshot_dir / f"{name}.csv").exists() else pd.DataFrame()
+        for name in SHEETS
+    }
+
+
+def save_snapshot(raw: dict, snapshot_dir: str | Path) -> None:
+    snapshot_dir = Path(snapshot_dir)
+    snapshot_dir.mkdir(parents=True, exist_ok=True)
+    for name, df in raw.items():
+        df.to_csv(snapshot_dir / f"{name}.csv", index=False)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="シート(raw)とダッシュボード(processed)の突き合わせ")
+    parser.add_argument("--snapshot", default="", help="ローカルスナップショット（未指定なら Google Sheets から取得）")
+    parser.add_argument("--save-snapshot", default="", help="取得したシートを保存するディレクトリ")
+    parser.add_argument("--today", default="", help="期間の基準日（YYYY-MM-DD。既定は今日）")
+    parser.add_argument("--tolerance", type=float, default=ABS_TOLERANCE)
+    parser.add_argument("--csv", default="", help="差分表 CSV の出力先")
+    parser.add_argument("--json", default="", help="要約 JSON の出力先")
+    args = parser.parse_args()
+
+    if args.snapshot:
+        raw = load_snapshot(args.snapshot)
+    else:
+        from data.loader import load_data_from_sheets
+        raw = load_data_from_sheets()
+    if args.save_snapshot:
+        save_snapshot(raw, args.save_snapshot)
+
+    today = pd.Timestamp(args.today) if args.today else None
+    report = reconcile(raw, today=today, tolerance=args.tolerance)
+    summary = summarize(report)
+
+    if args.csv:
+        report.to_csv(args.csv, index=False, encoding="utf-8-sig")
+    if args.json:
+        Path(args.json).write_text(json.dumps(summary, ensure_ascii=False, indent=2, default=str), encoding="utf-8")
+
+    print(f"checked={summary['rows']:,} mismatches={summary['mismatches']:,}")
+    for row in summary["by_period_media"]:
+        print(f"  {row['period']:<6} {row['Media']:<7} {row['mismatched']:>5} / {row['checked']:>6}")
+    if summary["mismatches"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
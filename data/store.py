@@ -0,0 +1,174 @@
+"""
+処理済みデータ（process_data の結果）の DuckDB ストア（任意依存）。
+
+設定 data_store = "duckdb" で有効。duckdb が入っていなければ pandas のまま動く。
+- フィルタ・選択肢・KPI・期間テーブル・グラフ用の集計は SQL で DuckDB 側に押し下げ、
+  セッションは 日付×媒体×案件 の集計（と診断を開いたときの Unmapped 行）だけを持つ
+- フィルタ条件は data/filters.py で pandas 側と揃える（benchmarks/store_parity.py で一致を確認）
+- duckdb_dir を指定するとデータバージョンごとの DB ファイル（facts_<version>.duckdb）を作り、
+  完成後にアトミックに置き換えてから read-only で開く。同じディレクトリを見る複数プロセスで共有できる
+"""
+
+import os
+import threading
+from pathlib import Path
+
+import pandas as pd
+
+try:
+    import duckdb
+except ImportError:  # 任意依存
+    duckdb = None
+
+TABLE = "facts"
+
+# 古いバージョンの DB ファイルはこの個数だけ残す
+KEEP_VERSIONS = 3
+
+
+def is_available() -> bool:
+    return duckdb is not None
+
+
+def _prepare(df: pd.DataFrame) -> pd.DataFrame:
+    """object 列は文字列に揃える（型の混在した列を DuckDB が推論できないため）。欠損は NULL のまま"""
+    out = df.copy()
+    for col in out.columns:
+        if out[col].dtype == object:
+            out[col] = out[col].where(out[col].isna(), out[col].astype(str))
+    return out
+
+
+def _write_db(con, df: pd.DataFrame) -> None:
+    con.register("processed_df", _prepare(df))
+    # 行順は processed のまま（選択肢の並び = 出現順を pandas と揃えるため）
+    con.execute(f"CREATE TABLE {TABLE} AS SELECT * FROM processed_df")
+    con.unregister("processed_df")
+
+
+class DuckDBStore:
+    """
+    処理済みデータを1テーブル（facts）に持つ読み取り専用ストア。
+    スレッド（= Streamlit のセッション）ごとに cursor を分けて同時に問い合わせる。
+    """
+
+    def __init__(self, con, version: str, path: str | None = None):
+        self._root = con
+        self._local = threading.local()
+        self.version = version
+        self.path = path
+        self.columns = [r[0] for r in con.execute(f"DESCRIBE {TABLE}").fetchall()]
+
+    @classmethod
+    def build(cls, df: pd.DataFrame, version: str, directory: str | None = None) -> "DuckDBStore":
+        """
+        df からストアを作る。directory 指定時はバージョンごとのファイルを作って（既にあれば再利用して）
+        read-only で開く。未指定ならプロセス内メモリ。
+        """
+        if directory is None:
+            con = duckdb.connect()
+            _write_db(con, df)
+            return cls(con, version)
+
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"facts_{version}.duckdb"
+        if not path.exists():
+            tmp = directory / f".facts_{version}.{os.getpid()}.tmp"
+            con = duckdb.connect(str(tmp))
+            try:
+                _write_db(con, df)
+            finally:
+                con.close()
+            os.replace(tmp, path)
+            _cleanup(directory, keep=path)
+        return cls(duckdb.connect(str(path), read_only=True), version, str(path))
+
+    @classmethod
+    def open_existing(cls, version: str, directory: str) -> "DuckDBStore | None":
+        """他プロセスが作成済みのファイルがあれば開く（無ければ None）"""
+        path = Path(directory) / f"facts_{version}.duckdb"
+        if not path.exists():
+            return None
+        return cls(duckdb.connect(str(path), read_only=True), version, str(path))
+
+    def _cursor(self):
+        cur = getattr(self._local, "cursor", None)
+        if cur is None:
+            cur = self._local.cursor = self._root.cursor()
+        return cur
+
+    def query(self, sql: str, params: list | None = None) -> pd.DataFrame:
+        return self._cursor().execute(sql, params or []).df()
+
+    # --- 条件 ---
+    @staticmethod
+    def where(media=None, campaign="All", article="All", creative="All", start=None, end=None) -> tuple[str, list]:
+        """app.py のフィルタと同じ条件を WHERE 句にする（"All" / None は条件なし）"""
+        clauses, params = [], []
+        if media is not None:
+            clauses.append('"Media" = ?')
+            params.append(media)
+        if campaign != "All":
+            clauses.append('"Campaign_Name" = ?')
+            params.append(campaign)
+        if article != "All":
+            clauses.append('"Creative" = ?')
+            params.append(article)
+        if creative != "All":
+            clauses.append('"Creative" = ?')
+            params.append(creative)
+        if start is not None:
+            clauses.append('CAST("Date" AS DATE) >= ?')
+            params.append(pd.Timestamp(start).date())
+        if end is not None:
+            clauses.append('CAST("Date" AS DATE) <= ?')
+            params.append(pd.Timestamp(end).date())
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def memory_bytes(self) -> int:
+        """DuckDB がこのプロセスで使っているメモリ（インメモリテーブル・バッファ）。取れなければ 0"""
+        try:
+            return int(self._cursor().execute("SELECT COALESCE(SUM(memory_usage_bytes), 0) FROM duckdb_memory()").fetchone()[0])
+        except Exception:
+            return 0
+
+    # --- 問い合わせ ---
+    def count(self, **filters) -> int:
+        where, params = self.where(**filters)
+        return int(self._cursor().execute(f"SELECT COUNT(*) FROM {TABLE}{where}", params).fetchone()[0])
+
+    def distinct(self, column: str, **filters) -> list:
+        """出現順（挿入順）の重複なし値。NULL は除く"""
+        where, params = self.where(**filters)
+        null_clause = f'"{column}" IS NOT NULL'
+        where = f"{where} AND {null_clause}" if where else f" WHERE {null_clause}"
+        sql = f'SELECT "{column}" FROM {TABLE}{where} GROUP BY 1 ORDER BY MIN(rowid)'
+        return [r[0] for r in self._cursor().execute(sql, params).fetchall()]
+
+    def rows(self, **filters) -> pd.DataFrame:
+        """条件に合う行（挿入順）"""
+        where, params = self.where(**filters)
+        return self.query(f"SELECT * FROM {TABLE}{where} ORDER BY rowid", params)
+
+    def aggregate(self, by: list[str], metrics: list[str], **filters) -> pd.DataFrame:
+        """by ごとの指標合計と行数（Rows）。存在しない指標列は 0"""
+        where, params = self.where(**filters)
+        keys = ", ".join(f'"{c}"' for c in by)
+        sums = ", ".join(
+            [f'COALESCE(SUM("{m}"), 0) AS "{m}"' if m in self.columns else f'0.0 AS "{m}"' for m in metrics]
+            + ['COUNT(*) AS "Rows"']
+        )
+        return self.query(f"SELECT {keys}, {sums} FROM {TABLE}{where} GROUP BY {keys} ORDER BY {keys}", params)
+
+
+def _cleanup(directory: Path, keep: Path) -> None:
+    """新しい方から KEEP_VERSIONS 個を残して古い DB ファイルを消す（使用中で消せなければ次回）"""
+    files = sorted(directory.glob("facts_*.duckdb"), key=lambda p: p.stat().st_mtime, reverse=True)
+    for old in files[KEEP_VERSIONS:]:
+        if old == keep:
+            continue
+        try:
+            old.unlink()
+        except OSError:
+            pass
@@ -0,0 +1,91 @@
+import difflib
+from collections import Counter
+from functools import lru_cache
+
+import pandas as pd
+
+from data.processor import _normalize_text
+
+
+def _char_ngrams(s: str, n: int = 3) -> set[str]:
+    """前後に境界記号を付けた文字 n-gram（日本語は1文字単位で扱う）"""
+    padded = f"\x02{s}\x03"
+    if len(padded) <= n:
+        return {padded}
+    return {padded[i : i + n] for i in range(len(padded) - n + 1)}
+
+
+class TokenNgramIndex:
+    """
+    Master token（Meta名/Beyond名の正規化済み文字列）に対する文字 trigram 転置インデックス。
+    Unmapped 文字列の候補探索を「共有 trigram を持つ token」だけに絞り、
+    最終的な並びは difflib と同じ類似度（SequenceMatcher.ratio）で決める。
+    同じ文字列への問い合わせ結果はメモ化する。
+    """
+
+    MEMO_LIMIT = 10000
+
+    def __init__(self, tokens: list[tuple[str, str]], n: int = 3, max_candidates: int = 50):
+        self.n = n
+        self.max_candidates = max_candidates
+        # token -> project の対応（同一tokenが複数案件に紐づくことは想定しない）
+        self.token_to_project = {t: p for t, p in tokens if t}
+        self.tokens = list(self.token_to_project)
+        self.postings: dict[str, list[int]] = {}
+        for i, token in enumerate(self.tokens):
+            for gram in _char_ngrams(token, n):
+                self.postings.setdefault(gram, []).append(i)
+        self._memo: dict[tuple, str] = {}
+
+    def candidates(self, s: str) -> list[str]:
+        """trigram を共有する token を共有数の多い順に最大 max_candidates 件"""
+        overlap = Counter()
+        for gram in _char_ngrams(s, self.n):
+            for i in self.postings.get(gram, ()):
+                overlap[i] += 1
+        return [self.tokens[i] for i, _ in overlap.most_common(self.max_candidates)]
+
+    def suggest(self, text: object, limit: int = 5, cutoff: float = 0.15) -> str:
+        """
+        マッチしなかった文字列に対して、近い Master token を推定表示用の文字列で返す。
+        例: "SAC_成果(sac_成果) / SAC_予算(sac_予算)"
+        """
+        s = _normalize_text(text)
+        if not s or not self.tokens:
+            return ""
+        memo_key = (s, limit, cutoff)
+        if memo_key in self._memo:
+            return self._memo[memo_key]
+
+        matcher = difflib.SequenceMatcher()
+        matcher.set_seq2(s)
+        scored = []
+        for token in self.candidates(s):
+            matcher.set_seq1(token)
+            if matcher.real_quick_ratio() >= cutoff and matcher.quick_ratio() >= cutoff:
+                ratio = matcher.ratio()
+                if ratio >= cutoff:
+                    scored.append((ratio, token))
+        scored.sort(key=lambda x: x[0], reverse=True)
+        result = " / ".join(f"{self.token_to_project.get(t, '')}({t})" for _, t in scored[:limit])
+
+        if len(self._memo) >= self.MEMO_LIMIT:
+            self._memo.clear()
+        self._memo[memo_key] = result
+        return result
+
+    def suggest_series(self, values: pd.Series, limit: int = 5) -> pd.Series:
+        """列の重複値は1回だけ計算して map で展開する"""
+        uniques = pd.unique(values.dropna())
+        suggestions = {v: self.suggest(v, limit=limit) for v in uniques}
+        return values.map(suggestions).fillna("")
+
+
+@lru_cache(maxsize=8)
+def _build_index(tokens: tuple[tuple[str, str], ...]) -> TokenNgramIndex:
+    return TokenNgramIndex(list(tokens))
+
+
+def get_token_index(tokens: list[tuple[str, str]]) -> TokenNgramIndex:
+    """Master token 一覧ごとにインデックスを1回だけ構築して使い回す"""
+    return _build_index(tuple(tokens))
@@ -0,0 +1,228 @@
+"""
+パイプラインのメモリ計測。
+
+設定 perf_memory（環境変数 DASHBOARD_PERF_MEMORY）が有効なときだけ、
+- track_frame(): 中間 DataFrame の deep memory_usage を記録
+- traced(): ステージ中の tracemalloc ピーク（入れ子のステージは子のピークも親に反映）。
+  tracemalloc はプロセス全体で1つなので、計測するステージはロックで1スレッドずつ実行し
+  （別セッションの計測ステージは待つ）、最外のステージを抜けたらトレースを止める。
+  ステージ中に他のスレッド（計測していない処理）が割り当てた分はピークに混ざる
+を行う。しきい値（memory_warn_frame_mb / memory_warn_stage_mb）を超えたら [WARNING] を出す。
+無効時はどちらもフラグ確認のみ。
+"""
+
+import threading
+import time
+import tracemalloc
+from contextlib import nullcontext
+from functools import wraps
+
+import pandas as pd
+
+from utils.settings import get_setting
+
+MB = 1024 * 1024
+
+_NULL = nullcontext()
+
+_enabled = None
+_frame_warn_bytes = 0
+_stage_warn_bytes = 0
+
+_lock = threading.Lock()
+_frames: dict[str, dict] = {}
+_stages: dict[str, dict] = {}
+_local = threading.local()
+# 計測中のステージ（最外）を持つスレッドは1つだけ
+_trace_lock = threading.Lock()
+
+
+def is_enabled() -> bool:
+    """メモリ計測が有効か（設定はプロセス内で1回だけ読む）"""
+    global _enabled, _frame_warn_bytes, _stage_warn_bytes
+    if _enabled is None:
+        _frame_warn_bytes = int(get_setting("memory_warn_frame_mb", 200, float) * MB)
+        _stage_warn_bytes = int(get_setting("memory_warn_stage_mb", 500, float) * MB)
+        _enabled = bool(get_setting("perf_memory", False, bool))
+    return _enabled
+
+
+def set_enabled(enabled: bool) -> None:
+    """メモリ計測の有効/無効を上書きする（ベンチマーク・スクリプト用）"""
+    global _enabled
+    is_enabled()
+    _enabled = bool(enabled)
+
+
+def frame_bytes(df) -> int:
+    """DataFrame / Series の deep memory_usage（object 列の中身も含む）"""
+    if df is None:
+        return 0
+    usage = df.memory_usage(deep=True)
+    return int(usage.sum()) if isinstance(usage, pd.Series) else int(usage)
+
+
+def track_frame(name: str, df) -> None:
+    """中間フレームのサイズを記録する（同名は最新で上書き）"""
+    if not is_enabled() or df is None:
+        return
+    size = frame_bytes(df)
+    with _lock:
+        _frames[name] = {
+            "name": name,
+            "rows": len(df),
+            "cols": df.shape[1] if df.ndim > 1 else 1,
+            "bytes": size,
+            "ts": round(time.time(), 3),
+        }
+    if _frame_warn_bytes and size > _frame_warn_bytes:
+        print(f"[WARNING] memory: {name} が {size / MB:,.1f}MB（しきい値 {_frame_warn_bytes / MB:,.0f}MB）")
+
+
+class _Traced:
+    __slots__ = ("name", "start_current", "child_peak", "owns_tracing")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.owns_tracing = False
+
+    def __enter__(self):
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        if not stack:
+            # tracemalloc（とそのピーク）はプロセスで1つなので、計測するステージは同時に1スレッドだけにし、
+            # 最外のステージの間だけトレースする（既に誰かがトレース中ならそのまま使い、止めない）
+            _trace_lock.acquire()
+            self.owns_tracing = not tracemalloc.is_tracing()
+            if self.owns_tracing:
+                tracemalloc.start()
+        self.start_current = tracemalloc.get_traced_memory()[0]
+        self.child_peak = 0
+        tracemalloc.reset_peak()
+        stack.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        current, peak = tracemalloc.get_traced_memory()
+        stack = _local.stack
+        stack.pop()
+        if not stack:
+            if self.owns_tracing:
+                tracemalloc.stop()
+            _trace_lock.release()
+        # reset_peak は親のピークも消すため、子で観測したピークを親へ引き継ぐ
+        peak = max(peak, self.child_peak)
+        if stack:
+            stack[-1].child_peak = max(stack[-1].child_peak, peak)
+        delta_peak = max(peak - self.start_current, 0)
+        with _lock:
+            _stages[self.name] = {
+                "name": self.name,
+                "peak_bytes": delta_peak,
+                "retained_bytes": current - self.start_current,
+                "ts": round(time.time(), 3),
+            }
+        if _stage_warn_bytes and delta_peak > _stage_warn_bytes:
+            print(f"[WARNING] memory: ステージ {self.name} のピークが {delta_peak / MB:,.1f}MB（しきい値 {_stage_warn_bytes / MB:,.0f}MB）")
+        return False
+
+
+def traced(name: str):
+    """with traced("process.meta"): の形でステージ中のピーク割り当てを計測する"""
+    if not is_enabled():
+        return _NULL
+    return _Traced(name)
+
+
+def traced_stage(name: str):
+    """関数全体を traced() で囲むデコレータ"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not is_enabled():
+                return func(*args, **kwargs)
+            with _Traced(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _text_cache_row(name: str, cache) -> dict:
+    """文字列を値に持つキャッシュ（AI 応答・ダイジェスト）を1行に（UTF-8 のバイト数の合計）"""
+    values = [value for _, value in cache.entries()]
+    return {
+        "cache": name,
+        "entry": f"{len(values)}件",
+        "rows": len(values),
+        "bytes": sum(len(str(v).encode("utf-8")) for v in values),
+    }
+
+
+def _cache_rows(raw_data, figure_cache, knowledge_store, pivot_cache=None, dataset=None, data_store=None,
+                response_cache=None, digest_cache=None) -> list[dict]:
+    rows = []
+    if dataset is not None:
+        # 全セッション共有の処理済みデータ（Feather のメモリマップならページキャッシュ上のサイズ）
+        rows.append({
+            "cache": "dataset",
+            "entry": f"{dataset.version}" + (" (mmap)" if dataset.path else ""),
+            "rows": len(dataset),
+            "bytes": frame_bytes(dataset.frame),
+        })
+    if data_store is not None:
+        rows.append({
+            "cache": "duckdb",
+            "entry": f"{data_store.version} " + (data_store.path or "(in-memory)"),
+            "rows": data_store.count(),
+            "bytes": data_store.memory_bytes(),
+        })
+    for sheet, df in (raw_data or {}).items():
+        rows.append({"cache": "sheets", "entry": sheet, "rows": len(df), "bytes": frame_bytes(df)})
+    if knowledge_store is not None:
+        rows.append({
+            "cache": "knowledge",
+            "entry": "frame",
+            "rows": len(knowledge_store.frame),
+            "bytes": frame_bytes(knowledge_store.frame),
+        })
+    if pivot_cache is not None:
+        # 案件ピボット
+        for key, value in pivot_cache.entries():
+            size = sum(frame_bytes(f) for f in value["values"].values()) + frame_bytes(value["present"])
+            rows.append({"cache": "pivots", "entry": f"{key[1:]}", "rows": len(value["present"]), "bytes": size})
+    if figure_cache is not None:
+        # (spec, stats): 送信する spec 文字列の大きさ
+        for key, (spec, stats) in figure_cache.entries():
+            rows.append({
+                "cache": "figures",
+                "entry": f"{stats['metric']} {key[1:-2]}",
+                "rows": stats["rendered_points"],
+                "bytes": len(spec),
+            })
+    if response_cache is not None:
+        rows.append(_text_cache_row("ai_response", response_cache))
+    if digest_cache is not None:
+        rows.append(_text_cache_row("digest", digest_cache))
+    return rows
+
+
+def memory_report(raw_data=None, figure_cache=None, knowledge_store=None, pivot_cache=None, dataset=None,
+                  data_store=None, response_cache=None, digest_cache=None) -> dict:
+    """
+    メモリレポート。
+      frames: 中間フレームごとの deep サイズ
+      stages: ステージごとの tracemalloc ピーク（開始時点からの増分）と保持量
+      caches: 渡されたキャッシュ（共有データセット・DuckDB・シート・ナレッジ・ピボット・図・AI 応答・ダイジェスト）のサイズ
+    """
+    with _lock:
+        frames = sorted(_frames.values(), key=lambda r: r["bytes"], reverse=True)
+        stages = sorted(_stages.values(), key=lambda r: r["peak_bytes"], reverse=True)
+    return {
+        "frames": frames,
+        "stages": stages,
+        "caches": _cache_rows(
+            raw_data, figure_cache, knowledge_store, pivot_cache, dataset, data_store, response_cache, digest_cache
+        ),
+        "traced_current_bytes": tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0,
+    }
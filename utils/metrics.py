@@ -0,0 +1,268 @@
+"""
+運用メトリクス（Prometheus テキスト形式）。
+
+設定 metrics_port（環境変数 DASHBOARD_METRICS_PORT）があればローカル HTTP エンドポイント
+（http://<metrics_host>:<port>/metrics）を、metrics_file があればテキストファイル
+（node_exporter の textfile collector 等で読む想定）を出力する。どちらも無ければ記録関数は何もしない。
+HTTP サーバ・レジストリはプロセスに1つで、全セッションの値を集計する。
+"""
+
+import contextvars
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from utils.settings import get_setting
+
+# 名前: (種類, 説明)
+METRICS = {
+    "dashboard_sheet_fetch_seconds": ("histogram", "シート取得（読み込み+パース）の所要時間"),
+    "dashboard_sheet_fetch_bytes_total": ("counter", "シート取得で読み込んだバイト数"),
+    "dashboard_sheet_rows": ("gauge", "直近に取得したシートの行数"),
+    "dashboard_cache_requests_total": ("counter", "キャッシュ参照回数"),
+    "dashboard_cache_misses_total": ("counter", "キャッシュミス回数（本体を実行した回数）"),
+    "dashboard_cache_hits_total": ("counter", "キャッシュヒット回数（参照 - ミス）"),
+    "dashboard_process_seconds": ("histogram", "process_data の所要時間"),
+    "dashboard_rows": ("gauge", "処理済みデータの行数（媒体別）"),
+    "dashboard_unmapped_rows": ("gauge", "案件に紐づかない行数（媒体別）"),
+    "dashboard_ai_response_seconds": ("histogram", "AI 応答の所要時間（キャッシュヒット含む）"),
+    "dashboard_ai_model_seconds": ("histogram", "AI モデル呼び出しの所要時間"),
+    "dashboard_reruns_total": ("counter", "リラン回数（操作別）"),
+    "dashboard_rerun_seconds": ("histogram", "リラン1回の所要時間（操作別）"),
+}
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_enabled = None
+_lock = threading.Lock()
+_counters: dict[tuple, float] = {}
+_gauges: dict[tuple, float] = {}
+_histograms: dict[tuple, list] = {}  # key -> [bucket counts..., sum, count]
+_collectors: dict[str, object] = {}
+
+_server = None
+_server_lock = threading.Lock()
+_last_file_write = 0.0
+
+# main() 全体のリラン中ならその操作ラベル（フラグメント単独のリランと区別する）
+_full_run: contextvars.ContextVar[dict | None] = contextvars.ContextVar("metrics_full_run", default=None)
+
+
+def is_enabled() -> bool:
+    """エクスポート先（HTTP / ファイル）のどちらかが設定されているか"""
+    global _enabled
+    if _enabled is None:
+        _enabled = bool(get_setting("metrics_port") or get_setting("metrics_file"))
+    return _enabled
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return (name,) + tuple(sorted(labels.items()))
+
+
+def inc(name: str, value: float = 1, **labels) -> None:
+    if not is_enabled():
+        return
+    k = _key(name, labels)
+    with _lock:
+        _counters[k] = _counters.get(k, 0) + value
+
+
+def set_gauge(name: str, value: float, **labels) -> None:
+    if not is_enabled():
+        return
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def observe(name: str, value: float, **labels) -> None:
+    if not is_enabled():
+        return
+    k = _key(name, labels)
+    with _lock:
+        h = _histograms.get(k)
+        if h is None:
+            h = _histograms[k] = [0] * len(BUCKETS) + [0.0, 0]
+        idx = bisect_left(BUCKETS, value)
+        if idx < len(BUCKETS):
+            h[idx] += 1
+        h[-2] += value
+        h[-1] += 1
+
+
+@contextmanager
+def timer(name: str, **labels):
+    """with timer("dashboard_process_seconds"): の区間をヒストグラムに記録する"""
+    if not is_enabled():
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started, **labels)
+
+
+def cache_lookup(cache: str) -> None:
+    """キャッシュ参照を数える（キャッシュ関数の呼び出し側で呼ぶ）"""
+    inc("dashboard_cache_requests_total", cache=cache)
+
+
+def cache_miss(cache: str) -> None:
+    """キャッシュミスを数える（キャッシュされる関数本体の中で呼ぶ）"""
+    inc("dashboard_cache_misses_total", cache=cache)
+
+
+def register_collector(name: str, func) -> None:
+    """
+    出力時に呼ばれるコレクタを登録する（同名は上書き）。
+    func() は [(メトリクス名, {ラベル}, 値), ...] を返す。値は gauge として出力する。
+    """
+    _collectors[name] = func
+
+
+@contextmanager
+def full_run():
+    """
+    main() 全体のリランを囲む。回数と所要時間を操作別（set_interaction）に記録する。
+    st.rerun() 等で中断されたリランは数えない（続くリランで数える）
+    """
+    labels = {"interaction": "other"}
+    token = _full_run.set(labels)
+    started = time.perf_counter()
+    completed = False
+    try:
+        yield
+        completed = True
+    finally:
+        _full_run.reset(token)
+        if completed and is_enabled():
+            inc("dashboard_reruns_total", **labels)
+            observe("dashboard_rerun_seconds", time.perf_counter() - started, **labels)
+            flush()
+
+
+def set_interaction(interaction: str) -> None:
+    """現在のリランを引き起こした操作（tab / campaign / date など）を記録する"""
+    labels = _full_run.get()
+    if labels is not None:
+        labels["interaction"] = interaction
+
+
+def fragment_rerun(name: str) -> None:
+    """フラグメント単独のリランを数える（main() からの通常実行は数えない）"""
+    if is_enabled() and _full_run.get() is None:
+        inc("dashboard_reruns_total", interaction=f"fragment:{name}")
+        flush()
+
+
+def _fmt_labels(labels) -> str:
+    if not labels:
+        return ""
+    body = ",".join('{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for k, v in labels)
+    return "{" + body + "}"
+
+
+def render() -> str:
+    """Prometheus テキスト形式（0.0.4）で全メトリクスを出力する"""
+    with _lock:
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+        histograms = {k: list(v) for k, v in _histograms.items()}
+
+    # ヒット数 = 参照 - ミス
+    for k, requests in list(counters.items()):
+        if k[0] == "dashboard_cache_requests_total":
+            misses = counters.get(("dashboard_cache_misses_total",) + k[1:], 0)
+            counters[("dashboard_cache_hits_total",) + k[1:]] = max(requests - misses, 0)
+
+    extra: dict[str, list] = {}
+    for func in list(_collectors.values()):
+        try:
+            for name, labels, value in func():
+                extra.setdefault(name, []).append((tuple(sorted(labels.items())), value))
+        except Exception as e:
+            print(f"[WARNING] metrics collector failed: {e}")
+
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        series = [(k[1:], v) for k, v in (counters if kind == "counter" else gauges if kind == "gauge" else histograms).items() if k[0] == name]
+        if not series:
+            continue
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in sorted(series):
+            if kind != "histogram":
+                lines.append(f"{name}{_fmt_labels(labels)} {value}")
+                continue
+            cumulative = 0
+            for bound, count in zip(BUCKETS, value[:len(BUCKETS)]):
+                cumulative += count
+                lines.append(f"{name}_bucket{_fmt_labels(labels + (('le', bound),))} {cumulative}")
+            lines.append(f"{name}_bucket{_fmt_labels(labels + (('le', '+Inf'),))} {value[-1]}")
+            lines.append(f"{name}_sum{_fmt_labels(labels)} {value[-2]}")
+            lines.append(f"{name}_count{_fmt_labels(labels)} {value[-1]}")
+    for name, series in extra.items():
+        lines.append(f"# TYPE {name} gauge")
+        for labels, value in sorted(series):
+            lines.append(f"{name}{_fmt_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # アクセスログは出さない
+        pass
+
+
+def start_exporter() -> None:
+    """設定された HTTP エクスポータを起動する（プロセス内で1回だけ。リランごとに呼んでよい）"""
+    global _server
+    port = get_setting("metrics_port", None, int)
+    if not port or _server is not None:
+        return
+    with _server_lock:
+        if _server is not None:
+            return
+        host = get_setting("metrics_host", "127.0.0.1")
+        try:
+            _server = ThreadingHTTPServer((host, port), _Handler)
+        except OSError as e:
+            # 別プロセスが使用中など。ダッシュボード本体は止めない
+            print(f"[WARNING] metrics exporter を起動できません ({host}:{port}): {e}")
+            _server = False
+            return
+        threading.Thread(target=_server.serve_forever, name="metrics-exporter", daemon=True).start()
+
+
+def flush(force: bool = False) -> None:
+    """metrics_file が設定されていれば書き出す（metrics_file_interval 秒に1回まで）"""
+    global _last_file_write
+    path = get_setting("metrics_file")
+    if not path:
+        return
+    now = time.monotonic()
+    if not force and now - _last_file_write < get_setting("metrics_file_interval", 15, float):
+        return
+    _last_file_write = now
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(render())
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"[WARNING] metrics file を書き出せません ({path}): {e}")
@@ -0,0 +1,195 @@
+"""
+処理ステージの計測（タイミングスパン）。
+
+設定 perf_timing（環境変数 DASHBOARD_PERF_TIMING）が無効なら span() / stage_timer() は
+共有の何もしないオブジェクトを返すだけなので、計測コードを残したままでもコストはほぼゼロ。
+有効時は1リラン分の記録をコンテキストに溜め（管理パネル表示用）、直近の記録を全体のリングバッファにも残し、
+perf_log_json が有効なら1スパン1行の JSON を標準出力へ出す。
+"""
+
+import contextvars
+import json
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+from functools import wraps
+
+import numpy as np
+
+from utils.settings import get_setting
+
+_NULL_SPAN = nullcontext()
+
+_enabled = None
+_log_json = False
+
+# 入れ子のスパン名（親→子）と、現在のリランの記録先
+_stack: contextvars.ContextVar[tuple] = contextvars.ContextVar("perf_stack", default=())
+_run: contextvars.ContextVar[list | None] = contextvars.ContextVar("perf_run", default=None)
+
+_recent = deque(maxlen=5000)
+_recent_lock = threading.Lock()
+
+
+def is_enabled() -> bool:
+    """計測が有効か（設定はプロセス内で1回だけ読む）"""
+    global _enabled, _log_json
+    if _enabled is None:
+        _log_json = bool(get_setting("perf_log_json", True, bool))
+        _enabled = bool(get_setting("perf_timing", False, bool))
+    return _enabled
+
+
+def set_enabled(enabled: bool, log_json: bool | None = None) -> None:
+    """計測の有効/無効を上書きする（ベンチマーク・スクリプト用）"""
+    global _enabled, _log_json
+    _enabled = bool(enabled)
+    if log_json is not None:
+        _log_json = bool(log_json)
+
+
+def _record(name: str, started: float, ended: float, attrs: dict) -> None:
+    parents = _stack.get()
+    rec = {
+        "event": "span",
+        "name": name,
+        "path": "/".join(parents + (name,)),
+        "depth": len(parents),
+        "ms": round((ended - started) * 1000, 3),
+        "ts": round(time.time(), 3),
+        "thread": threading.current_thread().name,
+    }
+    if attrs:
+        rec.update(attrs)
+    run = _run.get()
+    if run is not None:
+        run.append(rec)
+    with _recent_lock:
+        _recent.append(rec)
+    if _log_json:
+        print(json.dumps(rec, ensure_ascii=False, default=str), flush=True)
+
+
+class _Span:
+    __slots__ = ("name", "attrs", "started", "token")
+
+    def __init__(self, name: str, attrs: dict):
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        self.token = _stack.set(_stack.get() + (self.name,))
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        ended = time.perf_counter()
+        _stack.reset(self.token)
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        _record(self.name, self.started, ended, self.attrs)
+        return False
+
+
+def span(name: str, **attrs):
+    """with span("load.sheet", sheet=...): の形で区間を計測する"""
+    if not is_enabled():
+        return _NULL_SPAN
+    return _Span(name, attrs)
+
+
+def record(name: str, seconds: float, **attrs) -> None:
+    """別スレッド・別プロセスで計測済みの所要時間を、いま終わったスパンとして記録する"""
+    if not is_enabled():
+        return
+    ended = time.perf_counter()
+    _record(name, ended - seconds, ended, attrs)
+
+
+def timed(name: str):
+    """関数全体を1スパンとして計測するデコレータ"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not is_enabled():
+                return func(*args, **kwargs)
+            with _Span(name, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class StageTimer:
+    """
+    連続する処理ステップをラップ計測する。
+    timer = stage_timer("meta") のあと、各ステップの直後に timer.lap("combine") を呼ぶと
+    前回の lap（または作成時）からの経過を "meta.combine" として記録する。
+    """
+
+    __slots__ = ("prefix", "last")
+
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+        self.last = time.perf_counter()
+
+    def lap(self, step: str, **attrs) -> None:
+        now = time.perf_counter()
+        _record(f"{self.prefix}.{step}", self.last, now, attrs)
+        self.last = time.perf_counter()
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def lap(self, step: str, **attrs) -> None:
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def stage_timer(prefix: str):
+    if not is_enabled():
+        return _NULL_TIMER
+    return StageTimer(prefix)
+
+
+def begin_run() -> list | None:
+    """リランの先頭で呼ぶ。以降のスパンをこのリランの記録として集める"""
+    if not is_enabled():
+        return None
+    records: list = []
+    _run.set(records)
+    return records
+
+
+def current_run() -> list:
+    """現在のリランで記録されたスパン"""
+    return list(_run.get() or [])
+
+
+def recent_spans() -> list:
+    """直近のスパン（全セッション・全リラン）"""
+    with _recent_lock:
+        return list(_recent)
+
+
+def summarize(records: list) -> list[dict]:
+    """スパン名ごとの件数・合計・p50/p95/最大（ms）。合計の大きい順"""
+    by_name: dict[str, list[float]] = {}
+    for rec in records:
+        by_name.setdefault(rec["name"], []).append(rec["ms"])
+    rows = []
+    for name, values in by_name.items():
+        arr = np.asarray(values)
+        rows.append({
+            "name": name,
+            "count": int(arr.size),
+            "total_ms": round(float(arr.sum()), 1),
+            "p50_ms": round(float(np.percentile(arr, 50)), 1),
+            "p95_ms": round(float(np.percentile(arr, 95)), 1),
+            "max_ms": round(float(arr.max()), 1),
+        })
+    rows.sort(key=lambda r: r["total_ms"], reverse=True)
+    return rows
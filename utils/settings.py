@@ -0,0 +1,27 @@
+import os
+
+import streamlit as st
+
+
+def get_setting(name: str, default=None, cast=None):
+    """
+    ダッシュボードの動作設定を取得する。
+    優先順: 環境変数 DASHBOARD_<NAME> → Secrets の [dashboard] セクション → default
+    """
+    value = os.environ.get(f"DASHBOARD_{name.upper()}")
+    if value is None:
+        try:
+            value = st.secrets.get("dashboard", {}).get(name)
+        except Exception:
+            # secrets.toml が無いローカル実行/スクリプト実行
+            value = None
+    if value is None:
+        return default
+    if cast is bool and isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    if cast is not None:
+        try:
+            return cast(value)
+        except (TypeError, ValueError):
+            return default
+    return value
@@ -0,0 +1,74 @@
+import streamlit as st
+from streamlit.errors import StreamlitAPIException
+
+
+def fragment(func=None, *, run_every=None):
+    """
+    st.fragment（旧 st.experimental_fragment）でラップする。
+    フラグメント内のウィジェット操作はその関数だけを再実行し、ページ全体はリランしない。
+    run_every（秒）指定時はその間隔でフラグメントを自動再実行する（未対応なら指定を無視）。
+    未対応の Streamlit では通常の関数として動作する。
+    """
+    if func is None:
+        return lambda f: fragment(f, run_every=run_every)
+    decorator = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None)
+    if decorator is None:
+        return func
+    if run_every is not None:
+        try:
+            return decorator(run_every=run_every)(func)
+        except TypeError:
+            pass
+    return decorator(func)
+
+
+def rerun_fragment():
+    """
+    実行中のフラグメントだけを再実行する。
+    scope 未対応の Streamlit（TypeError）や、フラグメントがページ全体の実行の一部として
+    動いている場合（StreamlitAPIException: fragment スコープはフラグメント単独のリラン中のみ可）は
+    ページ全体をリランする。
+    """
+    try:
+        st.rerun(scope="fragment")
+    except (TypeError, StreamlitAPIException):
+        st.rerun()
+
+
+def plotly_chart_spec(container, spec: str, height: int = 450):
+    """
+    シリアライズ済みの Plotly spec（fig.to_json() の文字列）を container にそのまま送る。
+    st.plotly_chart は呼ぶたびに Figure を検証して JSON に直すため、キャッシュ済み spec ではそれを省く。
+    内部 API が無い/変わった Streamlit では Figure に戻して st.plotly_chart で描画する。
+    """
+    try:
+        import json
+
+        from streamlit.elements.lib.form_utils import current_form_id
+        from streamlit.elements.lib.layout_utils import LayoutConfig
+        from streamlit.elements.lib.utils import compute_and_register_element_id
+        from streamlit.proto.PlotlyChart_pb2 import PlotlyChart as PlotlyChartProto
+
+        proto = PlotlyChartProto()
+        proto.theme = "streamlit"
+        proto.form_id = current_form_id(container)
+        proto.spec = spec
+        proto.config = json.dumps({})
+        proto.id = compute_and_register_element_id(
+            "plotly_chart",
+            user_key=None,
+            key_as_main_identity=False,
+            dg=container,
+            plotly_spec=proto.spec,
+            plotly_config=proto.config,
+            selection_mode=("points", "box", "lasso"),
+            is_selection_activated=False,
+            theme="streamlit",
+            width="stretch",
+            height=height,
+        )
+        return container._enqueue("plotly_chart", proto, layout_config=LayoutConfig(width="stretch", height=height))
+    except (ImportError, AttributeError, TypeError):
+        import plotly.io
+
+        return container.plotly_chart(plotly.io.from_json(spec), use_container_width=True)
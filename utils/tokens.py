@@ -0,0 +1,10 @@
+def estimate_tokens(text: str) -> int:
+    """
+    プロンプトのトークン数の概算（トークナイザ非依存の保守的な見積もり）。
+    - ASCII: 約4文字で1トークン
+    - 日本語など非ASCII: 1文字1トークン
+    """
+    if not text:
+        return 0
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars)
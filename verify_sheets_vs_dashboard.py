@@ -10,10 +10,15 @@
 
 from __future__ import annotations
 
+import argparse
+import json
+from pathlib import Path
+
 import pandas as pd
 
 from data.loader import load_data_from_sheets
 from data.processor import process_data, build_master_rules
+from data.reconcile import load_snapshot, reconcile, summarize
 
 
 def _today_str() -> str:
@@ -98,7 +103,13 @@ def _apply_beyond_dedupe(df: pd.DataFrame) -> pd.DataFrame:
 
 
 def main() -> None:
-    raw = load_data_from_sheets()
+    parser = argparse.ArgumentParser(description="シートとダッシュボード（processed）の検証")
+    parser.add_argument("--snapshot", default="", help="ローカルスナップショット（<dir>/<シート名>.csv）から読む")
+    parser.add_argument("--csv", default="", help="期間×媒体×案件×指標の差分表を CSV で出力（data.reconcile）")
+    parser.add_argument("--json", default="", help="差分の要約を JSON で出力（data.reconcile）")
+    args = parser.parse_args()
+
+    raw = load_snapshot(args.snapshot) if args.snapshot else load_data_from_sheets()
     processed = process_data(raw)
     rules = build_master_rules(raw.get("Master_Setting", pd.DataFrame()))
 
@@ -237,6 +248,15 @@ def main() -> None:
         )
         print(by_proj.head(20).to_string(index=False))
 
+    # 機械可読な差分表（全期間×媒体×案件×指標を一括集計）
+    if args.csv or args.json:
+        report = reconcile(raw, processed)
+        if args.csv:
+            report.to_csv(args.csv, index=False, encoding="utf-8-sig")
+        if args.json:
+            Path(args.json).write_text(json.dumps(summarize(report), ensure_ascii=False, indent=2, default=str), encoding="utf-8")
+        print(f"\n差分表: {len(report):,} 行 / 不一致 {int((~report['ok']).sum()):,} 行")
+
 
 if __name__ == "__main__":
     main()